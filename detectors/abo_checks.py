@@ -147,7 +147,7 @@ def check_change (db, cl, nodeid, new_values) :
                                  ])
                             )
                         )
-                if (invoice.get ('invoice_group')) :
+                if (invoice ['invoice_group']) :
                     raise Reject (err (db.i18n.gettext, 'marked'))
             if n_end == abo ['begin'] :
                 if  (  len (abo ['invoices']) > 1
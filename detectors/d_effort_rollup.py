@@ -0,0 +1,84 @@
+#! /usr/bin/python
+# Copyright (C) 2026 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# All rights reserved
+# ****************************************************************************
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+# ****************************************************************************
+#
+#++
+# Name
+#    d_effort_rollup
+#
+# Purpose
+#    Keep booked hours per work package and month in the effort_rollup
+#    table up to date, see lib/effort_rollup.py
+#
+
+import effort_rollup
+
+def _date (db, drid) :
+    return db.daily_record.get (drid, 'date')
+# end def _date
+
+def _hours (tr) :
+    return effort_rollup.hours (tr ['tr_duration'], tr ['duration'])
+# end def _hours
+
+def rollup_create (db, cl, nodeid, old_values) :
+    tr = cl.getnode (nodeid)
+    effort_rollup.add (db, tr.wp, _date (db, tr.daily_record), _hours (tr))
+# end def rollup_create
+
+def rollup_set (db, cl, nodeid, old_values) :
+    """ old_values is the complete old node, so we compare old and new
+        values to find out if something relevant changed.
+    """
+    if not effort_rollup.exists (db) :
+        return
+    props = ('wp', 'duration', 'tr_duration', 'daily_record')
+    tr    = cl.getnode (nodeid)
+    old   = dict ((p, old_values.get (p, tr [p])) for p in props)
+    if all (old [p] == tr [p] for p in props) :
+        return
+    old_dt = _date (db, old ['daily_record'])
+    new_dt = _date (db, tr.daily_record)
+    old_du = _hours (old) or 0
+    new_du = _hours (tr)  or 0
+    if  (   old ['wp'] == tr.wp
+        and effort_rollup.month (old_dt) == effort_rollup.month (new_dt)
+        ) :
+        effort_rollup.add (db, tr.wp, new_dt, new_du - old_du)
+    else :
+        effort_rollup.add (db, old ['wp'], old_dt, -old_du)
+        effort_rollup.add (db, tr.wp, new_dt, new_du)
+# end def rollup_set
+
+def rollup_retire (db, cl, nodeid, old_values) :
+    tr = cl.getnode (nodeid)
+    effort_rollup.add \
+        (db, tr.wp, _date (db, tr.daily_record), -(_hours (tr) or 0))
+# end def rollup_retire
+
+def init (db) :
+    if 'time_record' not in db.classes :
+        return
+    db.time_record.react ('create',  rollup_create)
+    db.time_record.react ('set',     rollup_set)
+    db.time_record.react ('retire',  rollup_retire)
+    db.time_record.react ('restore', rollup_create)
+# end def init
@@ -0,0 +1,45 @@
+#! /usr/bin/python
+# Copyright (C) 2026 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# All rights reserved
+# ****************************************************************************
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+# ****************************************************************************
+#
+#++
+# Name
+#    d_lookup_cache
+#
+# Purpose
+#    Invalidate cached lookup tables when a node of a cached class is
+#    created, changed, retired or restored in the current transaction.
+#
+
+import lookup_cache
+
+def invalidate (db, cl, nodeid, old_values) :
+    lookup_cache.invalidate (db, cl.classname)
+# end def invalidate
+
+def init (db) :
+    for classname in lookup_cache.cached_classes :
+        if classname not in db.classes :
+            continue
+        cl = db.getclass (classname)
+        for action in 'create', 'set', 'retire', 'restore' :
+            cl.react (action, invalidate)
+# end def init
@@ -37,6 +37,7 @@ from roundup.date                   import Date
 
 import common
 import freeze
+import lookup_cache
 import user_dynamic
 import vacation
 import lib_auto_wp
@@ -711,7 +712,7 @@ def find_existing_leave (db, cl, nodeid, new_values) :
     """
     _ = db.i18n.gettext
     stati = ('open', 'submitted', 'accepted', 'cancel requested')
-    stati = list (db.leave_status.lookup (x) for x in stati)
+    stati = list (lookup_cache.lookup (db, 'leave_status', x) for x in stati)
     if 'valid_to' not in new_values and 'valid_from' not in new_values :
         return
     dyn = cl.getnode (nodeid)
@@ -824,30 +825,12 @@ def find_time_records (db, cl, nodeid, new_values) :
     for k in ('valid_to', 'valid_from') :
         value = new_values.get (k)
         if value is not None and gaps [k] :
-            trs = db.time_record.filter \
-                ( None
-                , { 'daily_record.user': dyn.user
-                  , 'daily_record.date': ranges [k]
-                  }
-                )
-            # loop for checking if time recs are public holiday
+            trs, holiday = user_dynamic.time_records_in_range \
+                (db, dyn.user, ranges [k])
+            # Only time records on public holidays (with a wp) are retired
+            if len (holiday) != len (trs) :
+                raise Reject (msgs [k] % value.pretty (common.ymd))
             for id in trs :
-                tr = db.time_record.getnode (id)
-                # case where no wp was entered yet
-                if tr.wp is None :
-                    raise Reject (msgs [k] % value.pretty (common.ymd))
-                # case where wp was set
-                wp = db.time_wp.getnode (tr.wp)
-                tc = db.time_project.getnode (wp.project)
-                if not tc.is_public_holiday :
-                    raise Reject (msgs [k] % value.pretty (common.ymd))
-            # loop entirely for retiring public holidys
-            for id in trs :
-                tr = db.time_record.getnode (id)
-                assert tr.wp
-                wp = db.time_wp.getnode (tr.wp)
-                tc = db.time_project.getnode (wp.project)
-                assert tc.is_public_holiday
                 db.time_record.retire (id)
 # end def find_time_records
 
@@ -951,21 +934,10 @@ def auto_wp_modify (db, cl, nodeid, old_values) :
     """ Generate/Modify WPs for new/changed auto_wp
     """
     # Find all dynamic user records that have do_auto_wp enabled and
-    # use a contract type and org_location that matches.
-    auto_wp = cl.getnode (nodeid)
-    ct      = auto_wp.contract_type or '-1'
-    d       = dict \
-        ( contract_type = ct
-        , org_location  = auto_wp.org_location
-        , do_auto_wp    = True
-        )
-    dynids  = db.user_dynamic.filter (None, d)
-    users   = {}
-    for dynid in dynids :
-        dyn = db.user_dynamic.getnode (dynid)
-        users [dyn.user] = True
-    for u in users :
-        lib_auto_wp.check_auto_wp (db, nodeid, u)
+    # use a contract type and org_location that matches, reconcile the
+    # wps of all these users in one go.
+    users = lib_auto_wp.auto_wp_users (db, nodeid)
+    lib_auto_wp.sync_auto_wp (db, nodeid, users)
 # end def auto_wp_modify
 
 def auto_wp_change_da (db, cl, nodeid, old_values) :
@@ -26,37 +26,38 @@ from roundup                        import roundupdb
 
 import common
 import freeze
+import lookup_cache
+import mail_spool
 import user_dynamic
 import vacation
 
 def check_range (db, nodeid, uid, first_day, last_day) :
     """ Check length of range and if there are any records in the given
-        time-range for this user. This means either the first day of an
-        existing record is inside the new range or the last day is
-        inside the new range or the first day is lower than the first
-        day *and* the last day is larger (new interval is contained in
-        existing interval).
+        time-range for this user. An existing record overlaps if its
+        first day is not after the last day of the new range *and* its
+        last day is not before the first day of the new range, this is
+        checked with a single query.
     """
     _ = db.i18n.gettext
     if first_day > last_day :
         raise Reject (_ ("First day may not be after last day"))
     if (last_day - first_day) > Interval ('30d') :
         raise Reject (_ ("Max. 30 days for single leave submission"))
-    range = common.pretty_range (first_day, last_day)
-    both  = (first_day.pretty (';%Y-%m-%d'), last_day.pretty ('%Y-%m-%d;'))
-    stati = [x for x in db.leave_status.getnodeids (retired = False)
-             if db.leave_status.get (x, 'name') not in ('declined', 'cancelled')
+    # Overlapping requests start before the end and end after the start
+    d = dict \
+        ( user      = uid
+        , status    = \
+            [ id for id, n in lookup_cache.values
+                (db, 'leave_status', 'name').items ()
+              if n not in ('declined', 'cancelled')
             ]
-    for f, l in ((range, None), (None, range), both) :
-        d = dict (user = uid, status = stati)
-        if f :
-            d ['first_day'] = f
-        if l :
-            d ['last_day'] = l
-        r = [x for x in db.leave_submission.filter (None, d) if x != nodeid]
-        if r :
-            raise Reject \
-                (_ ("You already have vacation requests in this time range"))
+        , first_day = last_day.pretty  (';%Y-%m-%d')
+        , last_day  = first_day.pretty ('%Y-%m-%d;')
+        )
+    r = [x for x in db.leave_submission.filter (None, d) if x != nodeid]
+    if r :
+        raise Reject \
+            (_ ("You already have vacation requests in this time range"))
 # end def check_range
 
 def check_wp (db, wp_id, user, first_day, last_day, comment) :
@@ -86,7 +87,7 @@ def new_submission (db, cl, nodeid, new_values) :
     _ = db.i18n.gettext
     common.reject_attributes (_, new_values, 'approval_hr', 'comment_cancel')
     uid = db.getuid ()
-    st_subm = db.leave_status.lookup ('submitted')
+    st_subm = lookup_cache.lookup (db, 'leave_status', 'submitted')
     if 'user' not in new_values :
         user = new_values ['user'] = uid
     else :
@@ -279,7 +280,7 @@ def check_dr_status (db, user, first_day, last_day, st_name) :
     # All daily records must be in state status
     dt = common.pretty_range (first_day, last_day)
     dr = db.daily_record.filter (None, dict (user = user, date = dt))
-    st = db.daily_record_status.lookup (st_name)
+    st = lookup_cache.lookup (db, 'daily_record_status', st_name)
     for drid in dr :
         if st != db.daily_record.get (drid, 'status') :
             raise Reject \
@@ -302,31 +303,27 @@ def state_change_reactor (db, cl, nodeid, old_values) :
     vs         = cl.getnode (nodeid)
     old_status = old_values.get ('status')
     new_status = vs.status
-    accepted   = db.leave_status.lookup ('accepted')
-    declined   = db.leave_status.lookup ('declined')
-    submitted  = db.leave_status.lookup ('submitted')
-    cancelled  = db.leave_status.lookup ('cancelled')
-    crq        = db.leave_status.lookup ('cancel requested')
+    accepted   = lookup_cache.lookup (db, 'leave_status', 'accepted')
+    declined   = lookup_cache.lookup (db, 'leave_status', 'declined')
+    submitted  = lookup_cache.lookup (db, 'leave_status', 'submitted')
+    cancelled  = lookup_cache.lookup (db, 'leave_status', 'cancelled')
+    crq        = lookup_cache.lookup (db, 'leave_status', 'cancel requested')
     if old_status == new_status :
         return
-    dt  = common.pretty_range (vs.first_day, vs.last_day)
-    drs = db.daily_record.filter (None, dict (user = vs.user, date = dt))
-    ars = db.attendance_record.filter (None, dict (daily_record = drs))
-    trs = db.time_record.filter (None, dict (daily_record = drs))
     if new_status == accepted :
-        handle_accept    (db, vs, ars, trs, old_status)
+        handle_accept    (db, vs, old_status)
     elif new_status == declined :
         handle_decline   (db, vs)
     elif new_status == submitted :
         handle_submit    (db, vs)
     elif new_status == cancelled :
-        handle_cancel    (db, vs, drs, ars, trs, old_status == crq)
+        handle_cancel    (db, vs, old_status == crq)
     elif new_status == crq :
         handle_cancel_rq (db, vs)
 # end def state_change_reactor
 
 def try_send_mail (db, vs, now, var_text, var_subject, var_mail = None, ** kw) :
-    mailer         = roundupdb.Mailer (db.config)
+    mailer         = mail_spool.get_mailer (db)
     now            = Date ('.')
     wp             = db.time_wp.getnode (vs.time_wp)
     user           = db.user.getnode (vs.user)
@@ -373,69 +370,13 @@ def try_send_mail (db, vs, now, var_text, var_subject, var_mail = None, ** kw) :
             raise roundupdb.DetectorError (message)
 # end def try_send_mail
 
-def handle_accept (db, vs, ars, trs, old_status) :
-    cancr   = db.leave_status.lookup ('cancel requested')
+def handle_accept (db, vs, old_status) :
+    cancr   = lookup_cache.lookup (db, 'leave_status', 'cancel requested')
     warn_tr = []
     warn_ar = []
     if old_status != cancr :
-        arid_dict = {}
-        for trid in trs :
-            tr  = db.time_record.getnode (trid)
-            wp  = tp = None
-            if tr.wp is not None :
-                wp  = db.time_wp.getnode (tr.wp)
-                tp  = db.time_project.getnode (wp.project)
-            trd = db.daily_record.get (tr.daily_record, 'date')
-            if tp is None or not tp.is_public_holiday :
-                if wp is None or wp.id != vs.time_wp :
-                    dt = trd.pretty (common.ymd)
-                    wn = (wp and wp.name) or ''
-                    tn = (tp and tp.name) or ''
-                    warn_tr.append ((dt, tn, wn, tr.duration))
-                db.time_record.retire (trid)
-            else :
-                # All public holiday tr have a linked ar, we do not
-                # retire the ar in that case
-                assert len (tr.attendance_record) == 1
-                arid_dict [tr.attendance_record [0]] = 1
-        for arid in ars :
-            ar  = db.attendance_record.getnode (arid)
-            if ar.id in arid_dict :
-                continue
-            trd = db.daily_record.get (ar.daily_record, 'date')
-            dt = trd.pretty (common.ymd)
-            wl = ar.work_location or ''
-            if wl :
-                wl = db.work_location.get (wl, 'code')
-            st = ar.start or ''
-            en = ar.end   or ''
-            warn_ar.append ((dt, wl, st, en))
-            db.attendance_record.retire (arid)
-        d = vs.first_day
-        off = db.work_location.filter (None, dict (is_off = True)) [0]
-        while (d <= vs.last_day) :
-            ld = du = vacation.leave_duration (db, vs.user, d)
-            dt = common.pretty_range (d, d)
-            dr = db.daily_record.filter (None, dict (user = vs.user, date = dt))
-            wp = db.time_wp.getnode (vs.time_wp)
-            tp = db.time_project.getnode (wp.project)
-            if tp.max_hours is not None :
-                du = min (ld, tp.max_hours)
-            assert len (dr) == 1
-            if ld :
-                trn = db.time_record.create \
-                    ( daily_record  = dr [0]
-                    , duration      = du
-                    , wp            = vs.time_wp
-                    )
-                db.attendance_record.create \
-                    ( daily_record  = dr [0]
-                    , time_record   = trn
-                    , work_location = off
-                    )
-            leave = db.daily_record_status.lookup ('leave')
-            db.daily_record.set (dr [0], status = leave)
-            d += common.day
+        booking          = vacation.Leave_Booking (db, vs)
+        warn_tr, warn_ar = booking.accept ()
     deleted_records = ''
     if warn_tr or warn_ar :
         d = []
@@ -460,7 +401,7 @@ def handle_accept (db, vs, ars, trs, old_status) :
                 d.append (t)
             except KeyError :
                 pass
-        tll = max (len (w [1]) for w in warn_ar)
+        tll = max ([len (w [1]) for w in warn_ar] or [0])
         fmt = "%%s: %%%ds %%5s-%%5s" % tll
         for w in warn_ar :
             d.append (fmt % w)
@@ -487,7 +428,7 @@ def handle_accept (db, vs, ars, trs, old_status) :
             , 'MAIL_LEAVE_NOTIFY_SUBJECT'
             , 'MAIL_LEAVE_NOTIFY_EMAIL'
             )
-        if tp.is_special_leave :
+        if booking.tp.is_special_leave :
             try_send_mail \
                 ( db, vs, now
                 , 'MAIL_SPECIAL_LEAVE_NOTIFY_TEXT'
@@ -496,29 +437,10 @@ def handle_accept (db, vs, ars, trs, old_status) :
                 )
 # end def handle_accept
 
-def handle_cancel (db, vs, drs, ars, trs, is_crq) :
+def handle_cancel (db, vs, is_crq) :
     if is_crq :
-        ard = {}
-        for trid in trs :
-            tr  = db.time_record.getnode (trid)
-            if tr.wp :
-                wp  = db.time_wp.getnode (tr.wp)
-                tp  = db.time_project.getnode (wp.project)
-                if not tp.is_public_holiday :
-                    assert tp.approval_required
-                    db.time_record.retire (trid)
-                else :
-                    assert len (tr.attendance_record) == 1
-                    ard [tr.attendance_record [0]] = 1
-            else :
-                # inconsistency with missing wp
-                db.time_record.retire (trid)
-        for arid in ars :
-            if arid not in ard :
-                db.attendance_record.retire (arid)
-        st_open = db.daily_record_status.lookup ('open')
-        for dr in drs :
-            db.daily_record.set (dr, status = st_open)
+        booking = vacation.Leave_Booking (db, vs)
+        booking.cancel ()
 
         now = Date ('.')
         try_send_mail \
@@ -532,7 +454,7 @@ def handle_cancel (db, vs, drs, ars, trs, is_crq) :
             , 'MAIL_LEAVE_CANCEL_SUBJECT'
             , 'MAIL_LEAVE_CANCEL_EMAIL'
             )
-        if tp.is_special_leave :
+        if booking.tp.is_special_leave :
             try_send_mail \
                 ( db, vs, now
                 , 'MAIL_SPECIAL_LEAVE_CANCEL_TEXT'
@@ -47,9 +47,24 @@ def check_size (db, cl, nodeid, new_values) :
             (_ ("Maximum file size %(limit)s exceeded: %(length)s") % locals ())
 # end def check_size
 
+def set_digest (db, cl, nodeid, new_values) :
+    """ Compute digest of new content, a resized variant is no longer
+        valid when the content changes.
+    """
+    if new_values.get ('content') is None :
+        return
+    new_values ['content_digest'] = common.content_digest \
+        (new_values ['content'])
+    if nodeid :
+        new_values ['resized_digest'] = None
+# end def set_digest
+
 def init (db) :
     if 'file' not in db.classes :
         return
     db.file.audit ("create", check_size)
     db.file.audit ("set",    check_size)
+    if 'content_digest' in db.file.properties :
+        db.file.audit ("create", set_digest)
+        db.file.audit ("set",    set_digest)
 # end def init
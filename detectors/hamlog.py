@@ -67,7 +67,16 @@ def check_owner_has_qsos (db, cl, nodeid, new_values) :
 # end def check_owner_has_qsos
 
 def fix_stati_qsl (db, cl, nodeid, old_values) :
-    fix_qsl_status (db, cl.get (nodeid, 'qso'))
+    """ Fix stati of the QSO of the qsl (and of the QSO it was linked
+        to before) if a property relevant for the stati changed. Note
+        that old_values is the complete old node for set.
+    """
+    props = ('qso', 'qsl_type', 'date_recv', 'date_sent')
+    new   = dict ((p, cl.get (nodeid, p)) for p in props)
+    if old_values and all (old_values.get (p) == new [p] for p in props) :
+        return
+    qsos = set ((new ['qso'], (old_values or {}).get ('qso')))
+    fix_qsl_status (db, *(q for q in qsos if q))
 # end def fix_stati_qsl
 
 def fix_stati_qso (db, cl, nodeid, old_values) :
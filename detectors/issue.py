@@ -31,6 +31,7 @@
 #
 
 import common
+import issue_hierarchy
 from roundup                        import roundupdb, hyperdb
 from roundup.exceptions             import Reject
 from maturity_index                 import maturity_table
@@ -74,15 +75,12 @@ def update_eff_prio (db, cl, nodeid, new_values) :
 # end def update_eff_prio
 
 def update_children (db, cl, nodeid, old_values) :
+    if issue_hierarchy.active (db, 'effective_prio') :
+        return
     if  (   'effective_prio' in old_values
         and old_values ['effective_prio'] != cl.get (nodeid, 'effective_prio')
         ) :
-        #print "update_children:", old_values ['effective_prio']
-        #print "update_children:", cl.get (nodeid, 'effective_prio')
-        closed = db.status.lookup ('closed')
-        for child in cl.get (nodeid, 'composed_of') :
-            if cl.get (child, 'status') != closed :
-                cl.set (child, effective_prio = 0)
+        issue_hierarchy.propagate_effective_prio (db, cl, nodeid)
 # end def update_children
 
 def update_container_status (db, cl, id, new_values = {}) :
@@ -263,27 +261,26 @@ def set_maturity_index (db, cl, nodeid, new_values, do_update = False) :
 # end def set_maturity_index
 
 def update_maturity_index (db, cl, nodeid, old_values, is_new = False) :
-    """ Reactor to update maturity index for all predecessors. We walk
-        the predecessor chain, if the maturity_index is undefined, we
-        compute it via all the children, otherwise we do a simple update
-        with the changed maturity_index of the current node.
+    """ Reactor to update maturity index for all predecessors, the
+        whole predecessor chain is recomputed in one go, see
+        issue_hierarchy.propagate_maturity_index.
     """
+    if issue_hierarchy.active (db, 'maturity_index') :
+        return
     old_values = old_values or {}
     part_of    = cl.get (nodeid, 'part_of')
     opart_of   = old_values.get ('part_of', part_of)
     mi         = cl.get (nodeid, 'maturity_index')
-    o_mi       = old_values.get ('maturity_index', 0)
     if  (   is_new
         or  part_of != opart_of
         or  'maturity_index' in old_values
             and old_values ['maturity_index'] != mi
         ) :
-        parts = list (dict.fromkeys ((part_of, opart_of)))
-        for p in parts :
-            if p :
-                parent_mi = cl.get (p, 'maturity_index')
-                force     = part_of != opart_of
-                set_maturity_index (db, cl, p, {}, True)
+        def compute (id) :
+            nv = dict (maturity_index = None)
+            return set_maturity_index (db, cl, id, nv)
+        issue_hierarchy.propagate_maturity_index \
+            (db, cl, (part_of, opart_of), compute)
 # end def update_maturity_index
 
 def creat_update_maturity_index (db, cl, nodeid, old_values) :
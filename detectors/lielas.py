@@ -21,10 +21,10 @@ import os
 from roundup.exceptions             import Reject
 from roundup.roundupdb              import DetectorError
 from roundup.date                   import Date, Interval
-from roundup.mailer                 import Mailer
 from roundup.mailer                 import MessageSendError
 from common                         import reject_attributes, changed_values
 from common                         import require_attributes
+from mail_spool                     import get_mailer
 from signal                         import SIGUSR1
 
 def deny_adr (db, cl, nodeid, new_values) :
@@ -160,7 +160,7 @@ def notify (db, alarm, sensor, measurement, timestamp, is_lower) :
     value = measurement.val
     threshold = alarm.val
     m = _ (msg) % locals ()
-    mailer  = Mailer (db.config)
+    mailer  = get_mailer (db)
     subject = _ (''"Sensor alert")
     try :
         mailer.standard_message (sendto, subject, m)
@@ -34,8 +34,11 @@ try :
 except ImportError :
     pass
 
+import types
+
 from roundup import roundupdb, hyperdb
-from roundup.mailer import Mailer, MessageSendError
+from roundup.mailer import MessageSendError
+from mail_spool      import get_mailer, spooled_send_message
 
 fromprops_by_type = \
     { 'Support Issue'      : 'fromaddress'
@@ -76,7 +79,7 @@ def send_non_roundup_mail (db, cls, issueid, msgid, sendto, cc = [], bcc = []) :
     m.append (msg.content or '')
     body = '\n'.join (m).encode (charset)
 
-    mailer  = Mailer (db.config)
+    mailer  = get_mailer (db)
     message = mailer.get_standard_message (multipart = bool (msg.files))
     mailer.set_message_attributes (message, sendto, subject, author)
     message ['Message-Id']  = msg.messageid
@@ -296,6 +299,8 @@ def init(db):
         if klass not in db.classes :
             continue
         cl = db.getclass (klass)
+        # Nosy messages of roundup are spooled, too, if configured
+        cl.send_message = types.MethodType (spooled_send_message, cl)
         cl.react('create', nosyreaction, priority = 200)
         cl.react('set'   , nosyreaction, priority = 200)
         cl.audit('create', updatenosy,   priority = 500)
@@ -19,6 +19,7 @@
 
 import re
 import common
+import mail_spool
 import prlib
 from   roundup.date                   import Date, Interval
 from   roundup.exceptions             import Reject
@@ -1375,7 +1376,7 @@ def send_las_email (db, cl, nodeid, old_values):
     # Changed?
     if not old_values or not old_values.get ('add_to_las'):
         r      = re.compile (r'\s+\n')
-        mailer = roundupdb.Mailer (db.config)
+        mailer = mail_spool.get_mailer (db)
         sender = None
         try:
             sname = getattr (db.config.ext, 'MAIL_SENDER_NAME', None)
@@ -1500,6 +1501,12 @@ def init (db):
     db.pr_offer_item.audit      ("create", fix_gl_account_oi)
     db.pr_currency.audit        ("create", check_currency)
     db.pr_currency.audit        ("set",    check_currency)
+    for cls in prlib.summary_classes:
+        for action in 'create', 'set', 'retire', 'restore':
+            db.getclass (cls).react \
+                ( action, prlib.invalidate_offer_item_summary
+                , priority = 10
+                )
     db.pr_approval_order.audit  ("create", pao_check_roles)
     db.pr_approval_order.audit  ("set",    pao_check_roles)
     db.pr_supplier_rating.audit ("create", check_supplier_rating)
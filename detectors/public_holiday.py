@@ -29,6 +29,7 @@
 #
 
 from roundup.exceptions import Reject
+import lookup_cache
 from common    import require_attributes, pretty_range
 from vacation  import try_create_public_holiday, fix_vacation
 
@@ -51,7 +52,7 @@ def fix_daily_recs (db, cl, nodeid, old_values) :
     ph = cl.getnode (nodeid)
     dt = pretty_range (ph.date, ph.date)
     drs = db.daily_record.filter (None, dict (date = dt))
-    leave = db.daily_record_status.lookup ('leave')
+    leave = lookup_cache.lookup (db, 'daily_record_status', 'leave')
     for id in drs :
         dr = db.daily_record.getnode (id)
         try_create_public_holiday (db, id, dr.date, dr.user)
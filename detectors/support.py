@@ -171,20 +171,24 @@ def find_or_create_contact \
         will be returned.
         Note that if a customer with name 'SPAM' exists and the message
         subject matches a spam pattern we will return the SPAM customer.
+        Email contacts and maildomains are stored lowercase, we search
+        with exact match (which can use the database index) instead of
+        the substring match of filter.
     """
     mail   = mail.lower ()
     cemail = db.contact_type.lookup ('Email')
-    sdict  = dict (contact_type = cemail, contact = mail)
+    sdict  = dict (contact_type = cemail)
     md     = mail.split ('@') [-1]
     sdict ['customer.is_valid'] = True
     if customer :
         sdict ['customer'] = customer
-    for c in db.contact.filter (None, sdict) :
-        cont = db.contact.getnode (c)
-        cust = db.customer.getnode (cont.customer)
-        # filter uses substring match for strings
-        if cont.contact == mail and cust.is_valid :
-            return c
+    cs = db.contact.filter \
+        ( None, sdict
+        , sort             = ('+', 'id')
+        , exact_match_spec = dict (contact = mail)
+        )
+    if cs :
+        return cs [0]
     # Spam Handling: Try to match subject against spam pattern from spamfilter
     # If found return first contact of spam customer (we don't want to
     # keep all the mails from incoming spam)
@@ -206,17 +210,19 @@ def find_or_create_contact \
     # incoming mail will be matched by example.com as the customer mail.
     # Note that we don't allow toplevel domains for the customer (e.g.
     # .com).
+    # The maildomain is unique, so we get at most one match per domain.
     customer_found = False
+    match = None
+    if customer :
+        match = [customer]
     while '.' in md and not customer_found :
-        sdict = dict (is_valid = True, maildomain = md)
-        for cu in db.customer.filter (None, sdict) :
-            cust = db.customer.getnode (cu)
-            if cust.maildomain == md :
-                if customer and customer != cu :
-                    continue
-                customer = cu
-                customer_found = True
-                break
+        cus = db.customer.filter \
+            ( match, dict (is_valid = True)
+            , exact_match_spec = dict (maildomain = md)
+            )
+        if cus :
+            customer = cus [0]
+            customer_found = True
         md = md.split ('.', 1) [1]
     if customer and not customer_found :
         return None
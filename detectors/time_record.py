@@ -36,9 +36,11 @@ from operator                       import add
 from time                           import gmtime
 
 from freeze                         import frozen
+from mail_spool                     import get_mailer
 
 import json
 import common
+import lookup_cache
 import user_dynamic
 import vacation
 
@@ -134,6 +136,7 @@ def att_records_consistent (db, dr):
     dyn      = get_and_check_dyn (db, dr)
     arec     = [db.attendance_record.getnode (i) for i in dr.attendance_record]
     last_ar  = None
+    travel   = lookup_cache.flagged (db, 'work_location', 'travel')
     need_break_recs = []
     for ar in sorted (arec, key = lambda a: a.start or ''):
         ar_pr  = pretty_att_record (db, dr, ar)
@@ -147,7 +150,7 @@ def att_records_consistent (db, dr):
             durations_allowed = True
         if not durations_allowed and not ar.start:
             msgs.append ("%(ar_pr)s: Need Start/End" % locals ())
-        if ar.start and wl and not wl.travel:
+        if ar.start and wl and wl.id not in travel:
             need_break_recs.append (ar)
         if last_ar and last_ar.start:
             ars = [last_ar, ar]
@@ -207,12 +210,12 @@ def time_records_consistent (db, dr):
     noover_sum_day  = 0
     no_over_wp      = None
     daily_hours     = user_dynamic.day_work_hours (dyn, dr.date)
+    travel_act      = lookup_cache.flagged (db, 'time_activity', 'travel')
     for tr in trec:
         tr_pr  = pretty_time_record (db, dr, tr)
         act    = tr.time_activity
         wp     = tr.wp
-        travel = act and db.time_activity.get (act, 'travel')
-        if not travel:
+        if act not in travel_act:
             trec_notravel.append (tr)
         if not tr.wp:
             msgs.append ("%(tr_pr)s: No work package" % locals ())
@@ -318,13 +321,13 @@ def check_daily_record (db, cl, nodeid, new_values):
     may_give_clearance = uid in common.tt_clearance_by (db, user)
 
     vs_exists = False
-    st_accp = db.leave_status.lookup ('accepted')
+    st_accp = lookup_cache.lookup (db, 'leave_status', 'accepted')
     vs = vacation.leave_submissions_on_date (db, user, date)
     # All leave submissions in state cancelled (or declined)?
     # Check if at least one is cancelled
-    cn = db.leave_status.lookup ('cancelled')
-    dc = db.leave_status.lookup ('declined')
-    op = db.leave_status.lookup ('open')
+    cn = lookup_cache.lookup (db, 'leave_status', 'cancelled')
+    dc = lookup_cache.lookup (db, 'leave_status', 'declined')
+    op = lookup_cache.lookup (db, 'leave_status', 'open')
     vs_cancelled = True
     if not vs:
         vs_cancelled = False
@@ -459,23 +462,37 @@ def new_daily_record (db, cl, nodeid, new_values):
     date = new_values ['date']
     date.hour = date.minute = date.second = 0
     new_values ['date'] = date
-    dyn  = user_dynamic.get_user_dynamic (db, user, date)
+    # Use prefetched data when called from vacation.create_daily_recs
+    batch = vacation.daily_record_batch (db, user, date)
+    if batch:
+        dyn = batch.dyn (date)
+    else:
+        dyn = user_dynamic.get_user_dynamic (db, user, date)
     if not dyn and uid != '1':
         raise Reject \
             (_ ("No dynamic user data for %(uname)s, %(date)s") % locals ())
     if uid != '1' and not dyn.booking_allowed:
         raise Reject \
             (_ ("Booking not allowed for %(uname)s, %(date)s") % locals ())
-    if frozen (db, user, date):
+    if batch:
+        is_frozen = batch.frozen (date)
+    else:
+        is_frozen = frozen (db, user, date)
+    if is_frozen:
         raise Reject (_ ("Frozen: %(uname)s, %(date)s") % locals ())
-    if db.daily_record.filter \
-        (None, {'date' : date.pretty ('%Y-%m-%d'), 'user' : user}):
+    if batch:
+        dup = batch.daily_record (date)
+    else:
+        dup = db.daily_record.filter \
+            (None, {'date' : date.pretty ('%Y-%m-%d'), 'user' : user})
+    if dup:
         raise Reject \
             ( _ ("Duplicate record: date = %(date)s, user = %(user)s")
             % new_values
             )
     if 'status' not in new_values:
-        new_values ['status']  = db.daily_record_status.lookup ('open')
+        new_values ['status']  = lookup_cache.lookup \
+            (db, 'daily_record_status', 'open')
     new_values ['tr_duration_ok'] = None
 # end def new_daily_record
 
@@ -549,7 +566,7 @@ def leave_wp (db, dr, wp, start, end, duration):
         return False
     assert len (vs) == 1
     vs = vs [0]
-    if vs.status != db.leave_status.lookup ('accepted'):
+    if vs.status != lookup_cache.lookup (db, 'leave_status', 'accepted'):
         return False
     clearer = common.tt_clearance_by (db, dr.user)
     uid     = db.getuid ()
@@ -580,9 +597,10 @@ def vacation_wp (db, wpid):
 # end def vacation_wp
 
 def check_open_not_frozen (db, dr, uname, allow = False):
-    _   = db.i18n.gettext
-    uid = db.getuid ()
-    if not allow and dr.status != db.daily_record_status.lookup ('open'):
+    _       = db.i18n.gettext
+    uid     = db.getuid ()
+    st_open = lookup_cache.lookup (db, 'daily_record_status', 'open')
+    if not allow and dr.status != st_open:
         raise Reject (_ ('Editing of time records only for status "open"'))
     if frozen (db, dr.user, dr.date):
         date = dr.date
@@ -625,8 +643,8 @@ def allow_new_public_holiday (db, dr, wpid, tr):
         wp    = db.time_wp.getnode (wpid)
         tp    = db.time_project.getnode (wp.project)
         is_ph = tp.is_public_holiday
-        subm  = db.daily_record_status.lookup ('submitted')
-        accpt = db.daily_record_status.lookup ('accepted')
+        subm  = lookup_cache.lookup (db, 'daily_record_status', 'submitted')
+        accpt = lookup_cache.lookup (db, 'daily_record_status', 'accepted')
         du    = vacation.leave_duration (db, dr.user, dr.date, is_ph)
         if  (   tr ['duration'] == du
             and (dr.status in (subm, accpt) and is_ph)
@@ -765,9 +783,9 @@ def check_time_record (db, cl, nodeid, new_values):
         uname = db.user.get (user, 'username')
         raise Reject (_ ("Frozen: %(uname)s, %(date)s") % locals ())
     status   = db.daily_record.get (cl.get (nodeid, 'daily_record'), 'status')
-    leave    = db.daily_record_status.lookup ('leave')
-    subm     = db.daily_record_status.lookup ('submitted')
-    accpt    = db.daily_record_status.lookup ('accepted')
+    leave    = lookup_cache.lookup (db, 'daily_record_status', 'leave')
+    subm     = lookup_cache.lookup (db, 'daily_record_status', 'submitted')
+    accpt    = lookup_cache.lookup (db, 'daily_record_status', 'accepted')
     allow    = False
     if dr.status == leave:
         du = vacation.leave_duration (db, user, date, is_ph)
@@ -784,7 +802,7 @@ def check_time_record (db, cl, nodeid, new_values):
            ):
            allow = True
     allow = allow or db.getuid () == '1'
-    if  (   status != db.daily_record_status.lookup ('open')
+    if  (   status != lookup_cache.lookup (db, 'daily_record_status', 'open')
         and list (new_values) != ['tr_duration']
         and not allow
         ):
@@ -833,8 +851,8 @@ def check_retire (db, cl, nodeid, new_values):
     _ = db.i18n.gettext
     assert not new_values
     uid      = db.getuid ()
-    st_open  = db.daily_record_status.lookup ('open')
-    st_leave = db.daily_record_status.lookup ('leave')
+    st_open  = lookup_cache.lookup (db, 'daily_record_status', 'open')
+    st_leave = lookup_cache.lookup (db, 'daily_record_status', 'leave')
     tr = cl.getnode (nodeid)
     dr = db.daily_record.getnode (tr.daily_record)
     if frozen (db, dr.user, dr.date):
@@ -848,7 +866,7 @@ def check_retire (db, cl, nodeid, new_values):
             ):
             # Must have a leave submission in status accepted, then we
             # can retire existing records
-            ac = db.leave_status.lookup ('accepted')
+            ac = lookup_cache.lookup (db, 'leave_status', 'accepted')
             vs = vacation.leave_submissions_on_date \
                 (db, dr.user, dr.date, filter = dict (status = ac))
             if not vs:
@@ -857,8 +875,8 @@ def check_retire (db, cl, nodeid, new_values):
         if dr.status == st_leave:
             # All leave submissions must be in state cancelled or declined
             # At least one must be cancelled
-            cn = db.leave_status.lookup ('cancelled')
-            dc = db.leave_status.lookup ('declined')
+            cn = lookup_cache.lookup (db, 'leave_status', 'cancelled')
+            dc = lookup_cache.lookup (db, 'leave_status', 'declined')
             vs = vacation.leave_submissions_on_date (db, dr.user, dr.date)
             if not vs:
                 allowed = False
@@ -893,7 +911,7 @@ def send_mail_on_deny (db, cl, nodeid, old_values):
     s_sub, s_open = [dr_status.lookup (s) for s in ("submitted", "open")]
 
     if (old_status, new_status) == (s_sub, s_open):
-        mailer  = roundupdb.Mailer (db.config)
+        mailer  = get_mailer (db)
         date    = cl.get (nodeid, "date").pretty (common.ymd)
         sup     = db.user.getnode (changer)
         superv  = sup.username
@@ -23,6 +23,7 @@
 from roundup.date                   import Date
 from roundup.exceptions             import Reject
 from domain_perm                    import check_domain_permission
+from domain_perm                    import invalidate_domain_permission
 
 import common
 import user_dynamic
@@ -424,6 +425,9 @@ def init (db) :
         db.user.audit ("set",    fix_domain_username)
         db.domain_permission.audit ("set",    check_dp_role)
         db.domain_permission.audit ("create", check_dp_role)
+        for action in 'create', 'set', 'retire', 'restore' :
+            db.domain_permission.react \
+                (action, invalidate_domain_permission)
     if 'user_dynamic' in db.classes :
         db.user_dynamic.audit ("create", domain_user_check)
         db.user_dynamic.audit ("set",    domain_user_check)
@@ -56,6 +56,7 @@ from roundup                        import hyperdb
 
 import common
 import freeze
+import lookup_cache
 import rup_utils
 import user_dynamic
 import vacation
@@ -750,32 +751,40 @@ class Daily_Record_Change_State (Daily_Record_Edit_Action):
 
 class Daily_Record_Submit (Daily_Record_Change_State):
     def handle (self):
-        self.state_from = self.db.daily_record_status.lookup ('open')
-        self.state_to   = self.db.daily_record_status.lookup ('submitted')
+        self.state_from = lookup_cache.lookup \
+            (self.db, 'daily_record_status', 'open')
+        self.state_to   = lookup_cache.lookup \
+            (self.db, 'daily_record_status', 'submitted')
         return self.__super.handle ()
     # end def handle
 # end class Daily_Record_Submit
 
 class Daily_Record_Approve (Daily_Record_Change_State):
     def handle (self):
-        self.state_from = self.db.daily_record_status.lookup ('submitted')
-        self.state_to   = self.db.daily_record_status.lookup ('accepted')
+        self.state_from = lookup_cache.lookup \
+            (self.db, 'daily_record_status', 'submitted')
+        self.state_to   = lookup_cache.lookup \
+            (self.db, 'daily_record_status', 'accepted')
         return self.__super.handle ()
     # end def handle
 # end class Daily_Record_Approve
 
 class Daily_Record_Deny (Daily_Record_Change_State):
     def handle (self):
-        self.state_from = self.db.daily_record_status.lookup ('submitted')
-        self.state_to   = self.db.daily_record_status.lookup ('open')
+        self.state_from = lookup_cache.lookup \
+            (self.db, 'daily_record_status', 'submitted')
+        self.state_to   = lookup_cache.lookup \
+            (self.db, 'daily_record_status', 'open')
         return self.__super.handle ()
     # end def handle
 # end class Daily_Record_Deny
 
 class Daily_Record_Reopen (Daily_Record_Change_State):
     def handle (self):
-        self.state_from = self.db.daily_record_status.lookup ('accepted')
-        self.state_to   = self.db.daily_record_status.lookup ('open')
+        self.state_from = lookup_cache.lookup \
+            (self.db, 'daily_record_status', 'accepted')
+        self.state_to   = lookup_cache.lookup \
+            (self.db, 'daily_record_status', 'open')
         return self.__super.handle ()
     # end def handle
 # end class Daily_Record_Reopen
@@ -786,7 +795,7 @@ def approvals_pending (db, request, userlist):
     except AttributeError:
         pass
     pending   = {}
-    submitted = db.daily_record_status.lookup ('submitted')
+    submitted = lookup_cache.lookup (db, 'daily_record_status', 'submitted')
     spec      = copy (request.filterspec)
     filter    = request.filterspec
     editdict  = {':template' : 'edit', ':filter' : 'user,date'}
@@ -2560,9 +2560,25 @@ def fieldname \
 
 def helptext (db, key) :
     _ = db._db.i18n.gettext
-    return ' '.join (_ (h) for h in _helptext [key])
+    h = _helptext [key]
+    if key in _db_helptext :
+        h = db_helptext (db._db, key)
+    return ' '.join (_ (x) for x in h)
 # end def helptext
 
+def db_helptext (db, key) :
+    """ Help text that depends on the database, computed on first use
+        and kept with the given db (i.e. for one request of one tracker)
+    """
+    try :
+        cache = db.helptext_cache
+    except AttributeError :
+        cache = db.helptext_cache = {}
+    if key not in cache :
+        cache [key] = _db_helptext [key] (db) or _helptext [key]
+    return cache [key]
+# end def db_helptext
+
 def permdict (db, perm) :
     """From a permission object compute a localized version of the dict.
        We also put a quote into the dict for the web-interface.
@@ -2611,19 +2627,21 @@ def aux_links (db) :
     return links
 # end def aux_links
 
-def init_purchase_type (db) :
-    # FIXME: one day this should go into a helptext method that has a db
-    # as parameter.
+def purchase_type_help (db) :
+    """ Help for purchase_type including the valid purchase types
+    """
     if 'purchase_type' not in db.classes :
-        return
-    global purchase_types
+        return None
     pt = []
     for id in db.purchase_type.filter (None, dict (valid = True)) :
         pr = db.purchase_type.getnode (id)
         pt.append ('\n    '.join ((pr.name, pr.description or '')))
     p = Structured_Text (purchase_types + '\n\n' + '\n\n'.join (sorted (pt)))
-    _helptext ['purchase_type'] = [p]
-# end def init_purchase_type
+    return [p]
+# end def purchase_type_help
+
+# Help texts that need the database, see db_helptext
+_db_helptext = dict (purchase_type = purchase_type_help)
 
 def init (instance) :
     reg = instance.registerUtil
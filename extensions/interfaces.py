@@ -40,8 +40,10 @@ from roundup.hyperdb                import Database as hyperdb_database
 from copy                           import copy
 from xml.sax.saxutils               import escape
 
+import clearance
 import common
 import freeze
+import lookup_cache
 import user_dynamic
 import vacation
 
@@ -314,47 +316,28 @@ def approval_for (db, valid_only = False) :
         db  = db._db
     except AttributeError :
         pass
-    uid = db.getuid ()
-    clearer_for = db.user.find   (clearance_by = uid)
-    subst       = db.user.filter \
-        (None, {'substitute' : uid, 'subst_active' : True})
-    clearer_for.extend (subst)
-    # clearance_by may be inherited once via subst:
-    if subst :
-        clearer_for.extend (db.user.find (clearance_by = subst))
-    if not db.user.get (uid, 'clearance_by') :
-        clearer_for.append (uid)
-    # if clearer_for is empty return empty dict
-    if not clearer_for :
-        return {}
-    d   = dict (supervisor = clearer_for)
-    d_a = dict (d)
-    if valid_only :
-        d_a ['status'] = db.user_status.lookup ('valid')
-    approve_for = dict.fromkeys (db.user.filter (None, d_a), 1)
-    if valid_only :
-        d ['status'] = list \
-            (x for x in db.user_status.getnodeids (retired = False)
-             if x != d_a ['status']
-            )
-        invalid = dict.fromkeys (db.user.filter (None, d), 1)
-        # dict modified during iteration
-        for u in list (invalid) :
-            if u in approve_for :
-                del invalid [u]
-                continue
-            dyn = user_dynamic.act_or_latest_user_dynamic (db, u)
-            if not dyn :
-                del invalid [u]
-                continue
-            # User invalid but dyn user valid?!
-            if dyn.valid_to is None :
-                continue
-            if freeze.frozen (db, u, dyn.valid_to - common.day) :
-                del invalid [u]
-        approve_for.update (invalid)
-    if uid in approve_for :
-        del approve_for [uid]
+    uid     = db.getuid ()
+    graph   = clearance.clearance_graph (db)
+    approve = graph.approval_for (uid)
+    if not valid_only :
+        return dict.fromkeys (approve, 1)
+    valid   = lookup_cache.lookup (db, 'user_status', 'valid')
+    approve_for = dict.fromkeys \
+        ((u for u in approve if graph.status [u] == valid), 1)
+    invalid = [u for u in approve if graph.status [u] not in (None, valid)]
+    dyns    = user_dynamic.act_or_latest_user_dynamics (db, invalid)
+    check   = {}
+    for u in invalid :
+        dyn = dyns.get (u)
+        if not dyn :
+            continue
+        # User invalid but dyn user valid?!
+        if dyn.valid_to is None :
+            approve_for [u] = 1
+        else :
+            check [u] = dyn.valid_to - common.day
+    frozen = freeze.frozen_users (db, check)
+    approve_for.update ((u, 1) for u in check if u not in frozen)
     return approve_for
 # end def approval_for
 
@@ -374,12 +357,11 @@ def color_duration (tr) :
        also compute the cached value of tr_duration if not yet computed.
     """
     db         = tr._db
-    travel_act = db.time_activity.filter (None, {'travel' : True})
-    travel_act = dict ((a, 1) for a in travel_act)
+    travel_act = lookup_cache.flagged (db, 'time_activity', 'travel')
     if tr.time_activity and tr.time_activity.id in travel_act:
-        if not tr.tr_duration or tr.activity < tr.daily_record.activity :
-            id = tr.daily_record.id
-            user_dynamic.update_tr_duration (db, db.daily_record.getnode (id))
+        dr = db.daily_record.getnode (tr.daily_record.id)
+        if dr.tr_duration_ok is None :
+            user_dynamic.update_tr_duration (db, dr)
         return 'travel'
     return ''
 # end def color_duration
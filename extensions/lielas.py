@@ -22,12 +22,12 @@
 # General Public License above, contact
 # Reder, Christian Reder, A-2560 Berndorf, Austria, christian@reder.eu
 
-from rsclib.iter_recipes            import grouper
 from rsclib.autosuper               import autosuper
 from roundup.cgi.actions            import Action
 from roundup.cgi.exceptions         import Redirect
 from roundup.exceptions             import Reject
 from roundup.date                   import Date
+from roundup.hyperdb                import Date as Date_Prop, Number
 import common
 
 # Action codes and strings used in the web-interface and as action names
@@ -58,28 +58,25 @@ measurement_query = \
     )
 
 class Delete_Something (Action, autosuper) :
-    def delete_measurements (self, ids = None) :
-        """ Delete given ids (or all if ids is None) from the
-            measurements -- used for cleanup of measurements or when
-            deleting a device for removing measurements for that device
+    def delete_measurements (self, device = None) :
+        """ Delete measurements of given device (or all if device is
+            None) -- used for cleanup of measurements or when deleting a
+            device for removing measurements for that device.
+            This is done with a single set-based statement for the
+            measurements and their journal.
         """
         sql  = 'delete from _measurement'
         sqlj = 'delete from measurement__journal'
-        if ids is not None :
-            b  = 500
-            l  = len (ids) % b
-            a  = self.db.arg
-            w  = ' where _measurement.id in (%s)'
-            wj = ' where nodeid in (%s)'
-            for g in grouper (b, ids) :
-                p = ','.join (a for k in g)
-                self.db.sql (sql  + w  % p, g)
-                self.db.sql (sqlj + wj % p, g)
-            p = ','.join (a for k in range (l))
-            g = ids [-l:]
-            if g :
-                self.db.sql (sql  + w  % p, g)
-                self.db.sql (sqlj + wj % p, g)
+        if device is not None :
+            a    = self.db.arg
+            sel  = '_measurement._sensor in' \
+                   ' (select id from _sensor where _sensor._device = %s)' % a
+            self.db.sql \
+                ( sqlj + ' where nodeid in (select id from _measurement'
+                  ' where ' + sel + ')'
+                , (device,)
+                )
+            self.db.sql (sql + ' where ' + sel, (device,))
         else :
             self.db.sql (sql)
             self.db.sql (sqlj)
@@ -95,19 +92,19 @@ class Delete_Something (Action, autosuper) :
 class Delete_Device (Delete_Something) :
     def handle (self) :
         self.__super.handle ()
-        # device adrs are strings, query all, keep largest
+        # device adrs are strings, query all (including retired devices
+        # like getnodeids did) in one go, keep largest
         largest = 0
         dev     = None
-        for id in self.db.device.getnodeids () :
-            adr = int (self.db.device.get (id, 'adr'))
+        self.db.sql ('select id, _adr from _device')
+        for id, adr in self.db.cursor.fetchall () :
+            adr = int (adr)
             if adr > largest :
                 largest = adr
-                dev     = id
+                dev     = str (id)
         if dev is None :
             raise Redirect ('dyndns?@template=lindex')
-        ids = self.db.measurement.filter (None, {'sensor.device' : dev})
-        if ids :
-            self.delete_measurements (ids)
+        self.delete_measurements (dev)
         ids = self.db.sensor.filter (None, {'device' : dev})
         for id in ids :
             self.db.sensor.destroy (id)
@@ -195,28 +192,55 @@ def menu_by_class (db) :
         )
 # end def menu_by_class
 
+def measurements_by_sensor (db, sensors = None, maxlen = 7) :
+    """ Return dict of the latest maxlen measurements indexed by sensor
+        id, only one measurement for sensors that are not app sensors
+        (status sensors like battery etc).
+        Measurements without a date sort last and are returned with
+        a date of None.
+        All sensors (or the given list of sensor ids) are retrieved
+        with a single query, the measurements of each sensor are
+        selected by a lateral subquery with a limit that is served by
+        the index _measurement_date_idx_ created in initial_data.
+    """
+    db     = getattr (db, '_db', db)
+    a      = db.arg
+    cvtdat = db.to_hyperdb_value (Date_Prop)
+    cvtnum = db.to_hyperdb_value (Number)
+    where  = ''
+    args   = [maxlen]
+    if sensors is not None :
+        if not sensors :
+            return {}
+        where = ' and s.id in (%s)' % ','.join (a for s in sensors)
+        args  = args + [int (s) for s in sensors]
+    sql = \
+        ( 'select s.id, m._date, m._val from _sensor as s'
+          ' cross join lateral'
+          ' (select l.id, l._date, l._val from _measurement as l'
+          ' where l._sensor = s.id and l.__retired__ = 0'
+          ' order by (l._date is not NULL) desc, l._date desc, l.id'
+          ' limit case when s._is_app_sensor then %s else 1 end) as m'
+          ' where s.__retired__ = 0%s'
+          ' order by s.id, (m._date is not NULL) desc, m._date desc, m.id'
+        % (a, where)
+        )
+    cursor = db.conn.cursor ()
+    db.sql (sql, args, cursor)
+    result = {}
+    for sid, dt, val in cursor.fetchall () :
+        if dt is not None :
+            dt = Date (cvtdat (dt))
+        result.setdefault (str (sid), []).append ((dt, cvtnum (val)))
+    return result
+# end def measurements_by_sensor
+
 def latest_measurements (db, sensor, maxlen = 7) :
     """ return the latest maxlen measurements for given sensor
         if the sensor is an app sensor, only one measurement for status
         sensors (battery etc)
     """
-    result = []
-    if not sensor.is_app_sensor :
-        maxlen = 1
-    proptree, sql, args = db._db.measurement._filter_sql \
-        (None, dict (sensor = sensor.id), ('-', 'date'))
-    sql = sql + ' limit %s' % maxlen
-    cursor = db._db.conn.cursor ()
-    db._db.sql (sql, args, cursor)
-    while True :
-        m = cursor.fetchone ()
-        if not m : break
-        m = m [0]
-        n = db._db.measurement.getnode (m)
-        result.append ((Date (n.date), n.val))
-        if len (result) >= maxlen :
-            return result
-    return result
+    return measurements_by_sensor (db, [sensor.id], maxlen).get (sensor.id, [])
 # end def latest_measurements
 
 def sensors_by_device (db, is_app = True) :
@@ -231,7 +255,8 @@ def sensors_by_device (db, is_app = True) :
 
 def sensor_measurements (db) :
     """ measurements indexed by sensor """
-    return dict ((s.id, latest_measurements (db, s)) for s in db.sensor.list ())
+    by_sensor = measurements_by_sensor (db)
+    return dict ((s.id, by_sensor.get (s.id, [])) for s in db.sensor.list ())
 # end def sensor_measurements
 
 # some common strings for the web-interface for translation:
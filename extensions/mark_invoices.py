@@ -20,14 +20,20 @@
 # Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
 # ****************************************************************************
 
+import os
+import shutil
+import tempfile
+import multiprocessing
 from io                             import StringIO
 from os.path                        import splitext
 
 from roundup.cgi.actions            import Action, EditItemAction
 from roundup.cgi                    import templating
-from roundup                        import hyperdb
 from roundup.date                   import Date, Interval
 from roundup.cgi.exceptions         import Redirect
+from invoice_render                 import OOoPy_Invoice_Wrapper
+from invoice_render                 import render_invoices, render_chunk
+from invoice_render                 import start_pool
 
 try :
     import ooopy.Transforms as Transforms
@@ -52,11 +58,19 @@ class Invoice (Action, autosuper) :
 
     def get_iv_template (self, iv) :
         """ Get the correct invoice_template for the invoice_level <=
-            n_sent for the current invoice.
+            n_sent for the current invoice. The result only depends on
+            abo_price and n_sent of the invoice and is memoized.
         """
+        aboprice = self.db.abo.get (iv ['abo'], 'aboprice')
+        key      = (aboprice, iv ['n_sent'])
+        if key not in self.iv_template_cache :
+            self.iv_template_cache [key] = self._iv_template (aboprice, iv)
+        return self.iv_template_cache [key]
+    # end def get_iv_template
+
+    def _iv_template (self, aboprice, iv) :
         db          = self.db
         _           = db.i18n.gettext
-        aboprice    = db.abo.get       (iv ['abo'], 'aboprice')
         iv_tmplates = db.abo_price.get (aboprice, 'invoice_template')
         if not iv_tmplates :
             raise Reject \
@@ -75,7 +89,20 @@ class Invoice (Action, autosuper) :
             if ivt ['invoice_level'] > max ['invoice_level'] :
                 max = ivt
         return max
-    # end def get_iv_template
+    # end def _iv_template
+
+    def prefetch (self, ids) :
+        """ Retrieve invoices with given ids and their abos with one
+            query each, return list of invoice nodes.
+        """
+        db  = self.db
+        ivs = [db.invoice.getnode (i) for i in db.invoice.filter_iter (ids, {})]
+        abo = list (set (iv ['abo'] for iv in ivs))
+        if abo :
+            for a in db.abo.filter_iter (abo, {}) :
+                pass
+        return ivs
+    # end def prefetch
 
     def handle (self) :
         # figure the request
@@ -85,6 +112,7 @@ class Invoice (Action, autosuper) :
         _ = self.db.i18n.gettext
         if request.classname != 'invoice' :
             raise Reject (_ ('You can only mark invoices'))
+        self.iv_template_cache = {}
         # get invoice_group -- if existing:
         self.invoice_group = None
         try :
@@ -121,26 +149,28 @@ class Unmark_Invoice (Invoice) :
 class Mark_Invoice (Invoice) :
     name = 'mark'
 
-    def iv_filter (self, ids) :
+    def iv_filter (self) :
         """ Filter invoices for 
 
+            - invoice is open and period has started
             - invoice belongs to a running subscription
             - invoice is in the correct self.invoice_group
             - correct interval: We do not want to send invoices before
               the interval of the invoice_template has expired after
               sending the last invoice (last_sent < now - interval)
               where interval is in months
+            The first three conditions are checked by the database in
+            one query joining invoice, abo and abo_price.
         """
-        db = self.db
+        spec = \
+            { 'open'                       : True
+            , 'period_start'               : ';1m'
+            , 'abo.end'                    : '-'
+            , 'abo.aboprice.invoice_group' : self.invoice_group or '-1'
+            }
+        ids    = self.db.invoice.filter (None, spec)
         retval = []
-        for id in ids :
-            iv       = self.db.invoice.getnode (id)
-            abo      = self.db.abo.getnode (iv ['abo'])
-            if abo ['end'] :
-                continue
-            grp      = self.db.abo_price.get (abo ['aboprice'], 'invoice_group')
-            if grp != self.invoice_group :
-                continue
+        for iv in self.prefetch (ids) :
             ivt      = self.get_iv_template (iv)
             interval = ivt ['interval']
             if iv ['last_sent'] > self.now - Interval ('%dm' % interval) :
@@ -158,129 +188,85 @@ class Mark_Invoice (Invoice) :
         if self.marked () :
             raise Reject (_ ('invoices are already marked'))
 
-        invoice = self.db.invoice
-        spec = \
-            { 'open'         : True
-            , 'period_start' : ';1m'
-            }
-        ids = invoice.filter (None, spec)
-        invoices = self.iv_filter (ids)
-
-        for i in invoices :
-            invoice.set \
+        for i in self.iv_filter () :
+            self.db.invoice.set \
                 (i ['id'], send_it = True, invoice_group = self.invoice_group)
         self.db.commit ()
         self.redirect ()
     # end def handle
 # end class Mark_Invoice
 
-class OOoPy_Invoice_Wrapper (autosuper) :
-    def __init__ (self, db, iv, date = None, address = None) :
-        self.db = db
-        if not date :
-            date = Date ('.')
-        self.items = {'date' : date}
-        if iv :
-            self.items ['invoice'] = iv
-        if not address :
-            address = self._deref ('invoice.payer')
-        self.items ['address'] = address
-    # end def __init__
-
-    def _pretty (self, item) :
-        if isinstance (item, Date) :
-            return item.pretty ('%d. %m. %Y')
-        return str (item).decode ('utf-8')
-    # end def _pretty
-
-    def _deref (self, name) :
-        """ dereference a dotted name -- we may want to cache this."""
-        names = name.split ('.')
-        x  = self.items [names [0]]
-        if not x :
-            raise KeyError (names [0])
-        for i in names [1:] :
-            p = x.cl.properties [i]
-            if isinstance (p, hyperdb.Link) :
-                x = self.db.getclass (p.classname).getnode (x [i])
-            else :
-                x = x [i]
-        if x : return x
-        return ""
-    # end def _split
-
-    def __getitem__ (self, name) :
-        return self._pretty (self._deref (name))
-    # end def __getitem__
-
-    def __contains__ (self, name) :
-        try :
-            self._deref (name)
-        except KeyError :
-            return False
-        return True
-    # end def __contains__
-
-# end class OOoPy_Invoice_Wrapper
-
 class Generate_Invoice (Invoice) :
+    """ Render all marked invoices into one document. The invoices are
+        grouped by template and split into chunks of chunk_size, chunks
+        are rendered in parallel by a pool of worker processes into
+        temporary files which are then concatenated on disk. The
+        workers are spawned (not forked, a forked child would inherit
+        the db connection of the web process), each worker opens its
+        own db. The result is stored as a file and the browser is
+        redirected to its download link.
+    """
+    chunk_size = 200
+    processes  = None # default: number of CPUs
+
     def handle (self) :
-        ''' Prepare invoices for printout and send to browser.'''
+        ''' Prepare invoices for printout, store result as file.'''
         self.__super.handle ()
-        mimetype  = None
+        _         = self.db.i18n.gettext
         extension = None
-        invoices = [self.db.invoice.getnode (i) for i in self.marked (True)]
-        ivts      = [(self.get_iv_template (i), i) for i in invoices]
-        iv_by_tid = {}
-        tp_by_tid = {}
-        for i in ivts :
-            tid = i [0]['id']
-            if tid not in iv_by_tid :
-                iv_by_tid [tid] = []
-                tp_by_tid [tid] = i [0]
-            iv_by_tid [tid].append (OOoPy_Invoice_Wrapper (self.db, i [1]))
-        sio = {}
-        for tid in tp_by_tid :
-            tp = tp_by_tid [tid]
-            sio [tid] = StringIO ()
-            fileid    = self.db.tmplate.get (tp ['tmplate'], 'files')[-1]
-            file      = StringIO (self.db.file.get (fileid, 'content'))
-            extension = splitext (self.db.file.get (fileid, 'name'))[1]
-
-            o = OOoPy (infile = file, outfile = sio [tid])
-            t = Transformer \
-                ( o.mimetype
-                , get_meta (o.mimetype)
-                , Transforms.Addpagebreak_Style ()
-                , Transforms.Mailmerge (iterator = iv_by_tid [tid])
-                , renumber_all (o.mimetype)
-                , set_meta     (o.mimetype)
-                , Transforms.Fix_OOo_Tag ()
-                )
-            t.transform (o)
-            mimetype = o.mimetype
-            o.close ()
-        outfiles = sio.values ()
-        if len (outfiles) > 1 :
-            out = StringIO ()
-            o   = OOoPy (infile = outfiles [0], outfile = out)
-            t   = Transformer \
-                  ( o.mimetype
-                  , get_meta (o.mimetype)
-                  , Transforms.Concatenate (* (outfiles [1:]))
-                  , renumber_all (o.mimetype)
-                  , set_meta     (o.mimetype)
-                  , Transforms.Fix_OOo_Tag ()
-                  )
-            t.transform (o)
-            o.close ()
-        else :
-            out = outfiles [0]
-        h = self.client.additional_headers
-        h ['Content-Type']        = mimetype
-        h ['Content-Disposition'] = 'inline; filename=inv%s' % extension
-        self.client.header  ()
-        return out.getvalue ()
+        ivs_by_tid = {}
+        for iv in self.prefetch (self.marked (True)) :
+            id  = iv ['id']
+            tid = self.get_iv_template (iv)['id']
+            ivs_by_tid.setdefault (tid, []).append (id)
+        if not ivs_by_tid :
+            raise Reject (_ ('No invoices marked for sending'))
+        tmpdir = tempfile.mkdtemp ()
+        try :
+            chunks = []
+            for tid in sorted (ivs_by_tid, key = int) :
+                tp        = self.db.invoice_template.getnode (tid)
+                fileid    = self.db.tmplate.get (tp ['tmplate'], 'files')[-1]
+                extension = splitext (self.db.file.get (fileid, 'name'))[1]
+                ids       = ivs_by_tid [tid]
+                for n in range (0, len (ids), self.chunk_size) :
+                    outname = os.path.join \
+                        (tmpdir, 'chunk%05d%s' % (len (chunks), extension))
+                    chunks.append \
+                        ((fileid, ids [n:n + self.chunk_size], outname))
+            if len (chunks) > 1 :
+                home = self.db.config.TRACKER_HOME
+                ctx  = multiprocessing.get_context ('spawn')
+                with start_pool (ctx, self.processes) as pool :
+                    mimetypes = pool.starmap \
+                        (render_chunk, [(home,) + c for c in chunks])
+            else :
+                mimetypes = [render_invoices (self.db, * chunks [0])]
+            mimetype = mimetypes [0]
+            outfiles = [c [2] for c in chunks]
+            if len (outfiles) > 1 :
+                out = os.path.join (tmpdir, 'invoices%s' % extension)
+                o   = OOoPy (infile = outfiles [0], outfile = out)
+                t   = Transformer \
+                      ( o.mimetype
+                      , get_meta (o.mimetype)
+                      , Transforms.Concatenate (* (outfiles [1:]))
+                      , renumber_all (o.mimetype)
+                      , set_meta     (o.mimetype)
+                      , Transforms.Fix_OOo_Tag ()
+                      )
+                t.transform (o)
+                o.close ()
+            else :
+                out = outfiles [0]
+            name = 'inv-%s%s' % (Date ('.').pretty ('%Y-%m-%d'), extension)
+            with open (out, 'rb') as f :
+                fileid = self.db.file.create \
+                    (name = name, type = mimetype, content = f.read ())
+        finally :
+            shutil.rmtree (tmpdir, ignore_errors = True)
+        self.db.commit ()
+        raise Redirect ('file%s/%s' % (fileid, name))
     # end def handle
 # end class Generate_Invoice
 
@@ -315,7 +301,7 @@ class Mark_Invoice_Sent (_Mark_Invoice) :
     def handle (self) :
         ''' Mark the marked invoices as sent and remove mark.'''
         self.__super.handle ()
-        invoices  = [self.db.invoice.getnode (i) for i in self.marked (True)]
+        invoices  = self.prefetch (self.marked (True))
         self._mark_ivs (invoices)
         self._unmark   ()
         self.db.commit ()
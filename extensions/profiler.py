@@ -0,0 +1,42 @@
+#! /usr/bin/python
+# Copyright (C) 2026 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# All rights reserved
+# ****************************************************************************
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+# ****************************************************************************
+#
+#++
+# Name
+#    profiler
+#
+# Purpose
+#    Install the profiling web client if profiling is enabled, see
+#    lib/request_profile.py
+#
+
+import request_profile
+
+def init (instance) :
+    instance.registerUtil ('request_profile', request_profile.current)
+    if not request_profile.enabled (instance.config) :
+        return
+    cls = instance.Client
+    if not issubclass (cls, request_profile.Profiling_Client) :
+        instance.Client = type \
+            (cls.__name__, (request_profile.Profiling_Client, cls), {})
+# end def init
@@ -46,6 +46,8 @@ from rsclib.autosuper               import autosuper
 from rsclib.PM_Value                import PM_Value
 
 import common
+import effort_rollup
+import lookup_cache
 import request_util
 import sum_common
 import user_dynamic
@@ -224,6 +226,13 @@ class Container (autosuper):
         self.add_sum_column (other_container, tr.username, tr)
     # end def add_sum
 
+    def add_hours (self, other_container, hours):
+        """ Add hours without a user, used for sums from effort_rollup """
+        if other_container not in self.sums:
+            self.sums [other_container] = PM_Value (0)
+        self.sums [other_container] += hours
+    # end def add_hours
+
     def add_plan (self, other_container, duration):
         if other_container not in self.plans:
             self.plans [other_container] = PM_Value (0)
@@ -732,8 +741,7 @@ class Summary_Report (_Report):
         self.show_empty = show_empty == 'yes'
         show_all_users  = self.show_all_users = show_all_users == 'yes'
         show_missing    = show_missing == 'yes' and not is_csv
-        travel_act      = db.time_activity.filter (None, {'travel' : True})
-        travel_act      = dict ((a, 1) for a in travel_act)
+        travel_act      = lookup_cache.flagged (db, 'time_activity', 'travel')
         self.show_plan  = 'planned_effort' in self.columns
 
         db.log_info ("summary_report: time: %s" % timestamp)
@@ -741,6 +749,9 @@ class Summary_Report (_Report):
         db.log_info ("summary_report: columns: %s, plan: %s"
             % (self.columns, self.show_plan))
         start, end  = common.date_range (db, filterspec)
+        use_rollup  = self.use_rollup \
+            (filterspec, status, start, end, show_missing)
+        db.log_info ("summary_report: rollup: %s" % use_rollup)
         users       = filterspec.get ('user', [])
         sv          = dict ((i, 1) for i in filterspec.get ('supervisor', []))
         svu         = []
@@ -800,7 +811,7 @@ class Summary_Report (_Report):
         db.log_info ("summary_report: users: %s, %s-%s, status: %s"
             % (users, start, end, status))
         dr          = []
-        if users:
+        if users and not use_rollup:
             dr = db.daily_record.filter \
                 ( None, dict 
                     ( user   = users
@@ -987,7 +998,11 @@ class Summary_Report (_Report):
             wp = dict ((w, 1) for w in db.time_wp.getnodeids ())
         db.log_info ("summary_report: wp-default: n_wp: %s (%s)"
             % (len (wp), time.time () - timestamp))
-        work_pkg    = dict ((w, Extended_WP (db, w)) for w in wp)
+        if use_rollup:
+            booked   = effort_rollup.rollup (db, 'wp', start, end, list (wp))
+            work_pkg = dict ((w, Extended_WP (db, w)) for w in booked)
+        else:
+            work_pkg = dict ((w, Extended_WP (db, w)) for w in wp)
         db.log_info ("summary_report: ext wp (%s)" % (time.time () - timestamp))
         time_recs   = []
         # 276 sec: (4.6 min) (for Decos: ~ 250 sec)
@@ -1041,6 +1056,8 @@ class Summary_Report (_Report):
         
         # append only wps where somebody actually booked on
         wps         = dict ((tr.wp.id, 1) for tr in time_recs)
+        if use_rollup:
+            wps     = dict ((w, 1) for w in work_pkg)
         for w in wps:
             wp_containers.append \
                 ( WP_Container
@@ -1062,6 +1079,9 @@ class Summary_Report (_Report):
             % (time.time () - timestamp))
         if not projects + selected_by_op_project:
             tprojects   = dict ((tr.wp.project, 1) for tr in time_recs)
+            if use_rollup:
+                tprojects = dict \
+                    ((work_pkg [w].project, 1) for w in work_pkg)
             for p in tprojects:
                 wp_containers.append \
                     ( WP_Container
@@ -1178,6 +1198,18 @@ class Summary_Report (_Report):
                 tidx += 1
             d = d + Interval ('1d')
             db.log_info ("summary_report: 1d (%s)" % (time.time () - timestamp))
+        if use_rollup:
+            for t in time_containers:
+                for tc in time_containers [t]:
+                    tcend = tc.end
+                    if not isinstance (tc, Range_Container):
+                        tcend = tc.end - Interval ('1d')
+                    hours = effort_rollup.rollup \
+                        (db, 'wp', tc.start, tcend, list (work_pkg))
+                    for w in hours:
+                        for wpc in containers_by_wp.get (w, []):
+                            tc. add_hours (wpc, hours [w])
+                            wpc.add_hours (tc,  hours [w])
         db.log_info ("summary_report: SUMs built (%s)"
             % (time.time () - timestamp))
         self.wps             = wps
@@ -1189,6 +1221,51 @@ class Summary_Report (_Report):
         self.dr_containers   = dr_containers
     # end def __init__
 
+    rollup_filters = \
+        ( 'time_wp'
+        , 'time_wp_group'
+        , 'time_project'
+        , 'op_project'
+        , 'project_type'
+        , 'reporting_group'
+        , 'product_family'
+        , 'time_wp_summary_no'
+        , 'user'
+        , 'supervisor'
+        , 'org_location'
+        , 'sap_cc'
+        )
+
+    def use_rollup (self, filterspec, status, start, end, show_missing):
+        """ Sums over whole months for cost centers and cost center
+            groups are taken from the effort_rollup table (see
+            lib/effort_rollup.py) instead of the time records. This is
+            only possible if the user may see all time records and no
+            per-user sums, missing records or plans are requested.
+        """
+        db = self.db
+        if not effort_rollup.exists (db):
+            return False
+        if  (   not filterspec.get ('cost_center')
+            and not filterspec.get ('cost_center_group')
+            ):
+            return False
+        if [k for k in self.rollup_filters if filterspec.get (k)]:
+            return False
+        if set (status) != set (db.daily_record_status.getnodeids ()):
+            return False
+        if show_missing or self.show_plan or 'user' in self.columns:
+            return False
+        rep_types = filterspec.get \
+            ('summary_type', [db.summary_type.lookup ('range')])
+        rep_types = set (db.summary_type.get (i, 'name') for i in rep_types)
+        if not rep_types <= set (('month', 'range')):
+            return False
+        if start.day != 1 or (end + Interval ('1d')).day != 1:
+            return False
+        return common.user_has_role (db, self.uid, 'HR', 'Controlling')
+    # end def use_rollup
+
     id_attrs = \
         [ '.'.join ((x, 'id')) for x in
             ( 'time_wp'
@@ -1693,9 +1770,9 @@ class Vacation_Report (_Report):
         self.hv = hv = common.user_has_role (
             self.db, self.uid, 'HR-vacation', 'Vacation-report')
         db.log_info  ("vacation_report: %s" % timestamp)
-        st_accp = db.leave_status.lookup ('accepted')
-        st_cnrq = db.leave_status.lookup ('cancel requested')
-        st_subm = db.leave_status.lookup ('submitted')
+        st_accp = lookup_cache.lookup (db, 'leave_status', 'accepted')
+        st_cnrq = lookup_cache.lookup (db, 'leave_status', 'cancel requested')
+        st_subm = lookup_cache.lookup (db, 'leave_status', 'submitted')
         self.request = request
         self.utils   = utils
         filterspec   = request.filterspec
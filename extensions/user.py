@@ -19,6 +19,12 @@
 # Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
 # ****************************************************************************
 
+import user_picker
+from   roundup.exceptions       import UsageError
+from   roundup.rest             import Routing, RestfulInstance
+from   roundup.rest             import _data_decorator
+from   roundup.cgi.templating   import MultilinkHTMLProperty
+
 def valid_user_stati (db) :
     """ Valid user statis are now valid and valid_ad, this should be
         fixed by adding an 'active' flag to the user_status or similar.
@@ -34,9 +40,98 @@ def valid_user_stati_filter (db) :
     return ','.join (valid_user_stati (db))
 # end def valid_user_stati_filter
 
+def picker_users (prop) :
+    """ Currently selected users of a Link or Multilink property, the
+        lazy user picker only renders these as options.
+    """
+    if isinstance (prop, MultilinkHTMLProperty) :
+        return list (prop)
+    if prop._value :
+        return [prop]
+    return []
+# end def picker_users
+
+class Rest_Request (RestfulInstance) :
+
+    @Routing.route ("/aux/user_search", 'GET')
+    @_data_decorator
+    def user_search (self, input, *args, **kw) :
+        """ Search users by prefix of username, first-, last- or
+            nickname for the user pickers. Parameters are the search
+            string q, status (comma-separated ids or names, default:
+            user stati with is_nosy set), role and limit. Only users
+            for which all searched, filtered and returned properties
+            may be viewed are returned, the role filter is ignored if
+            roles may not be viewed. The result carries an ETag, a
+            matching If-None-Match gets a 304 response.
+        """
+        db     = self.db
+        uid    = db.getuid ()
+        check  = db.security.hasPermission
+        query  = ''
+        role   = None
+        limit  = 50
+        if 'q' in input :
+            query = input ['q'].value
+        if 'role' in input and check ('View', uid, 'user', 'roles') :
+            role  = input ['role'].value.strip () or None
+        if 'limit' in input :
+            try :
+                limit = int (input ['limit'].value)
+            except ValueError :
+                raise UsageError ('Invalid limit: %s' % input ['limit'].value)
+        if 'status' in db.user.properties :
+            if 'status' in input :
+                status = set ()
+                for s in input ['status'].value.split (',') :
+                    s = s.strip ()
+                    if not s.isdigit () :
+                        try :
+                            s = db.user_status.lookup (s)
+                        except KeyError :
+                            raise UsageError ('Invalid status: %s' % s)
+                    status.add (s)
+            else :
+                status = set \
+                    (db.user_status.filter (None, dict (is_nosy = True)))
+        else :
+            status = None
+        index = user_picker.user_index (db)
+        etag  = user_picker.etag \
+            (index, uid, query, sorted (status or ()), role, limit)
+        if etag :
+            self.client.setHeader ('ETag', etag)
+            self.client.setHeader ('Cache-Control', 'private, no-cache')
+            if self.client.request.headers.get ('If-None-Match') == etag :
+                return 304, {}
+        props = list (index.props)
+        if status :
+            props.append ('status')
+        if role :
+            props.append ('roles')
+        result = []
+        for u in index.search (query, status, role) :
+            if len (result) >= limit :
+                break
+            id = u ['id']
+            if not all (check ('View', uid, 'user', p, id) for p in props) :
+                continue
+            result.append \
+                ( dict
+                    ( id       = id
+                    , username = u ['username']
+                    , realname = u ['realname']
+                    )
+                )
+        return 200, dict (collection = result)
+    # end def user_search
+
+# end class Rest_Request
+
 def init (instance) :
     reg = instance.registerUtil
     reg ('valid_user_stati',             valid_user_stati)
     reg ('valid_user_stati_filter',      valid_user_stati_filter)
+    reg ('picker_users',                 picker_users)
 # end def init
 
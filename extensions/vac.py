@@ -28,11 +28,14 @@ except ImportError:
     from urllib import urlencode
 import re
 import common
+import lookup_cache
 import user_dynamic
 import vacation
 from   roundup.date           import Date, Interval
-from   roundup.cgi.actions    import NewItemAction
-from   roundup.cgi.exceptions import Redirect
+from   roundup.cgi.actions    import Action, NewItemAction
+from   roundup.cgi.exceptions import Redirect, Unauthorised
+from   roundup.exceptions     import Reject, UsageError
+from   roundup.roundupdb      import DetectorError
 from   roundup.cgi.templating import HTMLItem
 from   roundup.rest           import _data_decorator, Routing, RestfulInstance
 
@@ -48,7 +51,7 @@ def user_leave_submissions (db, context):
 
 def approval_stati (db):
     st  = ('submitted', 'cancel requested')
-    st  = [db._db.leave_status.lookup (x) for x in st]
+    st  = [lookup_cache.lookup (db._db, 'leave_status', x) for x in st]
     return dict (status = st)
 # end def approval_stati
 
@@ -113,10 +116,13 @@ class Leave_Buttons (object):
     def __init__ (self, db):
         self.htmldb    = db
         self.db        = db._db
-        self.st_open   = self.db.leave_status.lookup ('open')
-        self.st_subm   = self.db.leave_status.lookup ('submitted')
-        self.st_accp   = self.db.leave_status.lookup ('accepted')
-        self.st_cncr   = self.db.leave_status.lookup ('cancel requested')
+        self.st_open   = lookup_cache.lookup (self.db, 'leave_status', 'open')
+        self.st_subm   = lookup_cache.lookup \
+            (self.db, 'leave_status', 'submitted')
+        self.st_accp   = lookup_cache.lookup \
+            (self.db, 'leave_status', 'accepted')
+        self.st_cncr   = lookup_cache.lookup \
+            (self.db, 'leave_status', 'cancel requested')
         self.uid       = self.db.getuid ()
     # end def __init__
 
@@ -203,9 +209,9 @@ def _get_ctype (db, user, start, end):
 # end def _get_ctype
 
 def _get_stati (db, statusname):
-    st  = [db.leave_status.lookup (statusname)]
+    st  = [lookup_cache.lookup (db, 'leave_status', statusname)]
     if statusname == 'accepted':
-        st.append (db.leave_status.lookup ('cancel requested'))
+        st.append (lookup_cache.lookup (db, 'leave_status', 'cancel requested'))
     return st
 # end def _get_stati
 
@@ -244,6 +250,57 @@ class New_Leave_Action (NewItemAction):
 
 # end class New_Leave_Action
 
+class Accept_Selected_Leave_Action (Action):
+    """ Accept the leave submissions selected in the approval form.
+        Each submission is accepted and committed separately, if one is
+        rejected or a detector fails it is rolled back without affecting
+        the others. The result of each submission is reported.
+    """
+
+    def handle (self):
+        _        = self.db.i18n.gettext
+        db       = self.db
+        accepted = lookup_cache.lookup (db, 'leave_status', 'accepted')
+        ok       = []
+        err      = []
+        selected = []
+        if '@selected' in self.form:
+            selected = self.form ['@selected']
+            if not isinstance (selected, list):
+                selected = [selected]
+        for id in dict.fromkeys (s.value for s in selected):
+            if not id.isdigit () or not db.leave_submission.hasnode (id):
+                err.append (_ ("Invalid leave submission: %s") % id)
+                continue
+            vs   = db.leave_submission.getnode (id)
+            desc = '%s (%s: %s - %s)' % \
+                ( 'leave_submission%s' % id
+                , db.user.get (vs.user, 'username')
+                , vs.first_day.pretty (common.ymd)
+                , vs.last_day.pretty  (common.ymd)
+                )
+            try:
+                if not self.hasPermission \
+                    ( 'Edit', 'leave_submission'
+                    , itemid = id, property = 'status'
+                    ):
+                    raise Reject (_ ("Permission denied"))
+                db.leave_submission.set (id, status = accepted)
+                db.commit ()
+                ok.append (desc)
+            except (Reject, DetectorError, ValueError) as cause:
+                db.rollback ()
+                err.append ('%s: %s' % (desc, cause))
+        if not ok and not err:
+            err.append (_ ("No leave submission selected"))
+        for desc in ok:
+            self.client.add_ok_message (_ ("%s accepted") % desc)
+        for e in err:
+            self.client.add_error_message (e)
+    # end def handle
+
+# end class Accept_Selected_Leave_Action
+
 def leave_days (db, user, first_day, last_day):
     if first_day is None or last_day is None:
         return 0
@@ -327,7 +384,7 @@ class Leave_Display (object):
             self.users = users = db.user.filter (None, vstatus, sort = srt)
         else:
             self.users = users = db.user.filter (users, vstatus, sort = srt)
-        acc = db.leave_status.lookup ('accepted')
+        acc = lookup_cache.lookup (db, 'leave_status', 'accepted')
         flt = dict \
             ( first_day = ';%s' % fd
             , last_day  = '%s;' % ld
@@ -681,6 +738,196 @@ class Leave_Display (object):
 
 # end class Leave_Display
 
+class Time_Record_Export (object):
+    """ Time records of a date range and an optional list of users
+        joined with date and user of their daily_record, the wp and
+        the project. Records are returned in the stable order of date
+        and time_record id and are paginated with a cursor: The cursor
+        is the key of the last record of the previous page, the next
+        page starts after that key. So each page is retrieved with one
+        query for the time records (two when starting in the middle of
+        a day, instead of one request per record via the generic REST
+        API), the time records, daily records, wps and projects of the
+        page are then loaded with one query each.
+    """
+
+    max_limit = 5000
+
+    def __init__ \
+        ( self, db, users
+        , dt     = None
+        , cursor = None
+        , limit  = 1000
+        ):
+        self.db    = db
+        self.users = users
+        if not dt:
+            now = Date ('.')
+            som = common.start_of_month (now)
+            eom = common.end_of_month (now)
+            dt  = common.pretty_range (som, eom)
+        try:
+            fd, ld = dt.split (';')
+        except ValueError:
+            fd = ld = dt
+        self.fdd    = Date (fd)
+        self.ldd    = Date (ld)
+        self.limit  = max (1, min (int (limit), self.max_limit))
+        self.cursor = None
+        if cursor:
+            try:
+                d, id = cursor.split (':')
+                self.cursor = (Date (d).pretty (common.ymd), int (id))
+            except ValueError:
+                raise UsageError ('Invalid cursor: %s' % cursor)
+    # end def __init__
+
+    def page (self):
+        """ Return the list of time_record nodes of the current page and
+            the cursor for the next page (None on the last page).
+            With a cursor the records of the cursor's day are retrieved
+            and those up to the cursor's id are skipped, the following
+            days are retrieved with a date filter starting the next day.
+            At most limit + 1 records are retrieved, more only if some
+            of them may not be viewed.
+        """
+        db  = self.db
+        uid = db.getuid ()
+        if self.users is not None and not self.users:
+            return [], None
+        flt = {}
+        if self.users is not None:
+            flt ['daily_record.user'] = self.users
+        srt    = [('+', 'daily_record.date'), ('+', 'id')]
+        check  = db.security.hasPermission
+        need   = self.limit + 1
+        result = []
+        start  = self.fdd
+        if self.cursor:
+            day, last = self.cursor
+            start = max (start, Date (day) + Interval ('1d'))
+            if Date (day) <= self.ldd:
+                flt ['daily_record.date'] = common.pretty_range \
+                    (Date (day), Date (day))
+                for id in db.time_record.filter (None, flt, sort = srt):
+                    if int (id) <= last:
+                        continue
+                    if check ('View', uid, 'time_record', itemid = id):
+                        result.append (id)
+        offset = 0
+        while len (result) < need and start <= self.ldd:
+            n = need - len (result)
+            flt ['daily_record.date'] = common.pretty_range (start, self.ldd)
+            ids = db.time_record.filter \
+                (None, flt, sort = srt, limit = n, offset = offset)
+            for id in ids:
+                if check ('View', uid, 'time_record', itemid = id):
+                    result.append (id)
+            if len (ids) < n:
+                break
+            offset += n
+        if not result:
+            return [], None
+        result = result [:need]
+        trs    = dict \
+            ( (id, db.time_record.getnode (id))
+              for id in db.time_record.filter_iter (result, {})
+            )
+        trs    = [trs [id] for id in result]
+        self.prefetch_drs (trs)
+        cursor = None
+        if len (trs) > self.limit:
+            trs = trs [:self.limit]
+            dr  = db.daily_record.getnode (trs [-1].daily_record)
+            cursor = '%s:%s' % (dr.date.pretty (common.ymd), trs [-1].id)
+        return trs, cursor
+    # end def page
+
+    def prefetch_drs (self, trs):
+        """ Load the daily records of the given time records into the
+            node cache with one query.
+        """
+        drs = set (tr.daily_record for tr in trs)
+        if drs:
+            for id in self.db.daily_record.filter_iter (list (drs), {}):
+                pass
+    # end def prefetch_drs
+
+    def prefetch (self, trs):
+        """ Load wps and projects of the given time records into the
+            node cache with one query per class.
+        """
+        db  = self.db
+        wps = set (tr.wp for tr in trs if tr.wp)
+        if not wps:
+            return
+        for id in db.time_wp.filter_iter (list (wps), {}):
+            pass
+        prj = set (db.time_wp.get (id, 'project') for id in wps)
+        for id in db.time_project.filter_iter (list (prj), {}):
+            pass
+    # end def prefetch
+
+    def as_dict_entry (self, tr):
+        db  = self.db
+        dr  = db.daily_record.getnode (tr.daily_record)
+        usr = db.user.getnode (dr.user)
+        d   = dict \
+            ( id          = tr.id
+            , link        = self.data_path + 'time_record/' + tr.id
+            , date        = dr.date.pretty (common.ymd)
+            , duration    = tr.duration
+            , tr_duration = tr.tr_duration
+            , comment     = tr.comment
+            , user        = dict
+                ( id       = usr.id
+                , link     = self.data_path + 'user/' + usr.id
+                , username = usr.username
+                )
+            , wp            = None
+            , project       = None
+            , time_activity = None
+            )
+        if tr.wp:
+            wp = db.time_wp.getnode (tr.wp)
+            d ['wp'] = dict \
+                ( id   = wp.id
+                , link = self.data_path + 'time_wp/' + wp.id
+                , name = wp.name
+                )
+            tp = db.time_project.getnode (wp.project)
+            d ['project'] = dict \
+                ( id   = tp.id
+                , link = self.data_path + 'time_project/' + tp.id
+                , name = tp.name
+                )
+        if tr.time_activity:
+            d ['time_activity'] = dict \
+                ( id   = tr.time_activity
+                , link = self.data_path + 'time_activity/' + tr.time_activity
+                , name = db.time_activity.get (tr.time_activity, 'name')
+                )
+        return d
+    # end def as_dict_entry
+
+    def as_dict (self, rest_instance, path):
+        """ GET request for time records
+        """
+        self.data_path = path
+        uid = self.db.getuid ()
+        if not self.db.security.hasPermission ('View', uid, 'time_record'):
+            raise Unauthorised ('Permission to view time_record denied')
+        trs, cursor = self.page ()
+        self.prefetch (trs)
+        retval = {}
+        retval ['@cursor']   = cursor
+        retval ['collection'] = [self.as_dict_entry (tr) for tr in trs]
+        rest_instance.client.setHeader ("Allow", "OPTIONS, GET")
+        return 200, retval
+    # end def as_dict
+
+# end class Time_Record_Export
+
 
 def avg_hours (db, user, dy):
     try:
@@ -767,6 +1014,32 @@ class Rest_Request (RestfulInstance):
         return ld.as_dict (self, path = path)
     # end def timesheet
 
+    @Routing.route ("/aux/time_records", 'GET')
+    @_data_decorator
+    def time_records (self, input, *args, **kw):
+        """ Time records joined with date, user, wp and project for a
+            date range (date) and optional users (user, comma-separated
+            ids or usernames). The result is paginated, the '@cursor'
+            of the result is passed as parameter cursor to get the next
+            page, it is null on the last page. The page size is given
+            with limit.
+        """
+        user = date = cursor = None
+        limit = 1000
+        if 'user' in input:
+            user = lookup_users (self.db, input ['user'].value)
+        if 'date' in input:
+            date = input ['date'].value
+        if 'cursor' in input:
+            cursor = input ['cursor'].value
+        if 'limit' in input:
+            limit = int (input ['limit'].value)
+        tre = Time_Record_Export \
+            (self.db, user, date, cursor = cursor, limit = limit)
+        path = '%s/' % (self.data_path)
+        return tre.as_dict (self, path = path)
+    # end def time_records
+
 # end class Rest_Request
 
 
@@ -799,4 +1072,5 @@ def init (instance):
     reg ('current_user_dynamic',         current_user_dynamic)
     action = instance.registerAction
     action ('new_leave',                 New_Leave_Action)
+    action ('leave_accept_selected',     Accept_Selected_Leave_Action)
 # end def init
@@ -0,0 +1,42 @@
+/* Lazy-loading user picker: select elements of class user-picker only
+   contain the currently selected users, other users are searched via
+   the rest/aux/user_search endpoint while typing. Optional attributes
+   data-status (comma-separated user_status ids or names) and
+   data-role restrict the search. */
+$(document).ready(function() {
+    $("select.user-picker").each(function() {
+        var select = $(this);
+        select.select2({
+            width: "resolve",
+            allowClear: !select.prop("multiple"),
+            placeholder: "",
+            minimumInputLength: 1,
+            ajax: {
+                url: "rest/aux/user_search",
+                dataType: "json",
+                delay: 250,
+                cache: true,
+                data: function(params) {
+                    var query = { q: params.term, "@pretty": "false" };
+                    if (select.data("status")) {
+                        query.status = select.data("status");
+                    }
+                    if (select.data("role") !== undefined) {
+                        query.role = select.data("role");
+                    }
+                    return query;
+                },
+                processResults: function(data) {
+                    var results = $.map(data.data.collection, function(u) {
+                        var text = u.username;
+                        if (u.realname) {
+                            text += " (" + u.realname + ")";
+                        }
+                        return { id: u.id, text: text };
+                    });
+                    return { results: results };
+                }
+            }
+        });
+    });
+});
@@ -140,6 +140,12 @@ if 'it_issue' in db.classes :
                 'on _it_issue (_stakeholder);'
                )
 
+if 'support' in db.classes and hasattr (db, 'sql') :
+    # Exact match lookup of email and maildomain in the mail gateway
+    db.sql ('create index _contact_contact_idx on _contact (_contact);')
+    db.sql \
+        ('create index _customer_maildomain_idx on _customer (_maildomain);')
+
 if 'daily_record' in db.classes and hasattr (db, 'sql') :
     db.sql ('create index _daily_record_date_idx on _daily_record ( _date );')
     db.sql ('create index _daily_record_user_idx on _daily_record ( _user );')
@@ -239,6 +245,23 @@ if 'summary_type' in db.classes :
     summary_type.create (name = "month", is_staff = True,  order = 3)
     summary_type.create (name = "range", is_staff = True,  order = 4)
 
+def add_unique (table, columns, name = None) :
+    """ Add unique constraint, SQLite cannot add one to an existing
+        table, there we create a unique index.
+    """
+    if getattr (db, 'arg', None) == '?' :
+        name = name or '%s_uniq' % table.lstrip ('_')
+        db.sql \
+            ('create unique index %s on %s (%s);' % (name, table, columns))
+    elif name :
+        db.sql \
+            ( 'alter table %s add constraint %s unique (%s);'
+            % (table, name, columns)
+            )
+    else :
+        db.sql ('alter table %s add unique (%s);' % (table, columns))
+# end def add_unique
+
 def gen_status (cls, list) :
     for order, name, desc, trans in list :
         cls.create \
@@ -830,7 +853,7 @@ if 'sup_execution' in db.classes :
     db.sup_execution.create (order = 3, name = 'Refund')
     db.sup_execution.create (order = 4, name = 'Return')
 if 'prodcat' in db.classes :
-    db.sql ('ALTER TABLE _prodcat ADD UNIQUE (_name, _level);')
+    add_unique ('_prodcat', '_name, _level')
 if 'leave_status' in db.classes :
     v7 = db.leave_status.create (name = 'leave',            order = 7)
     v1 = db.leave_status.create (name = 'open',             order = 1)
@@ -903,7 +926,8 @@ if 'purchase_type' in db.classes :
         , roles      = "Procurement"
         , view_roles = "Procurement"
         )
-    if hasattr (db, 'sql') :
+    # SQLite floats are double precision already
+    if hasattr (db, 'sql') and getattr (db, 'arg', None) != '?' :
         db.sql ('alter table _purchase_request alter column '
                 '_total_cost type double precision;'
                )
@@ -1020,23 +1044,17 @@ if 'time_wp_summary_no' in db.classes :
         )
 
 if 'ext_tracker_state' in db.classes and hasattr (db, 'sql') :
-    db.sql \
-        ( 'alter table _ext_tracker_state add constraint '
-          'issue_ext_tracker_uniq unique '
-          '(_issue, _ext_tracker, __retired__);'
+    add_unique \
+        ( '_ext_tracker_state', '_issue, _ext_tracker, __retired__'
+        , 'issue_ext_tracker_uniq'
         )
 
 if 'kpm' in db.classes and hasattr (db, 'sql') :
-    db.sql \
-        ( 'alter table _kpm add constraint issue_uniq unique '
-          '(_issue, __retired__);'
-        )
+    add_unique ('_kpm', '_issue, __retired__', 'issue_uniq')
 
 if 'daily_record' in db.classes and hasattr (db, 'sql') :
-    db.sql \
-        ( 'alter table _daily_record add constraint '
-          'daily_record_user_date unique (_user, _date, __retired__);'
-        )
+    add_unique \
+        ('_daily_record', '_user, _date, __retired__', 'daily_record_user_date')
 if 'vac_aliq' in db.classes :
     db.vac_aliq.create (name  = 'Daily')
     db.vac_aliq.create (name  = 'Monthly')
@@ -0,0 +1,103 @@
+# Copyright (C) 2026 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# All rights reserved
+# ****************************************************************************
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+# ****************************************************************************
+#
+#++
+# Name
+#    clearance
+#
+# Purpose
+#    Graph of supervisor, clearance_by and substitute relationships of
+#    all users for computing whose time records a user may approve.
+#    The graph is built from a single query over the user table and is
+#    kept per tracker and process until the user table changes.
+#
+#--
+#
+
+import lookup_cache
+
+class Clearance_Graph (object) :
+    """ Reverse indexes over the user relationships, see approval_for
+        in extensions/interfaces.py for the rules.
+    """
+
+    def __init__ (self, db, version = None) :
+        self.version      = version
+        self.clearance_by = {}
+        self.status       = {}
+        self.supervised   = {}
+        self.cleared      = {}
+        self.subst_for    = {}
+        props = db.user.properties
+        for id in db.user.filter_iter (None, {}) :
+            user = db.user.getnode (id)
+            self.status [id]       = user.status
+            self.clearance_by [id] = user.clearance_by
+            if user.supervisor :
+                self.supervised.setdefault (user.supervisor, []).append (id)
+            if user.clearance_by :
+                self.cleared.setdefault (user.clearance_by, []).append (id)
+            if  (   'subst_active' in props
+                and user.substitute
+                and user.subst_active
+                ) :
+                self.subst_for.setdefault (user.substitute, []).append (id)
+    # end def __init__
+
+    def clearer_for (self, uid) :
+        """ Users whose subordinates uid may approve """
+        subst       = self.subst_for.get (uid, [])
+        clearer_for = self.cleared.get (uid, []) + subst
+        # clearance_by may be inherited once via subst:
+        for s in subst :
+            clearer_for.extend (self.cleared.get (s, []))
+        if not self.clearance_by.get (uid) :
+            clearer_for.append (uid)
+        return clearer_for
+    # end def clearer_for
+
+    def approval_for (self, uid) :
+        """ Set of users for which uid may approve, uid itself is not
+            included.
+        """
+        result = set ()
+        for c in self.clearer_for (uid) :
+            result.update (self.supervised.get (c, []))
+        result.discard (uid)
+        return result
+    # end def approval_for
+
+# end class Clearance_Graph
+
+_graphs = {}
+
+def clearance_graph (db) :
+    """ Return graph for the tracker of db, rebuilt if the user table
+        changed.
+    """
+    version = lookup_cache.table_version (db, 'user')
+    key     = db.config.TRACKER_HOME
+    graph   = _graphs.get (key)
+    if version is None or graph is None or graph.version != version :
+        graph = Clearance_Graph (db, version)
+        if version is not None :
+            _graphs [key] = graph
+    return graph
+# end def clearance_graph
@@ -36,6 +36,7 @@
 from __future__ import print_function
 import locale
 import datetime
+import hashlib
 from html import escape
 try:
     from urllib.parse import quote as urlquote
@@ -1189,6 +1190,19 @@ class Size_Limit (object):
 
 # end class Size_Limit
 
+def content_digest (content):
+    """ Hex digest of file content, used for comparing files without
+        reading their content.
+    >>> content_digest (b'abc')[:16]
+    'ba7816bf8f01cfea'
+    >>> content_digest ('abc')[:16]
+    'ba7816bf8f01cfea'
+    """
+    if not isinstance (content, bytes):
+        content = content.encode ('utf-8')
+    return hashlib.sha256 (content).hexdigest ()
+# end def content_digest
+
 def fix_date (date):
     if date:
         return Date (date.pretty (ymd))
@@ -22,25 +22,56 @@
 
 import common
 
-def check_domain_permission (db, uid, ad_domain) :
-    """ Get all domain permission records for this user with all roles.
-        Then check if the user has permission to edit ad_domain
-        Return the domain_permission if found.
-        Note that we return the *first* one found, there shouldn't be
-        several.
+def domain_permission_index (db) :
+    """ Index ad_domain -> (domain_permission id, users, roles) of all
+        non-retired domain_permission records. Cached in db, cleared
+        with the node cache and when a domain_permission changes.
     """
-    user    = db.user.getnode (uid)
-    roles   = set (common.role_list (user.roles))
-    dpids   = db.domain_permission.filter (None, dict (users = uid))
+    try :
+        idx = db.domain_permission_index
+    except AttributeError :
+        def domain_permission_index_clear (db) :
+            db.domain_permission_index = None
+        db.registerClearCacheCallback (domain_permission_index_clear, db)
+        idx = None
+    if idx is not None :
+        return idx
+    idx = {}
     for dpid in db.domain_permission.getnodeids (retired = False) :
         dp = db.domain_permission.getnode (dpid)
-        if dp.ad_domain != ad_domain :
-            continue
-        if uid in dp.users :
-            return dp
-        rl = set (common.role_list (dp.roles_enabled))
-        if roles & rl :
-            return dp
+        idx [dp.ad_domain] = \
+            ( dpid
+            , frozenset (dp.users)
+            , frozenset (common.role_list (dp.roles_enabled))
+            )
+    db.domain_permission_index = idx
+    return idx
+# end def domain_permission_index
+
+def invalidate_domain_permission (db, cl, nodeid, old_values) :
+    """ Reactor: Drop the index, it is only created (together with its
+        clear-cache callback) by domain_permission_index.
+    """
+    if hasattr (db, 'domain_permission_index') :
+        db.domain_permission_index = None
+# end def invalidate_domain_permission
+
+def check_domain_permission (db, uid, ad_domain) :
+    """ Check if the user has permission to edit ad_domain either
+        directly or via one of the roles of the user.
+        Return the domain_permission if found.
+        Since ad_domain is the key of domain_permission there can be
+        only one.
+    """
+    try :
+        dpid, users, roles = domain_permission_index (db) [ad_domain]
+    except KeyError :
+        return None
+    if uid in users :
+        return db.domain_permission.getnode (dpid)
+    user = db.user.getnode (uid)
+    if roles & set (common.role_list (user.roles)) :
+        return db.domain_permission.getnode (dpid)
     return None
 # end def check_domain_permission
 
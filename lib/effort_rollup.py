@@ -0,0 +1,205 @@
+# Copyright (C) 2026 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# All rights reserved
+# ****************************************************************************
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+# ****************************************************************************
+#
+#++
+# Name
+#    effort_rollup
+#
+# Purpose
+#    Booked hours per work package and month in the SQL table
+#    effort_rollup. Like the summary report we count the tr_duration of
+#    a time record (reduced travel time) if set, the duration otherwise.
+#    The table is kept up to date by the reactors in
+#    detectors/d_effort_rollup.py and can be rebuilt with
+#    utils/effort_rollup.py. The reactors only append rows with the
+#    change of hours, an update of a single row per work package and
+#    month would make concurrent bookings on the same work package
+#    wait for each other's row lock. So there may be several rows per
+#    work package and month, queries sum them up. The rows are merged
+#    with compact (utils/effort_rollup.py --compact, e.g. nightly).
+#    Sums for projects, cost centers and cost center groups are
+#    computed from the rows joined with the current work package, so
+#    moving a work package to another project or cost center needs no
+#    maintenance of the rollup.
+#    Only available for SQL backends.
+#
+#--
+#
+
+table = 'effort_rollup'
+
+# Level -> (join, group-by column) relative to effort_rollup r
+levels = dict \
+    ( wp                = ('', 'r.wp')
+    , project           =
+        ( 'join _time_wp as w on w.id = r.wp and w.__retired__ = 0'
+        , 'w._project'
+        )
+    , cost_center       =
+        ( 'join _time_wp as w on w.id = r.wp and w.__retired__ = 0'
+        , 'w._cost_center'
+        )
+    , cost_center_group =
+        ( 'join _time_wp as w on w.id = r.wp and w.__retired__ = 0 '
+          'join _cost_center as c on c.id = w._cost_center'
+          ' and c.__retired__ = 0'
+        , 'c._cost_center_group'
+        )
+    )
+
+def hours (tr_duration, duration) :
+    """ Hours counted for a time record, as in the summary report
+
+        >>> hours (None, 8)
+        8
+        >>> hours (3.0, 4)
+        3.0
+    """
+    return tr_duration or duration
+# end def hours
+
+def month (date) :
+    """ Month key of a roundup date
+
+        >>> from roundup.date import Date
+        >>> month (Date ('2026-03-31.23:00'))
+        '2026-03'
+    """
+    return date.pretty ('%Y-%m')
+# end def month
+
+def exists (db) :
+    """ Check if the rollup table exists, the result is cached in db """
+    try :
+        return db.effort_rollup_exists
+    except AttributeError :
+        pass
+    result = False
+    if hasattr (db, 'conn') :
+        if db.arg == '?' :
+            db.sql \
+                ( "select count (*) from sqlite_master"
+                  " where type = 'table' and name = '%s'" % table
+                )
+        else :
+            db.sql \
+                ( "select count (*) from information_schema.tables"
+                  " where table_name = '%s'" % table
+                )
+        result = bool (db.cursor.fetchone () [0])
+    db.effort_rollup_exists = result
+    return result
+# end def exists
+
+def create (db) :
+    db.sql \
+        ( 'create table %s (wp integer not null, month char(7) not null,'
+          ' duration float not null)' % table
+        )
+    db.sql ('create index %s_wp_month on %s (wp, month)' % (table, table))
+    db.effort_rollup_exists = True
+# end def create
+
+def rebuild (db) :
+    """ Recompute the whole table from the time records, the table is
+        re-created to get the current table definition.
+    """
+    if exists (db) :
+        db.sql ('drop table %s' % table)
+    create (db)
+    # SQLite stores serialised dates (yyyymmddHHMMSS)
+    mon = "substr (cast (dr._date as varchar), 1, 7)"
+    if db.arg == '?' :
+        mon = "substr (dr._date, 1, 4) || '-' || substr (dr._date, 5, 2)"
+    db.sql \
+        ( 'insert into %s (wp, month, duration)'
+          ' select tr._wp, %s'
+          ' , sum (coalesce (nullif (tr._tr_duration, 0), tr._duration))'
+          ' from _time_record as tr'
+          ' join _daily_record as dr on dr.id = tr._daily_record'
+          ' and dr.__retired__ = 0'
+          ' where tr.__retired__ = 0 and tr._wp is not NULL'
+          ' and tr._duration is not NULL'
+          ' group by tr._wp, %s'
+        % (table, mon, mon)
+        )
+# end def rebuild
+
+def compact (db) :
+    """ Merge the rows of each work package and month into one. With
+        PostgreSQL exactly the deleted rows are summed, so this can run
+        concurrently with bookings. SQLite serializes writers, there
+        we simply rebuild.
+    """
+    if db.arg == '?' :
+        rebuild (db)
+        return
+    db.sql \
+        ( 'with d as (delete from %s returning wp, month, duration)'
+          ' insert into %s (wp, month, duration)'
+          ' select wp, month, sum (duration) from d group by wp, month'
+          ' having sum (duration) != 0'
+        % (table, table)
+        )
+# end def compact
+
+def add (db, wp, date, duration) :
+    """ Add duration (may be negative) to the rollup of wp in the month
+        of date by appending a row. Runs in the current transaction.
+    """
+    if not wp or not duration or not exists (db) :
+        return
+    a = db.arg
+    db.sql \
+        ( 'insert into %s (wp, month, duration) values (%s, %s, %s)'
+        % (table, a, a, a)
+        , (int (wp), month (date), duration)
+        )
+# end def add
+
+def rollup (db, level = 'wp', start = None, end = None, ids = None) :
+    """ Booked hours grouped by level (wp, project, cost_center or
+        cost_center_group) for the months from start to end (roundup
+        dates, both inclusive), optionally restricted to the given ids
+        of level, an empty list of ids yields an empty result.
+        Returns a dict of id -> hours.
+    """
+    join, col = levels [level]
+    where = []
+    args  = []
+    if ids is not None and not ids :
+        return {}
+    if start :
+        where.append ('r.month >= %s' % db.arg)
+        args.append  (month (start))
+    if end :
+        where.append ('r.month <= %s' % db.arg)
+        args.append  (month (end))
+    if ids :
+        ids = [int (i) for i in ids]
+        where.append ('%s in (%s)' % (col, ','.join ([db.arg] * len (ids))))
+        args.extend  (ids)
+    sql = 'select %s, sum (r.duration) from %s as r %s' % (col, table, join)
+    if where :
+        sql += ' where ' + ' and '.join (where)
+    sql += ' group by %s' % col
+    db.sql (sql, args)
+    return dict ((str (k), v) for k, v in db.cursor.fetchall () if k and v)
+# end def rollup
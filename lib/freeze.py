@@ -50,6 +50,32 @@ def frozen (db, user, date, order = '+') :
     return f
 # end def frozen
 
+def frozen_users (db, user_dates) :
+    """ Bulk version of frozen: user_dates is a dict of user -> date,
+        return the set of users for which date is frozen. Uses a
+        single query for all users.
+    """
+    if not user_dates :
+        return set ()
+    dates = dict \
+        ((u, Date (d.pretty ('%Y-%m-%d'))) for u, d in user_dates.items ())
+    start = min (dates.values ())
+    f     = db.daily_record_freeze.filter_iter \
+        ( None
+        , dict
+            ( user   = list (dates)
+            , date   = start.pretty ('%Y-%m-%d;')
+            , frozen = True
+            )
+        )
+    result = set ()
+    for id in f :
+        fr = db.daily_record_freeze.getnode (id)
+        if fr.date >= dates [fr.user] :
+            result.add (fr.user)
+    return result
+# end def frozen_users
+
 def freeze_date (db, uid) :
     now    = Date ('.')
     freeze = find_prev_dr_freeze (db, uid, now)
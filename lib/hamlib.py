@@ -30,26 +30,199 @@
 #--
 #
 
-def fix_qsl_status (db, qso_id) :
-    """Fix stati (qsl_r_status, qsl_s_status, no_qsl_status) for whole db.
-       can be used after changing the status and qsl_type configuration.
+import re
+from   roundup.date import Date
+import lookup_cache
+
+def fix_qsl_stati (db, qso_ids) :
+    """Fix stati (qsl_r_status, qsl_s_status, no_qsl_status) of the
+       given QSOs, can be used after changing the status and qsl_type
+       configuration. The QSLs of all QSOs are retrieved with one
+       query, the qsl_type and qsl_status tables are cached. Only QSOs
+       with changed stati are updated.
     """
-    stati = dict (qsl_r_status = 0, qsl_s_status = 0, no_qsl_status = 0)
-    qsl_ids = db.qsl.filter (None, dict (qso = qso_id))
-    for qsl_id in qsl_ids :
+    qso_ids = list (qso_ids)
+    if not qso_ids :
+        return
+    code    = lookup_cache.values  (db, 'qsl_type',   'code')
+    status  = lookup_cache.mapping (db, 'qsl_status', 'code')
+    props   = ('qsl_r_status', 'qsl_s_status', 'no_qsl_status')
+    stati   = dict ((id, dict.fromkeys (props, 0)) for id in qso_ids)
+    for qsl_id in db.qsl.filter_iter (None, dict (qso = qso_ids)) :
         qsl = db.qsl.getnode (qsl_id)
+        if qsl.qso not in stati :
+            continue
         if qsl.date_recv :
-            stati ['qsl_r_status'] \
-                |= int (db.qsl_type.get (qsl.qsl_type, 'code'))
+            stati [qsl.qso]['qsl_r_status'] |= int (code [qsl.qsl_type])
         if qsl.date_sent :
-            stati ['qsl_s_status'] \
-                |= int (db.qsl_type.get (qsl.qsl_type, 'code'))
-    for qsl_type_id in db.qso.get (qso_id, 'wont_qsl_via') :
-        stati ['no_qsl_status'] |= int (db.qsl_type.get (qsl_type_id, 'code'))
-    for k in stati :
-        stati [k] = db.qsl_status.filter (None, dict (code = stati [k])) [0]
-    db.qso.set (qso_id, **stati)
+            stati [qsl.qso]['qsl_s_status'] |= int (code [qsl.qsl_type])
+    for qso_id in qso_ids :
+        qso = db.qso.getnode (qso_id)
+        st  = stati [qso_id]
+        for qsl_type_id in qso.wont_qsl_via :
+            st ['no_qsl_status'] |= int (code [qsl_type_id])
+        for k in st :
+            st [k] = status [st [k]]
+        changed = dict ((k, v) for k, v in st.items () if qso [k] != v)
+        if changed :
+            db.qso.set (qso_id, **changed)
+# end def fix_qsl_stati
+
+def fix_qsl_status (db, *qso_ids) :
+    """Fix stati of the given QSOs (used by the detectors). If
+       recomputation is deferred (see Deferred_QSL_Status), the QSOs
+       are only remembered.
+    """
+    deferred = getattr (db, 'qsl_status_deferred', None)
+    if deferred is not None :
+        deferred.update (qso_ids)
+    else :
+        fix_qsl_stati (db, qso_ids)
 # end def fix_qsl_status
 
+class Deferred_QSL_Status (object) :
+    """Context manager that collects QSOs changed by the detectors and
+       fixes their stati in bulk when calling flush or on exit.
+    """
+
+    def __init__ (self, db) :
+        self.db = db
+    # end def __init__
+
+    def __enter__ (self) :
+        self.db.qsl_status_deferred = set ()
+        return self
+    # end def __enter__
+
+    def flush (self) :
+        ids = self.db.qsl_status_deferred
+        self.db.qsl_status_deferred = None
+        try :
+            fix_qsl_stati (self.db, sorted (ids, key = int))
+        finally :
+            self.db.qsl_status_deferred = set ()
+    # end def flush
+
+    def __exit__ (self, tp, value, tb) :
+        if tp is None :
+            self.flush ()
+        self.db.qsl_status_deferred = None
+    # end def __exit__
+
+# end class Deferred_QSL_Status
+
+adif_field = re.compile (br'<([A-Za-z0-9_]+)(?::(\d+)(?::[A-Za-z])?)?>')
+
+def adif_records (f, blocksize = 65536, encoding = 'utf-8') :
+    """Parse ADIF from binary file object f and yield a dict with
+       lower-case field names per record. Field lengths in ADIF count
+       bytes, so parsing is done on bytes and only the field values
+       are decoded with the given encoding. The file is read in
+       blocks, so large logs are never held in memory completely.
+
+       >>> from io import BytesIO
+       >>> s = b'x<EOH><CALL:4>OE3X<NAME:5>J\\xc3\\xbcrg<eor><CALL:2>K1<EOR>'
+       >>> [r ['call'] for r in adif_records (BytesIO (s), 5)]
+       ['OE3X', 'K1']
+       >>> next (adif_records (BytesIO (s), 5)) ['name'] == u'J\\xfcrg'
+       True
+    """
+    buf    = b''
+    record = {}
+    eof    = False
+    while True :
+        m = adif_field.search (buf)
+        if m and m.group (2) is not None :
+            end = m.end () + int (m.group (2))
+            if end > len (buf) and not eof :
+                m = None
+        if not m or (not eof and m.end () == len (buf)) :
+            if eof :
+                break
+            block = f.read (blocksize)
+            if not block :
+                eof = True
+            buf += block
+            continue
+        name = m.group (1).decode ('ascii').lower ()
+        if name == 'eoh' :
+            record = {}
+        elif name == 'eor' :
+            if record :
+                yield record
+            record = {}
+        elif m.group (2) is not None :
+            value = buf [m.end ():end]
+            record [name] = value.decode (encoding, 'replace')
+            buf = buf [end:]
+            continue
+        buf = buf [m.end ():]
+    if record :
+        yield record
+# end def adif_records
+
+def adif_date (date, time = None) :
+    """Convert ADIF date (and optional time) to roundup Date
+
+       >>> adif_date ('20240102', '1234')
+       <Date 2024-01-02.12:34:00.000>
+       >>> adif_date ('20240102', '123456')
+       <Date 2024-01-02.12:34:56.000>
+    """
+    d = '%s-%s-%s' % (date [:4], date [4:6], date [6:8])
+    if time :
+        time = (time + '00') [:6]
+        d += '.%s:%s:%s' % (time [:2], time [2:4], time [4:6])
+    return Date (d)
+# end def adif_date
+
+class ADIF_Resolver (object) :
+    """Resolve ADIF field values to ids of mode, band and dxcc_entity
+       using the cached lookup tables.
+    """
+
+    def __init__ (self, db) :
+        self.db = db
+    # end def __init__
+
+    def band (self, name) :
+        bands = lookup_cache.values (self.db, 'ham_band', 'name')
+        for id, n in bands.items () :
+            if n.lower () == name.lower () :
+                return id
+        return None
+    # end def band
+
+    def mode (self, mode, submode = None) :
+        db  = self.db
+        md  = lookup_cache.values (db, 'ham_mode', 'adif_mode')
+        smd = lookup_cache.values (db, 'ham_mode', 'adif_submode')
+        mode    = (mode or '').upper ()
+        submode = (submode or '').upper ()
+        found   = None
+        for id in sorted (md, key = int) :
+            if (md [id] or '').upper () != mode :
+                continue
+            if (smd [id] or '').upper () == submode :
+                return id
+            if not smd [id] and not found :
+                found = id
+        if not found :
+            try :
+                found = lookup_cache.lookup (db, 'ham_mode', submode or mode)
+            except KeyError :
+                pass
+        return found
+    # end def mode
+
+    def dxcc_entity (self, code) :
+        try :
+            return lookup_cache.lookup (self.db, 'dxcc_entity', code)
+        except KeyError :
+            return None
+    # end def dxcc_entity
+
+# end class ADIF_Resolver
+
 
 ### __END__
@@ -1,6 +1,12 @@
 #!/usr/bin/python
 # -*- coding: iso-8859-1 -*-
+from __future__ import print_function
+import os
 import sys
+import hmac
+import time
+import hashlib
+import threading
 
 from imaplib             import IMAP4
 from rsclib.autosuper    import autosuper
@@ -8,13 +14,131 @@ from roundup.password    import Password
 from roundup.cgi.actions import LoginAction
 from roundup.cgi         import exceptions
 
+# Process-wide login caches indexed by tracker home, see get_login_cache
+imap_login_cache      = {}
+imap_login_cache_lock = threading.Lock ()
+
+class IMAP_Login_Cache (object) :
+    """ State kept across logins for the tracker: Salted verifiers of
+        recently checked credentials (so a repeated login within ttl
+        seconds doesn't need the IMAP server), a small pool of IMAP
+        connections that are not logged in, and the failed login
+        attempts per user: After max_failures failed attempts further
+        logins of that user are rejected without asking the IMAP server
+        for backoff seconds, doubled with each further failure up to
+        max_backoff.
+    """
+
+    iterations = 10000
+
+    def __init__ (self, db) :
+        cfg = db.config.ext
+        self.address      = check_imap_config (db)
+        self.ttl          = int (getattr (cfg, 'IMAP_LOGIN_CACHE_TTL', 300))
+        self.pool_size    = int (getattr (cfg, 'IMAP_POOL_SIZE', 4))
+        self.max_failures = int (getattr (cfg, 'IMAP_LOGIN_MAX_FAILURES', 5))
+        self.backoff      = int (getattr (cfg, 'IMAP_LOGIN_BACKOFF', 30))
+        self.max_backoff  = int (getattr (cfg, 'IMAP_LOGIN_MAX_BACKOFF', 900))
+        self.lock         = threading.Lock ()
+        self.verifiers    = {}
+        self.failures     = {}
+        self.pool         = []
+    # end def __init__
+
+    def _digest (self, salt, password) :
+        return hashlib.pbkdf2_hmac \
+            ('sha256', password.encode ('utf-8'), salt, self.iterations)
+    # end def _digest
+
+    def verify (self, username, password) :
+        """ True if the password matches the verifier stored for
+            username within the last ttl seconds.
+        """
+        with self.lock :
+            v = self.verifiers.get (username)
+        if not v or not password :
+            return False
+        salt, digest, t = v
+        if time.time () - t >= self.ttl :
+            return False
+        return hmac.compare_digest (digest, self._digest (salt, password))
+    # end def verify
+
+    def remember (self, username, password) :
+        if not self.ttl :
+            return
+        salt = os.urandom (16)
+        v    = (salt, self._digest (salt, password), time.time ())
+        with self.lock :
+            self.verifiers [username] = v
+            self.failures.pop (username, None)
+    # end def remember
+
+    def blocked (self, username) :
+        """ True if logins of username are currently rate-limited """
+        with self.lock :
+            count, t = self.failures.get (username, (0, 0))
+        if count < self.max_failures :
+            return False
+        wait = self.backoff * 2 ** (count - self.max_failures)
+        return time.time () - t < min (wait, self.max_backoff)
+    # end def blocked
+
+    def failed (self, username) :
+        with self.lock :
+            count, t = self.failures.get (username, (0, 0))
+            self.failures [username] = (count + 1, time.time ())
+            self.verifiers.pop (username, None)
+    # end def failed
+
+    def connection (self) :
+        """ Return an IMAP connection that is not logged in, from the
+            pool if a connection there is still alive.
+        """
+        while True :
+            with self.lock :
+                if not self.pool :
+                    break
+                imap = self.pool.pop ()
+            try :
+                imap.noop ()
+                return imap
+            except (IMAP4.error, OSError) :
+                pass
+        return IMAP4 (* self.address)
+    # end def connection
+
+    def release (self, imap) :
+        """ Return a connection that is not logged in to the pool """
+        with self.lock :
+            if len (self.pool) < self.pool_size :
+                self.pool.append (imap)
+                return
+        try :
+            imap.shutdown ()
+        except OSError :
+            pass
+    # end def release
+
+# end class IMAP_Login_Cache
+
+def get_login_cache (db) :
+    """ Return the process-wide IMAP_Login_Cache of the tracker of db """
+    key = db.config.TRACKER_HOME
+    with imap_login_cache_lock :
+        cache = imap_login_cache.get (key)
+        if cache is None :
+            cache = imap_login_cache [key] = IMAP_Login_Cache (db)
+    return cache
+# end def get_login_cache
+
 class IMAP_Roundup_Sync (object) :
     """ Sync users from IMAP to Roundup """
 
     roundup_group = 'roundup-users'
     page_size     = 50
     
-    def __init__ (self, db, update_roundup = None) :
+    def __init__ (self, db, update_roundup = None, login_cache = None) :
         self.db             = db
         self.cfg            = db.config.ext
         self.update_roundup = update_roundup
@@ -35,7 +159,7 @@ class IMAP_Roundup_Sync (object) :
         else :
             self.update_roles = False
 
-        self.imap = IMAP4 (* check_imap_config (self.db))
+        self.login_cache = login_cache or IMAP_Login_Cache (db)
 
         self.valid_stati     = []
         self.status_obsolete = db.user_status.lookup ('obsolete')
@@ -44,15 +168,30 @@ class IMAP_Roundup_Sync (object) :
     # end def __init__
 
     def bind_as_user (self, username, password) :
+        """ Check password by logging in to the IMAP server. A
+            successful login is remembered in the login cache and the
+            connection is closed, after a failed login the (still not
+            logged in) connection is returned to the pool.
+        """
         if not username :
             return None
-        try :
-            self.imap.login (username, password)
+        cache = self.login_cache
+        if cache.verify (username, password) :
             return True
+        imap = cache.connection ()
+        try :
+            imap.login (username, password)
         except IMAP4.error as e :
-            print >> sys.stderr, e
+            print (e, file = sys.stderr)
+            cache.failed (username)
+            cache.release (imap)
+            return None
+        try :
+            imap.logout ()
+        except (IMAP4.error, OSError) :
             pass
-        return None
+        cache.remember (username, password)
+        return True
     # end def bind_as_user
 
     def sync_user_from_imap (self, username, status, pw = None, update = None) :
@@ -72,8 +211,10 @@ class IMAP_Roundup_Sync (object) :
                 roles = self.db.config.NEW_WEB_USER_ROLES
             if  (   self.update_roundup
                 and (self.update_roles or user.status != self.status_valid)
+                and (user.status != status or (user.roles or '') != roles)
                 ) :
                 self.db.user.set (uid, status = status, roles = roles)
+                self.db.commit ()
         else :
             # nothing to do if user not existing and imap says it's obsolete
             if status == self.status_obsolete :
@@ -89,7 +230,7 @@ class IMAP_Roundup_Sync (object) :
                         , roles    = roles
                         , timezone = 'Europe/Vienna'
                         )
-        self.db.commit ()
+                    self.db.commit ()
     # end def sync_user_from_imap
 
 # end IMAP_Roundup_Sync
@@ -115,7 +256,8 @@ class ImapLoginAction (LoginAction, autosuper) :
     def try_imap (self) :
         adr = check_imap_config (self.db)
         if adr :
-            self.imsync = IMAP_Roundup_Sync (self.db)
+            self.imsync = IMAP_Roundup_Sync \
+                (self.db, login_cache = get_login_cache (self.db))
         return bool (adr)
     # end def try_imap
 
@@ -135,6 +277,8 @@ class ImapLoginAction (LoginAction, autosuper) :
                 raise exceptions.LoginError (self._ ('Invalid login'))
             if user and user.status not in self.imsync.status_sync :
                 return self.__super.verifyLogin (username, password)
+            if self.imsync.login_cache.blocked (username) :
+                raise exceptions.LoginError (self._ ('Invalid login'))
             if not self.imsync.bind_as_user (username, password) :
                 self.imsync.sync_user_from_imap (username, obsolete)
                 raise exceptions.LoginError (self._ ('Invalid login'))
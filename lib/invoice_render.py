@@ -0,0 +1,144 @@
+#! /usr/bin/python
+# Copyright (C) 2005-21 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# All rights reserved
+# ****************************************************************************
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+# ****************************************************************************
+#
+#++
+# Name
+#    invoice_render
+#
+# Purpose
+#    Mail-merge invoices into OOo templates. This lives in the tracker
+#    lib (and not in the mark_invoices extension) so that it can be
+#    imported by the worker processes rendering invoice chunks.
+#--
+
+import os
+import sys
+from io                             import BytesIO
+
+from roundup                        import hyperdb, instance
+from roundup.date                   import Date
+
+try :
+    import ooopy.Transforms as Transforms
+    from ooopy.OOoPy                    import OOoPy
+    from ooopy.Transformer              import Transformer, autosuper
+    from ooopy.Transforms               import renumber_all, get_meta, set_meta
+except ImportError :
+    from rsclib.autosuper               import autosuper
+
+class OOoPy_Invoice_Wrapper (autosuper) :
+    def __init__ (self, db, iv, date = None, address = None) :
+        self.db = db
+        if not date :
+            date = Date ('.')
+        self.items = {'date' : date}
+        if iv :
+            self.items ['invoice'] = iv
+        if not address :
+            address = self._deref ('invoice.payer')
+        self.items ['address'] = address
+    # end def __init__
+
+    def _pretty (self, item) :
+        if isinstance (item, Date) :
+            return item.pretty ('%d. %m. %Y')
+        return str (item)
+    # end def _pretty
+
+    def _deref (self, name) :
+        """ dereference a dotted name -- we may want to cache this."""
+        names = name.split ('.')
+        x  = self.items [names [0]]
+        if not x :
+            raise KeyError (names [0])
+        for i in names [1:] :
+            p = x.cl.properties [i]
+            if isinstance (p, hyperdb.Link) :
+                x = self.db.getclass (p.classname).getnode (x [i])
+            else :
+                x = x [i]
+        if x : return x
+        return ""
+    # end def _split
+
+    def __getitem__ (self, name) :
+        return self._pretty (self._deref (name))
+    # end def __getitem__
+
+    def __contains__ (self, name) :
+        try :
+            self._deref (name)
+        except KeyError :
+            return False
+        return True
+    # end def __contains__
+
+# end class OOoPy_Invoice_Wrapper
+
+def render_invoices (db, fileid, ivids, outname) :
+    """ Mail-merge the invoices with the given ids into the template
+        file, the result is written to file outname. Returns mimetype.
+    """
+    o = OOoPy \
+        ( infile  = BytesIO (db.file.get (fileid, 'binary_content'))
+        , outfile = outname
+        )
+    ivs = [OOoPy_Invoice_Wrapper (db, db.invoice.getnode (i)) for i in ivids]
+    t = Transformer \
+        ( o.mimetype
+        , get_meta (o.mimetype)
+        , Transforms.Addpagebreak_Style ()
+        , Transforms.Mailmerge (iterator = ivs)
+        , renumber_all (o.mimetype)
+        , set_meta     (o.mimetype)
+        , Transforms.Fix_OOo_Tag ()
+        )
+    t.transform (o)
+    mimetype = o.mimetype
+    o.close ()
+    return mimetype
+# end def render_invoices
+
+def render_chunk (tracker_home, fileid, ivids, outname) :
+    """ Render a chunk of invoices in a worker process. The worker
+        opens its own db of the tracker and closes it when done.
+    """
+    db = instance.open (tracker_home).open ('admin')
+    try :
+        return render_invoices (db, fileid, ivids, outname)
+    finally :
+        db.close ()
+# end def render_chunk
+
+def start_pool (context, processes = None) :
+    """ Start a pool of worker processes with the given multiprocessing
+        context. Our directory is in sys.path only while the tracker
+        loads its extensions, the workers need it for importing
+        render_chunk.
+    """
+    libdir = os.path.dirname (os.path.abspath (__file__))
+    sys.path.insert (1, libdir)
+    try :
+        return context.Pool (processes)
+    finally :
+        sys.path.remove (libdir)
+# end def start_pool
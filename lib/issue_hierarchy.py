@@ -0,0 +1,144 @@
+#! /usr/bin/python
+# Copyright (C) 2026 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# All rights reserved
+# ****************************************************************************
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+# ****************************************************************************
+#
+#++
+# Name
+#    issue_hierarchy
+#
+# Purpose
+#    Propagate effective_prio (top-down) and maturity_index (bottom-up)
+#    through the part_of/composed_of hierarchy of issues. The new
+#    values for the whole tree are computed in one traversal, then each
+#    affected issue is written once. While writing, the hierarchy
+#    reactors in detectors/issue.py are disabled, they would otherwise
+#    start the propagation again for every level.
+#
+#--
+#
+
+class Propagation (object) :
+    """ Context manager that marks db while the propagation of prop
+        writes its results, see active.
+    """
+
+    def __init__ (self, db, prop) :
+        self.db   = db
+        self.prop = prop
+    # end def __init__
+
+    def __enter__ (self) :
+        self.prev = getattr (self.db, 'issue_hierarchy_active', frozenset ())
+        self.db.issue_hierarchy_active = self.prev | frozenset ((self.prop,))
+        return self
+    # end def __enter__
+
+    def __exit__ (self, tp, value, tb) :
+        self.db.issue_hierarchy_active = self.prev
+    # end def __exit__
+
+# end class Propagation
+
+def active (db, prop) :
+    """ True while a propagation of prop writes its results """
+    return prop in getattr (db, 'issue_hierarchy_active', ())
+# end def active
+
+def effective_prio (prio, parent_prio) :
+    """ Same rule as the update_eff_prio auditor
+
+        >>> effective_prio (10, 20)
+        20
+        >>> effective_prio (30, 20)
+        30
+        >>> effective_prio (30, None)
+        30
+    """
+    if parent_prio is not None and parent_prio > prio :
+        return parent_prio
+    return prio
+# end def effective_prio
+
+def propagate_effective_prio (db, cl, nodeid) :
+    """ Recompute effective_prio of all non-closed descendants of nodeid
+        top-down. Children of closed issues are not touched. Each level
+        is retrieved with one query, only changed issues are written,
+        parents before children.
+    """
+    closed  = db.status.lookup ('closed')
+    eff     = {nodeid : cl.get (nodeid, 'effective_prio')}
+    level   = [nodeid]
+    changes = []
+    while level :
+        next_level = []
+        for id in cl.filter_iter (None, dict (part_of = level)) :
+            child = cl.getnode (id)
+            if child.status == closed :
+                continue
+            prio = effective_prio (child.priority, eff [child.part_of])
+            if prio == child.effective_prio :
+                continue
+            eff [id] = prio
+            changes.append ((id, prio))
+            next_level.append (id)
+        level = next_level
+    with Propagation (db, 'effective_prio') :
+        for id, prio in changes :
+            cl.set (id, effective_prio = prio)
+# end def propagate_effective_prio
+
+def propagate_maturity_index (db, cl, ids, compute) :
+    """ Recompute maturity_index of the given issues and all their
+        ancestors bottom-up: The maturity_index of a container is the
+        sum over its children. For issues without children compute
+        (nodeid) is called. Each changed issue is written once, children
+        before parents.
+    """
+    mi      = {}
+    todo    = [id for id in dict.fromkeys (ids) if id]
+    while todo :
+        id    = todo.pop (0)
+        node  = cl.getnode (id)
+        co    = node.composed_of
+        if co :
+            new = sum (mi.get (c, cl.get (c, 'maturity_index')) for c in co)
+        else :
+            new = compute (id)
+        if new == mi.get (id, node.maturity_index) :
+            continue
+        mi [id] = new
+        if node.part_of :
+            todo.append (node.part_of)
+    # Write children before parents
+    depth = {}
+    for id in mi :
+        depth [id] = 0
+        p = cl.get (id, 'part_of')
+        while p :
+            depth [id] += 1
+            p = cl.get (p, 'part_of')
+    with Propagation (db, 'maturity_index') :
+        for id in sorted (mi, key = lambda x : -depth [x]) :
+            if mi [id] != cl.get (id, 'maturity_index') :
+                cl.set (id, maturity_index = mi [id])
+# end def propagate_maturity_index
+
+### __END__
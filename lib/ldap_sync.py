@@ -6,6 +6,8 @@ import ldap3
 import user_dynamic
 import common
 import io
+import time
+import threading
 
 from copy                  import copy
 from ldap3.utils.conv      import escape_bytes
@@ -25,6 +27,13 @@ LDAPCursorError    = ldap3.core.exceptions.LDAPCursorError
 LDAPKeyError       = ldap3.core.exceptions.LDAPKeyError
 LDAPInvalidDnError = ldap3.core.exceptions.LDAPInvalidDnError
 
+# Process-wide pools of idle LDAP_Roundup_Sync objects and the time of
+# the last login sync of each user, both indexed by tracker home and
+# LDAP URI, see get_ldap_sync
+ldap_sync_cache      = {}
+ldap_sync_cache_lock = threading.Lock ()
+ldap_last_synced     = {}
+
 class Pic:
 
     def __init__ (self, fileobj):
@@ -433,32 +442,10 @@ class LDAP_Roundup_Sync (Log):
                     setattr (self, k, True)
             self.debug (2, "%s: %s" % (k, getattr (self, k)))
 
-        self.info ('Connect to LDAP: %s' % self.cfg.LDAP_URI)
         if ldap is None:
             ldap = ldap3
-        self.server = ldap.Server (self.cfg.LDAP_URI, get_info = ldap3.ALL)
-        self.debug (4, 'Server')
-        # auto_range:
-        # https://docs.microsoft.com/en-us/previous-versions/windows/desktop/ldap/searching-using-range-retrieval
-        self.ldcon  = ldap.Connection \
-            ( self.server
-            , self.cfg.LDAP_BIND_DN
-            , self.cfg.LDAP_PASSWORD
-            , auto_range = True # auto range tag handling RFC 3866
-            )
-        # start_tls won't work without a previous open, may be a
-        # microsoft specific feature -- the ldap3 docs say otherwise
-        self.ldcon.open      ()
-        # Double negation because we want the default to be *with* starttls
-        ldaps = self.cfg.LDAP_URI.startswith ('ldaps')
-        if not ldaps:
-            no_starttls = config_read_boolean \
-                (self.db.config.ext, 'LDAP_NO_STARTTLS')
-            if not no_starttls:
-                self.ldcon.start_tls ()
-        self.debug (2, 'TLS: %s' % (ldaps or not no_starttls))
-        self.ldcon.bind ()
-        self.debug (4, 'Bind')
+        self.ldap = ldap
+        self.connect ()
         self.schema = self.server.schema
 
         self.valid_stati     = []
@@ -488,8 +475,49 @@ class LDAP_Roundup_Sync (Log):
         self.compute_attr_map ()
         self.changed_roundup_users = {}
         self.changed_ldap_users    = {}
+        # LDAP picture of user currently synced to LDAP
+        self.luser_picture         = None
+        # Digests of files not yet written, see store_digests
+        self.pending_digests       = {}
+        # Used when the object is cached and re-used for logins
+        self.created             = time.time ()
+        self.last_synced         = ldap_last_synced.setdefault \
+            (ldap_sync_key (db), {})
+        self.login_sync_ttl      = config_read_int \
+            (self.cfg, 'LDAP_LOGIN_SYNC_TTL', 3600)
+        self.login_sync_deferred = config_read_boolean \
+            (self.cfg, 'LDAP_LOGIN_SYNC_DEFERRED')
     # end def __init__
 
+    def reopen (self, db):
+        """ Re-use a cached sync object with a new database.
+            The LDAP connection is re-opened if the server closed it in
+            the meantime.
+        """
+        self.db                    = db
+        self.error_counter         = 0
+        self.warn_counter          = 0
+        self.changed_roundup_users = {}
+        self.changed_ldap_users    = {}
+        self.pending_digests       = {}
+        for id in self.ldap_stati:
+            self.ldap_stati [id] = db.user_status.getnode (id)
+        if self.ldcon.closed:
+            self.connect ()
+    # end def reopen
+
+    def needs_sync (self, username):
+        """ Check if the last sync of the given user from LDAP is older
+            than login_sync_ttl seconds.
+        """
+        last = self.last_synced.get (username)
+        return last is None or time.time () - last >= self.login_sync_ttl
+    # end def needs_sync
+
+    def mark_synced (self, username):
+        self.last_synced [username] = time.time ()
+    # end def mark_synced
+
     # Logging with debug, info, warn, error
     # The only method that would not need to be wrapped is info but we
     # do it for consistency and maybe at some point we want to count
@@ -518,13 +546,51 @@ class LDAP_Roundup_Sync (Log):
         self.log.error (*args, **kw)
     # en def error
 
+    def connect (self):
+        """ Open the LDAP connection and bind with the configured
+            system account.
+        """
+        self.info ('Connect to LDAP: %s' % self.cfg.LDAP_URI)
+        self.server = self.ldap.Server (self.cfg.LDAP_URI, get_info = ldap3.ALL)
+        self.debug (4, 'Server')
+        # auto_range:
+        # https://docs.microsoft.com/en-us/previous-versions/windows/desktop/ldap/searching-using-range-retrieval
+        self.ldcon  = self.ldap.Connection \
+            ( self.server
+            , self.cfg.LDAP_BIND_DN
+            , self.cfg.LDAP_PASSWORD
+            , auto_range = True # auto range tag handling RFC 3866
+            )
+        # start_tls won't work without a previous open, may be a
+        # microsoft specific feature -- the ldap3 docs say otherwise
+        self.ldcon.open      ()
+        # Double negation because we want the default to be *with* starttls
+        ldaps = self.cfg.LDAP_URI.startswith ('ldaps')
+        if not ldaps:
+            no_starttls = config_read_boolean \
+                (self.db.config.ext, 'LDAP_NO_STARTTLS')
+            if not no_starttls:
+                self.ldcon.start_tls ()
+        self.debug (2, 'TLS: %s' % (ldaps or not no_starttls))
+        self.ldcon.bind ()
+        self.debug (4, 'Bind')
+    # end def connect
+
     def bind_as_user (self, username, password):
+        """ Check the password of the given user by binding as that
+            user. We bind as the system account again afterwards, the
+            connection may be re-used for further searches.
+        """
         luser = self.get_ldap_user_by_username (username)
         if not luser:
             return None
-        if not self.ldcon.rebind (user = luser.dn, password = password):
-            self.error ('Error binding as %s' % luser.dn)
-            return None
+        try:
+            if not self.ldcon.rebind (user = luser.dn, password = password):
+                self.error ('Error binding as %s' % luser.dn)
+                return None
+        finally:
+            self.ldcon.rebind \
+                (user = self.cfg.LDAP_BIND_DN, password = self.cfg.LDAP_PASSWORD)
         self.debug (2, 'Successful bind by %s' % luser.dn)
         return True
     # end def bind_as_user
@@ -584,7 +650,12 @@ class LDAP_Roundup_Sync (Log):
 
     def get_picture (self, user, attr):
         """ Get picture from roundup user class
-            and reduce to given max_size
+            and reduce to given max_size.
+            The digest of the resized picture (including size and
+            quality) is stored with the file: If it matches the digest
+            of the picture in LDAP we return the LDAP picture without
+            reading and resizing the roundup picture. A new digest is
+            only remembered here, it is written by store_digests.
         """
         max_size = common.Size_Limit \
             (self.db, 'LIMIT_PICTURE_SYNC_SIZE', default = 10240)
@@ -592,9 +663,24 @@ class LDAP_Roundup_Sync (Log):
         quality  = getattr (self.cfg, 'LIMIT_PICTURE_QUALITY', '80')
         quality  = int (quality)
         pics     = [self.db.file.getnode (i) for i in user.pictures]
+        has_dig  = 'resized_digest' in self.db.file.properties
+        prefix   = '%s:%s:' % (max_size, quality)
         for p in sorted (pics, reverse = True, key = lambda x: x.activity):
-            pic = Pic (p)
-            return pic.resized_picture (max_size, quality)
+            lpic = self.luser_picture
+            rdig = self.pending_digests.get (p.id, {}).get \
+                ('resized_digest', has_dig and p.resized_digest)
+            if  (   lpic and rdig
+                and rdig == prefix + common.content_digest (lpic)
+                ):
+                self.debug (3, 'Picture unchanged: %s' % user.username)
+                return lpic
+            pic     = Pic (p)
+            resized = pic.resized_picture (max_size, quality)
+            digest  = prefix + common.content_digest (resized)
+            if has_dig and p.resized_digest != digest:
+                self.pending_digests.setdefault (p.id, {}) \
+                    ['resized_digest'] = digest
+            return resized
     # end def get_picture
 
     def get_realname (self, x, y):
@@ -951,13 +1037,17 @@ class LDAP_Roundup_Sync (Log):
     def cls_lookup (self, cls, insert_attr_name = None, params = None):
         """ Generate a lookup method (non-failing) for the given class.
             Needed for easy check if an LDAP attribute exists as a
-            roundup class. We need the roundup class in a closure.
+            roundup class. We need the roundup class name in a closure,
+            the class is looked up in the current db when called (the
+            sync object may be cached and re-opened with another db).
         """
+        classname = cls.classname
         def look (luser, txt, **dynamic_params):
             try:
                 key = luser [txt]
             except KeyError:
                 return None
+            cls = self.db.getclass (classname)
             try:
                 return cls.lookup (key)
             except KeyError:
@@ -1154,11 +1244,38 @@ class LDAP_Roundup_Sync (Log):
         return (not stid or not self.ldap_stati [stid].roles)
     # end def is_obsolete
 
+    def file_digest (self, f):
+        """ Content digest of file f, computed in memory if missing and
+            remembered for store_digests
+        """
+        if f.content_digest:
+            return f.content_digest
+        digest = self.pending_digests.get (f.id, {}).get ('content_digest')
+        if not digest:
+            digest = common.content_digest (f.binary_content)
+            self.pending_digests.setdefault (f.id, {}) \
+                ['content_digest'] = digest
+        return digest
+    # end def file_digest
+
+    def store_digests (self):
+        """ Write the digests computed by get_picture and file_digest to
+            the files. This does not commit, the digests are saved with
+            the changes of the caller.
+        """
+        pending, self.pending_digests = self.pending_digests, {}
+        if not self.update_roundup or self.dry_run_roundup:
+            return
+        for id, digests in sorted (pending.items ()):
+            self.db.file.set (id, **digests)
+    # end def store_digests
+
     def ldap_picture (self, luser, attr):
         try:
             lpic = luser.raw_value (attr)
         except KeyError:
             return None
+        ldigest = common.content_digest (lpic)
         uid = None
         for k in 'UserPrincipalName', 'uid':
             try:
@@ -1171,12 +1288,14 @@ class LDAP_Roundup_Sync (Log):
             pics = [self.db.file.getnode (i) for i in upicids]
             for n, p in enumerate \
                 (sorted (pics, reverse = True, key = lambda x: x.activity)):
-                if p.content == lpic:
+                if self.file_digest (p) == ldigest:
+                    self.store_digests ()
                     if n and self.update_roundup and not self.dry_run_roundup:
                         # refresh name to put it in front
                         self.db.file.set (p.id, name = str (Date ('.')))
                     break
             else:
+                self.store_digests ()
                 if self.update_roundup and not self.dry_run_roundup:
                     f = self.db.file.create \
                         ( name    = str (Date ('.'))
@@ -1758,6 +1877,13 @@ class LDAP_Roundup_Sync (Log):
         # An error occurred and was already reported
         if not r_user:
             return
+        # Used for digest comparison in get_picture
+        self.luser_picture = None
+        if 'thumbnailPhoto' in luser:
+            try:
+                self.luser_picture = luser.raw_value ('thumbnailPhoto') or None
+            except (KeyError, IndexError):
+                pass
         assert (user.status in self.status_sync)
         if user.status == self.status_obsolete:
             if not self.is_obsolete (luser):
@@ -1917,6 +2043,7 @@ class LDAP_Roundup_Sync (Log):
                 )
             self.sync_contacts_to_ldap (r_user, luser, modlist)
         self.debug (3, 'Modlist before updates: %s' % modlist)
+        self.store_digests ()
         if modlist:
             self.changed_ldap_users [user.username] = modlist
         n = ''
@@ -2192,14 +2319,112 @@ def config_read_boolean (config, attribute_name):
     return value
 # end def config_read_boolean
 
+def config_read_int (config, attribute_name, default = 0):
+    """ Read integer from config item, return default if not configured.
+    """
+    try:
+        return int (getattr (config, attribute_name))
+    except InvalidOptionError:
+        return default
+# end def config_read_int
+
+def ldap_sync_key (db):
+    try:
+        uri = db.config.ext.LDAP_URI
+    except InvalidOptionError:
+        uri = None
+    return (db.config.TRACKER_HOME, uri)
+# end def ldap_sync_key
+
+def get_ldap_sync (db, **kw):
+    """ Return an LDAP_Roundup_Sync for the tracker of the given db from
+        a process-wide pool of idle sync objects or a new one if the
+        pool is empty. A sync object is used by one thread at a time,
+        it must be given back with release_ldap_sync after use. Pooled
+        objects older than LDAP_SYNC_CACHE_TTL seconds (default 600) are
+        discarded, a value of 0 disables the pool.
+    """
+    ttl = config_read_int (db.config.ext, 'LDAP_SYNC_CACHE_TTL', 600)
+    lds = None
+    if ttl:
+        now = time.time ()
+        with ldap_sync_cache_lock:
+            idle = ldap_sync_cache.setdefault (ldap_sync_key (db), [])
+            while idle and lds is None:
+                lds = idle.pop ()
+                if now - lds.created >= ttl:
+                    lds = None
+    if lds is None:
+        return LDAP_Roundup_Sync (db, **kw)
+    lds.reopen (db)
+    return lds
+# end def get_ldap_sync
+
+def release_ldap_sync (db, lds):
+    """ Put a sync object obtained with get_ldap_sync back into the
+        pool, at most LDAP_SYNC_POOL_SIZE (default 4) objects are kept.
+    """
+    ttl  = config_read_int (db.config.ext, 'LDAP_SYNC_CACHE_TTL', 600)
+    size = config_read_int (db.config.ext, 'LDAP_SYNC_POOL_SIZE', 4)
+    if not ttl or time.time () - lds.created >= ttl:
+        return
+    lds.db = None
+    with ldap_sync_cache_lock:
+        idle = ldap_sync_cache.setdefault (ldap_sync_key (db), [])
+        if len (idle) < size:
+            idle.append (lds)
+# end def release_ldap_sync
+
 class LdapLoginAction (LoginAction, autosuper):
     def try_ldap (self):
         uri = check_ldap_config (self.db)
         if uri:
-            self.ldsync = LDAP_Roundup_Sync (self.db)
+            self.ldsync = get_ldap_sync (self.db)
         return bool (uri)
     # end def try_ldap
 
+    def ldap_login (self, username, password):
+        """ Sync user from LDAP (unless synced within login_sync_ttl)
+            and check password by binding as the user. If
+            login_sync_deferred is configured, the sync of an existing
+            user is done in the background after a successful bind.
+        """
+        ldsync   = self.ldsync
+        invalid  = self.db.user_status.lookup ('obsolete')
+        deferred = False
+        if ldsync.needs_sync (username):
+            user = None
+            try:
+                user = self.db.user.getnode (self.db.user.lookup (username))
+            except KeyError:
+                pass
+            if  (   ldsync.login_sync_deferred
+                and user and user.status in ldsync.status_sync
+                and user.status != invalid
+                ):
+                # Marked as synced by the background sync when it succeeds
+                deferred = True
+            else:
+                ldsync.sync_user_from_ldap (username)
+                ldsync.mark_synced (username)
+        try:
+            user = self.db.user.lookup  (username)
+            user = self.db.user.getnode (user)
+        except KeyError:
+            raise exceptions.LoginError (self._ ('Invalid login'))
+        if user.status == invalid:
+            raise exceptions.LoginError (self._ ('Invalid login'))
+        if user.status not in ldsync.status_sync:
+            return self.__super.verifyLogin (username, password)
+        if not password:
+            raise exceptions.LoginError (self._ ('Invalid login'))
+        if not ldsync.bind_as_user (username, password):
+            raise exceptions.LoginError (self._ ('Invalid login'))
+        self.client.userid = user.id
+        if deferred:
+            deferred_sync_from_ldap (self.client.instance, username)
+    # end def ldap_login
+
     def verifyLogin (self, username, password):
         if username in ('admin', 'anonymous'):
             return self.__super.verifyLogin (username, password)
@@ -2222,21 +2447,10 @@ class LdapLoginAction (LoginAction, autosuper):
                 raise exceptions.LoginError (self._ ('Invalid login'))
             self.client.userid = user.id
         elif self.try_ldap ():
-            self.ldsync.sync_user_from_ldap (username)
             try:
-                user = self.db.user.lookup  (username)
-                user = self.db.user.getnode (user)
-            except KeyError:
-                raise exceptions.LoginError (self._ ('Invalid login'))
-            if user.status == invalid:
-                raise exceptions.LoginError (self._ ('Invalid login'))
-            if user.status not in self.ldsync.status_sync:
-                return self.__super.verifyLogin (username, password)
-            if not password:
-                raise exceptions.LoginError (self._ ('Invalid login'))
-            if not self.ldsync.bind_as_user (username, password):
-                raise exceptions.LoginError (self._ ('Invalid login'))
-            self.client.userid = user.id
+                return self.ldap_login (username, password)
+            finally:
+                release_ldap_sync (self.db, self.ldsync)
         else:
             if not user or user.status == invalid:
                 raise exceptions.LoginError (self._ ('Invalid login'))
@@ -2250,4 +2464,25 @@ def sync_from_ldap (db, username):
         return
     lds = LDAP_Roundup_Sync (db)
     lds.sync_user_from_ldap (username)
+    lds.mark_synced (username)
 # end def sync_from_ldap
+
+def deferred_sync_from_ldap (instance, username):
+    """ Sync the given user from LDAP in a background thread with its
+        own database (opened as admin) and its own LDAP connection.
+    """
+    def sync ():
+        db = instance.open ('admin')
+        try:
+            sync_from_ldap (db, username)
+        except Exception:
+            logging.getLogger ('roundup.ldap').exception \
+                ("Deferred LDAP sync of %s failed" % username)
+        finally:
+            db.close ()
+    # end def sync
+    t = threading.Thread (target = sync, name = 'ldap-sync-%s' % username)
+    t.daemon = True
+    t.start ()
+    return t
+# end def deferred_sync_from_ldap
@@ -1,10 +1,8 @@
 #!/usr/bin/python
 
-from user_dynamic import find_user_dynamic, next_user_dynamic
 from user_dynamic import first_user_dynamic
-from roundup.date import Date
-from freeze       import freeze_date
-from common       import pretty_range, ymd
+from roundup.date import Date, Interval
+from common       import ymd, pretty_range
 
 def is_correct_dyn (dyn, auto_wp) :
     """ Check that the given dynamic user record matches this
@@ -33,207 +31,356 @@ def auto_wp_duration_end (db, auto_wp, uid) :
     return duration_end
 # end def auto_wp_duration_end
 
-def check_auto_wp (db, auto_wp_id, userid) :
-    """ Get latest non-frozen dynamic user record for this user and then
-        look through auto WPs and check if they conform: There should be
-        a WP for each contiguous time a dynamic user record with
-        do_auto_wp set is available for this user.
+class _WP (object) :
+    """ Snapshot of the time_wp properties used for reconciliation,
+        planned changes are applied to the snapshot immediately.
     """
-    user   = db.user.getnode (userid)
-    snam   = str (user.username).split ('@') [0]
-    desc   = "Automatic wp for user %s" % snam
-    # Very early default should we not find any freeze records
-    start  = Date ('1970-01-01')
-    freeze = freeze_date (db, userid)
-    auto_wp = db.auto_wp.getnode (auto_wp_id)
-    duration_end = auto_wp_duration_end (db, auto_wp, userid)
-    # Nothing todo if this ended all before freeze
-    if duration_end and duration_end < start :
-        return
-    tp  = db.time_project.getnode (auto_wp.time_project)
-    # Get dynamic user record on or after start
-    dyn = find_user_dynamic (db, userid, start, ct = auto_wp.contract_type)
-    # If auto_wp isn't valid, we set dyn to None this will invalidate
-    # all WPs found:
-    if not auto_wp.is_valid :
-        dyn = None
-    # Find first dyn with do_auto_wp and org_location properly set
-    while dyn and not is_correct_dyn (dyn, auto_wp) :
-        dyn = next_user_dynamic (db, dyn, use_ct = True)
-    # Find all wps auto-created from this auto_wp after start.
-    # Note that all auto wps have a start time. Only the very first wp
-    # may start *before* start (if the time_end of the time_wp is either
-    # empty or after start)
-    d = dict \
-        ( auto_wp    = auto_wp_id
-        , time_start = pretty_range (start)
-        , bookers    = userid
-        )
-    wps = db.time_wp.filter (None, d, sort = ('+', 'time_start'))
-    wps = [db.time_wp.getnode (w) for w in wps]
-    d ['time_start'] = pretty_range (None, start)
-    wp1 = db.time_wp.filter (None, d, sort = ('-', 'time_start'), limit = 1)
-    assert len (wp1) <= 1
-    if wp1 :
-        wp = db.time_wp.getnode (wp1 [0])
-        is_same = wps and wps [0].id == wp.id
-        if not is_same and not wp.time_end or wp.time_end > start :
-            wps.insert (0, wp)
-    # Now we have the first relevant dyn user record and a list of WPs
-    # The list of WPs might be empty
-    try :
-        wp = wps.pop (0)
-    except IndexError :
-        wp = None
-
-    while dyn :
-        # Remember the start time of the first dyn
-        dyn_start = dyn.valid_from
-        # we compute the range of contiguous dyns with same do_auto_wp setting
-        while dyn and dyn.valid_to :
-            n = next_user_dynamic (db, dyn, use_ct = True)
-            if  (   n
-                and is_correct_dyn (n, auto_wp)
-                and n.valid_from == dyn.valid_to
-                ) :
-                dyn = n
+    props = ('time_start', 'time_end', 'name', 'description')
+
+    def __init__ (self, node) :
+        self.id = node.id
+        for p in self.props :
+            setattr (self, p, node [p])
+    # end def __init__
+
+# end class _WP
+
+class Auto_WP_Sync (object) :
+    """ Reconcile the wps of one auto_wp for a set of users: There
+        should be a WP for each contiguous time a dynamic user record
+        with do_auto_wp set is available for the user.
+        All dynamic user records and existing wps of all users are
+        retrieved up-front, compute determines the necessary changes
+        for all users without modifying the database and apply
+        performs them in one batch. Bookings are only checked for wps
+        that are candidates for retirement, with one query each. The
+        list of changes can be printed with report for a dry run.
+    """
+
+    def __init__ (self, db, auto_wp_id, users) :
+        self.db      = db
+        self.auto_wp = db.auto_wp.getnode (auto_wp_id)
+        self.users   = sorted (set (users), key = int)
+        self.changes = []
+        self.dyns    = dict ((u, []) for u in self.users)
+        self.wps     = dict ((u, []) for u in self.users)
+        if not self.users :
+            return
+        dyns = db.user_dynamic.filter_iter \
+            (None, dict (user = self.users), sort = ('+', 'valid_from'))
+        for id in dyns :
+            dyn = db.user_dynamic.getnode (id)
+            self.dyns [dyn.user].append (dyn)
+        wps = db.time_wp.filter_iter \
+            ( None
+            , dict (auto_wp = auto_wp_id, bookers = self.users)
+            , sort = ('+', 'time_start')
+            )
+        for id in wps :
+            wp = db.time_wp.getnode (id)
+            for u in wp.bookers :
+                if u in self.wps :
+                    self.wps [u].append (_WP (wp))
+    # end def __init__
+
+    def is_booked (self, wp, user, start = None, end = None) :
+        """ Check if user booked on wp in the given range of days, only
+            called for wps that would be retired.
+        """
+        d = {'wp' : wp.id, 'daily_record.user' : user}
+        if start :
+            d ['daily_record.date'] = pretty_range (start, end)
+        return bool (self.db.time_record.filter (None, d, limit = 1))
+    # end def is_booked
+
+    def find_dyn (self, user, date, ct) :
+        """ Like user_dynamic.find_user_dynamic in direction '+' """
+        date = Date (date.pretty (ymd)) + Interval ('1d')
+        for dyn in self.dyns [user] :
+            if dyn.valid_from >= date and dyn.contract_type == ct :
+                return dyn
+        return None
+    # end def find_dyn
+
+    def next_dyn (self, dyn) :
+        """ Like user_dynamic.next_user_dynamic with use_ct """
+        return self.find_dyn (dyn.user, dyn.valid_from, dyn.contract_type)
+    # end def next_dyn
+
+    def set (self, wp, **d) :
+        for k, v in d.items () :
+            setattr (wp, k, v)
+        self.changes.append (('set', wp.id, d))
+    # end def set
+
+    def retire (self, wp) :
+        self.changes.append (('retire', wp.id, None))
+    # end def retire
+
+    def create (self, **d) :
+        self.changes.append (('create', None, d))
+    # end def create
+
+    def compute (self) :
+        for u in self.users :
+            self.compute_user (u)
+        return self.changes
+    # end def compute
+
+    def apply (self) :
+        for action, id, d in self.changes :
+            if action == 'set' :
+                self.db.time_wp.set (id, **d)
+            elif action == 'retire' :
+                self.db.time_wp.retire (id)
             else :
-                break
-        end_time = dyn.valid_to
-        if duration_end and (not end_time or end_time > duration_end) :
-            end_time = duration_end
-        if end_time and end_time <= dyn_start :
+                self.db.time_wp.create (**d)
+        self.changes = []
+    # end def apply
+
+    def report (self) :
+        """ Human-readable list of changes """
+        lines = []
+        for action, id, d in self.changes :
+            if d :
+                d = ', '.join \
+                    ('%s=%s' % (k, d [k]) for k in sorted (d)
+                     if k in ('name', 'time_start', 'time_end', 'bookers')
+                    )
+            lines.append \
+                ( '%s auto_wp %s time_wp %s %s'
+                % (action, self.auto_wp.id, id or '-', d or '')
+                )
+        return lines
+    # end def report
+
+    def compute_user (self, userid) :
+        db      = self.db
+        auto_wp = self.auto_wp
+        user    = db.user.getnode (userid)
+        snam    = str (user.username).split ('@') [0]
+        desc    = "Automatic wp for user %s" % snam
+        # Very early default should we not find any freeze records
+        start   = Date ('1970-01-01')
+        # If this auto_wp has a duration, need to find when we started.
+        # We start from the first dyn. user record: Note that we use the
+        # very first record even if it's a different org_location or
+        # doesn't have do_auto_wp set.
+        duration_end = None
+        if auto_wp.duration and self.dyns [userid] :
+            duration_end = self.dyns [userid][0].valid_from + auto_wp.duration
+        # Nothing todo if this ended all before freeze
+        if duration_end and duration_end < start :
+            return
+        tp  = db.time_project.getnode (auto_wp.time_project)
+        # Get dynamic user record on or after start
+        dyn = self.find_dyn (userid, start, auto_wp.contract_type)
+        # If auto_wp isn't valid, we set dyn to None this will invalidate
+        # all WPs found:
+        if not auto_wp.is_valid :
             dyn = None
-            break
-        # Limit the first wp(s) if the start time of the dyn user record is
-        # after the start time of the frozen range and the wp starts
-        # before that.
-        while wp and wp.time_start < start and dyn_start > start :
-            if wp.time_end > start :
-                n = '%s -%s' % (snam, start.pretty (ymd))
-                d = dict (time_end = start, name = n)
-                if wp.description != desc :
-                    d ['description'] = desc
-                db.time_wp.set (wp.id, **d)
-            try :
-                wp = wps.pop (0)
-            except IndexError :
-                wp = None
-        assert not wp or wp.time_start > start
-
-        # Check if there are wps that start before the validity of the
-        # current dynamic user record
-        while wp and wp.time_start < dyn_start :
-            if wp.time_end and wp.time_end <= dyn_start :
-                # Check that really nothing is booked on this WP
-                d = dict (wp = wp.id)
-                d ['daily_record.user'] = userid
-                d ['daily_record.date'] = pretty_range \
-                    (wp.time_start, wp.time_end)
-                trs = db.time_record.filter (None, d)
-                # If something is booked we set end = start
-                # Otherwise we retire the wp
-                if not trs :
-                    db.time_wp.retire (wp.id)
+        # Find first dyn with do_auto_wp and org_location properly set
+        while dyn and not is_correct_dyn (dyn, auto_wp) :
+            dyn = self.next_dyn (dyn)
+        # All wps auto-created from this auto_wp after start.
+        # Note that all auto wps have a start time. Only the very first
+        # wp may start *before* start (if the time_end of the time_wp is
+        # either empty or after start)
+        day   = start.pretty (ymd)
+        wps   = [w for w in self.wps [userid] if w.time_start]
+        early = [w for w in wps if w.time_start.pretty (ymd) <= day]
+        wps   = [w for w in wps if w.time_start.pretty (ymd) >= day]
+        if early :
+            wp = early [-1]
+            is_same = wps and wps [0].id == wp.id
+            if not is_same and not wp.time_end or wp.time_end > start :
+                wps.insert (0, wp)
+        # Now we have the first relevant dyn user record and a list of WPs
+        # The list of WPs might be empty
+        try :
+            wp = wps.pop (0)
+        except IndexError :
+            wp = None
+
+        while dyn :
+            # Remember the start time of the first dyn
+            dyn_start = dyn.valid_from
+            # we compute the range of contiguous dyns with same
+            # do_auto_wp setting
+            while dyn and dyn.valid_to :
+                n = self.next_dyn (dyn)
+                if  (   n
+                    and is_correct_dyn (n, auto_wp)
+                    and n.valid_from == dyn.valid_to
+                    ) :
+                    dyn = n
                 else :
-                    n = '%s -%s' % (snam, wp.time_start.pretty (ymd))
-                    d = dict (time_end = wp.time_start, name = n)
+                    break
+            end_time = dyn.valid_to
+            if duration_end and (not end_time or end_time > duration_end) :
+                end_time = duration_end
+            if end_time and end_time <= dyn_start :
+                dyn = None
+                break
+            # Limit the first wp(s) if the start time of the dyn user
+            # record is after the start time of the frozen range and the
+            # wp starts before that.
+            while wp and wp.time_start < start and dyn_start > start :
+                if wp.time_end > start :
+                    n = '%s -%s' % (snam, start.pretty (ymd))
+                    d = dict (time_end = start, name = n)
                     if wp.description != desc :
                         d ['description'] = desc
-                    db.time_wp.set (wp.id, **d)
+                    self.set (wp, **d)
                 try :
                     wp = wps.pop (0)
                 except IndexError :
                     wp = None
-            else :
-                d = dict (time_start = dyn_start)
-                if wp.description != desc :
-                    d ['description'] = desc
-                db.time_wp.set (wp.id, **d)
-                break
+            assert not wp or wp.time_start > start
 
-        # We now either have a wp with correct start date or
-        # with a start date > dyn.valid_to or none
-        if wp and (not dyn.valid_to or wp.time_start < dyn.valid_to) :
-            # We may have not a single wp but a set of 'fragments'
-            # before the end-date of the dyn user record (or an open
-            # end)
-            while (   wps
-                  and (  end_time and wp.time_end < end_time
-                      or not end_time and wp.time_end
-                      )
-                  ) :
-                if wps [0].time_start > end_time :
-                    break
-                assert not wps [0].time_end or wp.time_end <= wps [0].time_end
-                if wp.time_end != wps [0].time_start :
-                    n = '%s -%s' % (snam, wps [0].time_start.pretty (ymd))
-                    d = dict (time_end = wps [0].time_start, name = n)
-                    if wp.description != desc :
-                        d ['description'] = desc
-                    db.time_wp.set (wp.id, ** d)
-                wp = wps.pop (0)
-            if end_time :
-                if wp.time_end != end_time :
-                    n = '%s -%s' % (snam, end_time.pretty (ymd))
-                    d = dict (time_end = end_time, name = n)
+            # Check if there are wps that start before the validity of the
+            # current dynamic user record
+            while wp and wp.time_start < dyn_start :
+                if wp.time_end and wp.time_end <= dyn_start :
+                    # Check that really nothing is booked on this WP
+                    # If something is booked we set end = start
+                    # Otherwise we retire the wp
+                    if not self.is_booked \
+                        (wp, userid, wp.time_start, wp.time_end) :
+                        self.retire (wp)
+                    else :
+                        n = '%s -%s' % (snam, wp.time_start.pretty (ymd))
+                        d = dict (time_end = wp.time_start, name = n)
+                        if wp.description != desc :
+                            d ['description'] = desc
+                        self.set (wp, **d)
+                    try :
+                        wp = wps.pop (0)
+                    except IndexError :
+                        wp = None
+                else :
+                    d = dict (time_start = dyn_start)
                     if wp.description != desc :
                         d ['description'] = desc
-                    db.time_wp.set (wp.id, **d)
+                    self.set (wp, **d)
+                    break
+
+            # We now either have a wp with correct start date or
+            # with a start date > dyn.valid_to or none
+            if wp and (not dyn.valid_to or wp.time_start < dyn.valid_to) :
+                # We may have not a single wp but a set of 'fragments'
+                # before the end-date of the dyn user record (or an open
+                # end)
+                while (   wps
+                      and (  end_time and wp.time_end < end_time
+                          or not end_time and wp.time_end
+                          )
+                      ) :
+                    if wps [0].time_start > end_time :
+                        break
+                    assert \
+                        (  not wps [0].time_end
+                        or wp.time_end <= wps [0].time_end
+                        )
+                    if wp.time_end != wps [0].time_start :
+                        n = '%s -%s' % (snam, wps [0].time_start.pretty (ymd))
+                        d = dict (time_end = wps [0].time_start, name = n)
+                        if wp.description != desc :
+                            d ['description'] = desc
+                        self.set (wp, ** d)
+                    wp = wps.pop (0)
+                if end_time :
+                    if wp.time_end != end_time :
+                        n = '%s -%s' % (snam, end_time.pretty (ymd))
+                        d = dict (time_end = end_time, name = n)
+                        if wp.description != desc :
+                            d ['description'] = desc
+                        self.set (wp, **d)
+                else :
+                    if wp.time_end :
+                        d = dict (time_end = None, name = snam)
+                        if wp.description != desc :
+                            d ['description'] = desc
+                        self.set (wp, **d)
+                try :
+                    wp = wps.pop (0)
+                except IndexError :
+                    wp = None
             else :
-                if wp.time_end :
-                    d = dict (time_end = None, name = snam)
+                # If we have no wp, create one
+                d = dict \
+                    ( auto_wp           = auto_wp.id
+                    , project           = auto_wp.time_project
+                    , durations_allowed = auto_wp.durations_allowed
+                    , bookers           = [userid]
+                    , description       = desc
+                    , name              = snam
+                    , time_start        = max (start, dyn_start)
+                    , is_public         = False
+                    , planned_effort    = 0
+                    , responsible       = tp.responsible
+                    )
+                # If the dyn is time-limited we have to name the wp
+                # appropriately and limit the end-time of the wp.
+                if end_time :
+                    d ['time_end'] = end_time
+                    d ['name']     = '%s -%s' % (snam, end_time.pretty (ymd))
+                self.create (**d)
+            od  = dyn
+            dyn = self.next_dyn (dyn)
+            while dyn and not is_correct_dyn (dyn, auto_wp) :
+                dyn = self.next_dyn (dyn)
+            if not dyn :
+                if not end_time :
+                    assert not wp and not wps
+        if wp :
+            wps.insert (0, wp)
+            wp = None
+            # Retire WPs that are left over but before that check that
+            # nothing is booked.
+            for wp in wps :
+                if not self.is_booked (wp, userid) :
+                    self.retire (wp)
+                else :
+                    n = '%s -%s' % (snam, wp.time_start.pretty (ymd))
+                    d = dict (time_end = wp.time_start, name = n)
                     if wp.description != desc :
                         d ['description'] = desc
-                    db.time_wp.set (wp.id, **d)
-            try :
-                wp = wps.pop (0)
-            except IndexError :
-                wp = None
-        else :
-            # If we have no wp, create one
-            d = dict \
-                ( auto_wp           = auto_wp_id
-                , project           = auto_wp.time_project
-                , durations_allowed = auto_wp.durations_allowed
-                , bookers           = [userid]
-                , description       = desc
-                , name              = snam
-                , time_start        = max (start, dyn_start)
-                , is_public         = False
-                , planned_effort    = 0
-                , responsible       = tp.responsible
-                )
-            # If the dyn is time-limited we have to name the wp
-            # appropriately and limit the end-time of the wp.
-            if end_time :
-                d ['time_end'] = end_time
-                d ['name']     = '%s -%s' % (snam, end_time.pretty (ymd))
-            wpid = db.time_wp.create (**d)
-        od  = dyn
-        dyn = next_user_dynamic (db, dyn, use_ct = True)
-        while dyn and not is_correct_dyn (dyn, auto_wp) :
-            dyn = next_user_dynamic (db, dyn, use_ct = True)
-        if not dyn :
-            if not end_time :
-                assert not wp and not wps
-    if wp :
-        wps.insert (0, wp)
-        wp = None
-        # Retire WPs that are left over but before that check that
-        # nothing is booked.
-        for wp in wps :
-            d = dict (wp = wp.id)
-            d ['daily_record.user'] = userid
-            trs = db.time_record.filter (None, d)
-            if not trs :
-                db.time_wp.retire (wp.id)
-            else :
-                n = '%s -%s' % (snam, wp.time_start.pretty (ymd))
-                d = dict (time_end = wp.time_start, name = n)
-                if wp.description != desc :
-                    d ['description'] = desc
-                db.time_wp.set (wp.id, **d)
-        wps = []
-        wp  = None
+                    self.set (wp, **d)
+    # end def compute_user
+
+# end class Auto_WP_Sync
+
+def auto_wp_users (db, auto_wp_id) :
+    """ Users with a dynamic user record that has do_auto_wp enabled and
+        uses the contract type and org_location of the auto_wp.
+    """
+    auto_wp = db.auto_wp.getnode (auto_wp_id)
+    d       = dict \
+        ( contract_type = auto_wp.contract_type or '-1'
+        , org_location  = auto_wp.org_location
+        , do_auto_wp    = True
+        )
+    users   = set ()
+    for dynid in db.user_dynamic.filter_iter (None, d) :
+        users.add (db.user_dynamic.get (dynid, 'user'))
+    return users
+# end def auto_wp_users
+
+def sync_auto_wp (db, auto_wp_id, users, dry_run = False) :
+    """ Reconcile wps of auto_wp for all given users, returns the list
+        of changes as text. With dry_run nothing is changed.
+    """
+    sync = Auto_WP_Sync (db, auto_wp_id, users)
+    sync.compute ()
+    report = sync.report ()
+    if not dry_run :
+        sync.apply ()
+    return report
+# end def sync_auto_wp
+
+def check_auto_wp (db, auto_wp_id, userid) :
+    """ Reconcile the wps of auto_wp for a single user, see Auto_WP_Sync
+    """
+    sync_auto_wp (db, auto_wp_id, [userid])
 # end def check_auto_wp
@@ -38,18 +38,36 @@
 from roundup.hyperdb import Link, Multilink
 
 
+def link_index (db) :
+    """ Index of all Link and Multilink properties by the classname
+        they link to. The index is computed in one pass over the schema
+        and kept with the db, linkclass_iter is called for several
+        classes and roles during schema setup and detector init. It is
+        recomputed if classes or properties were added or removed in
+        the meantime (the key is the number of properties per class).
+    """
+    idx = getattr (db, '_link_index', None)
+    key = tuple \
+        ( (clname, len (db.getclass (clname).properties))
+          for clname in sorted (db.getclasses ())
+        )
+    if idx is None or idx [0] != key :
+        by_class = {}
+        for clname, n in key :
+            props = db.getclass (clname).properties
+            for p in sorted (props) :
+                v = props [p]
+                if isinstance (v, Multilink) or isinstance (v, Link) :
+                    by_class.setdefault (v.classname, []).append ((clname, p))
+        idx = db._link_index = (key, by_class)
+    return idx [1]
+# end def link_index
+
 def linkclass_iter (db, classname) :
     """ For the given classname find all properties in other classes
         that link to that class.
     """
-    for clname in sorted (db.getclasses ()) :
-        props = db.getclass (clname).properties
-        for p in sorted (props) :
-            v = props [p]
-            if  (    (isinstance (v, Multilink) or isinstance (v, Link))
-                and v.classname == classname
-                ) :
-                yield (clname, p)
+    return iter (link_index (db).get (classname, []))
 # end def linkclass_iter
 
 ### __END__
@@ -0,0 +1,138 @@
+# Copyright (C) 2026 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# All rights reserved
+# ****************************************************************************
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+# ****************************************************************************
+#
+#++
+# Name
+#    lookup_cache
+#
+# Purpose
+#    Cache for rarely changing lookup tables like time_activity and
+#    work_location flags or the name -> id mapping of stati. The cache
+#    is an attribute of the db and is cleared with the node cache (on
+#    commit and rollback) and when a node of a cached class changes,
+#    see detectors/d_lookup_cache.py.
+#
+#--
+#
+
+def _cache (db) :
+    try :
+        return db.lookup_cache
+    except AttributeError :
+        def lookup_cache_clear (db) :
+            db.lookup_cache = {}
+        db.registerClearCacheCallback (lookup_cache_clear, db)
+        db.lookup_cache = {}
+    return db.lookup_cache
+# end def _cache
+
+def lookup (db, classname, name) :
+    """ Like db.<classname>.lookup (name) but all keys of the class are
+        retrieved on first use. Raises KeyError for unknown names.
+    """
+    cache = _cache (db)
+    key   = ('lookup', classname)
+    if key not in cache :
+        cl  = db.getclass (classname)
+        kp  = cl.getkey ()
+        ids = cl.getnodeids (retired = False)
+        cache [key] = dict ((cl.get (id, kp), id) for id in ids)
+    try :
+        return cache [key][name]
+    except KeyError :
+        raise KeyError \
+            ( 'No key (%s) value "%s" for "%s"'
+            % (db.getclass (classname).getkey (), name, classname)
+            )
+# end def lookup
+
+def flagged (db, classname, flag) :
+    """ Set of ids of non-retired nodes of classname with the given
+        Boolean property set.
+    """
+    cache = _cache (db)
+    key   = ('flagged', classname, flag)
+    if key not in cache :
+        cache [key] = frozenset \
+            (db.getclass (classname).filter (None, {flag : True}))
+    return cache [key]
+# end def flagged
+
+def values (db, classname, prop) :
+    """ Dict id -> value of prop for all non-retired nodes of classname
+    """
+    cache = _cache (db)
+    key   = ('values', classname, prop)
+    if key not in cache :
+        cl  = db.getclass (classname)
+        ids = cl.getnodeids (retired = False)
+        cache [key] = dict ((id, cl.get (id, prop)) for id in ids)
+    return cache [key]
+# end def values
+
+def mapping (db, classname, prop) :
+    """ Dict value of prop -> id for all non-retired nodes of classname,
+        for duplicate values the node with the lowest id is used.
+    """
+    cache = _cache (db)
+    key   = ('mapping', classname, prop)
+    if key not in cache :
+        v = values (db, classname, prop)
+        cache [key] = dict \
+            ((v [id], id) for id in sorted (v, key = int, reverse = True))
+    return cache [key]
+# end def mapping
+
+def table_version (db, *classnames) :
+    """ Cheap check if the tables of the given classes changed, used
+        for structures kept per tracker and process across requests:
+        number of rows, latest activity and number of retired rows.
+        Returns None for non-SQL backends, in that case nothing should
+        be kept across requests.
+        Note that the version can miss a change: _activity has the
+        resolution of a timestamp, if two edits of existing nodes are
+        committed with the same timestamp and the version is computed
+        between them, the second edit does not change the version.
+    """
+    if not hasattr (db, 'conn') :
+        return None
+    version = []
+    for cn in classnames :
+        db.sql \
+            ( 'select count (*), max (_activity), sum (__retired__) from _%s'
+            % cn
+            )
+        version.extend (str (x) for x in db.cursor.fetchone ())
+    return tuple (version)
+# end def table_version
+
+def invalidate (db, classname) :
+    """ Remove cached entries of classname """
+    cache = _cache (db)
+    for k in list (cache) :
+        if k [1] == classname :
+            del cache [k]
+# end def invalidate
+
+cached_classes = \
+    ( 'time_activity', 'work_location', 'daily_record_status', 'leave_status'
+    , 'qsl_type', 'qsl_status', 'continent', 'dxcc_entity', 'ham_mode'
+    , 'ham_band', 'user_status'
+    )
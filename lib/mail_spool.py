@@ -0,0 +1,290 @@
+# Copyright (C) 2026 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# All rights reserved
+# ****************************************************************************
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+# ****************************************************************************
+#
+#++
+# Name
+#    mail_spool
+#
+# Purpose
+#    Spool outgoing mail to a directory instead of sending it via SMTP
+#    from inside a web or mailgw transaction. The spool is emptied by
+#    utils/mail_spool_send.py which sends batches of messages over a
+#    single SMTP connection and retries failed messages with backoff.
+#    Spooling is enabled by setting spool_dir in the [mail] section of
+#    the ext config, relative paths are relative to the tracker home.
+#
+#--
+#
+
+import os
+import json
+import time
+import socket
+import smtplib
+import logging
+import threading
+from roundup.mailer import Mailer, SMTPConnection, MessageSendError
+
+def spool_directory (config):
+    """ Directory of the mail spool from ext config MAIL_SPOOL_DIR,
+        None if not configured.
+    """
+    directory = getattr (config.ext, 'MAIL_SPOOL_DIR', None)
+    if not directory:
+        return None
+    return os.path.join (config.TRACKER_HOME, directory)
+# end def spool_directory
+
+class Mail_Spool (object):
+    """ Spool directory for outgoing mail. Each message is a json file
+        with envelope sender, recipients, the message text and the
+        retry state. Files are written to the 'tmp' subdirectory and
+        renamed to 'new', so the sender never sees a partial file.
+        Messages that could not be sent after max_tries are moved to
+        'failed'.
+    """
+    count = 0
+
+    def __init__ (self, directory):
+        self.directory = directory
+        for sub in 'tmp', 'new', 'failed':
+            path = os.path.join (directory, sub)
+            if not os.path.isdir (path):
+                os.makedirs (path)
+    # end def __init__
+
+    def path (self, sub, name):
+        return os.path.join (self.directory, sub, name)
+    # end def path
+
+    def write (self, sub, name, entry):
+        tmp = self.path ('tmp', name)
+        with open (tmp, 'w') as f:
+            json.dump (entry, f)
+        os.rename (tmp, self.path (sub, name))
+    # end def write
+
+    def add (self, sender, to, message):
+        self.__class__.count += 1
+        name  = '%.6f.%s.%s.json' % (time.time (), os.getpid (), self.count)
+        entry = dict \
+            ( sender   = sender
+            , to       = list (to)
+            , message  = message
+            , tries    = 0
+            , next_try = 0
+            , error    = None
+            )
+        self.write ('new', name, entry)
+        return name
+    # end def add
+
+    def pending (self, now = None):
+        """ Iterate over name, entry of messages due for sending, oldest
+            first.
+        """
+        if now is None:
+            now = time.time ()
+        for name in sorted (os.listdir (os.path.join (self.directory, 'new'))):
+            try:
+                with open (self.path ('new', name)) as f:
+                    entry = json.load (f)
+            except (IOError, OSError, ValueError):
+                continue
+            if entry ['next_try'] <= now:
+                yield name, entry
+    # end def pending
+
+    def done (self, name):
+        os.unlink (self.path ('new', name))
+    # end def done
+
+    def retry (self, name, entry, error, max_tries, backoff):
+        """ Record failed delivery, the next try is delayed by backoff
+            seconds doubling with each try. Return True if the message
+            was moved to 'failed'.
+        """
+        entry ['tries'] += 1
+        entry ['error']  = str (error)
+        if entry ['tries'] >= max_tries:
+            self.write ('failed', name, entry)
+            self.done (name)
+            return True
+        entry ['next_try'] = time.time () + backoff * 2 ** (entry ['tries'] - 1)
+        self.write ('new', name, entry)
+        return False
+    # end def retry
+
+# end class Mail_Spool
+
+class Spool_Mailer (Mailer):
+    """ Mailer that writes messages to the mail spool instead of
+        sending them. If a db is given, the message is spooled when the
+        transaction is committed (and not at all on rollback) like the
+        content of files, otherwise it is spooled immediately. Without a
+        configured spool directory messages are sent directly.
+    """
+
+    def __init__ (self, config, db = None):
+        Mailer.__init__ (self, config)
+        self.db       = db
+        self.spooldir = spool_directory (config)
+    # end def __init__
+
+    def spool (self, sender, to, message):
+        """ Note that the return value of transaction callbacks is
+            used by roundup for reindexing, so we must return None.
+        """
+        Mail_Spool (self.spooldir).add (sender, to, message)
+    # end def spool
+
+    def smtp_send (self, to, message, sender = None):
+        if not self.spooldir:
+            return Mailer.smtp_send (self, to, message, sender)
+        if not sender:
+            sender = self.config.ADMIN_EMAIL
+        if self.db is None:
+            self.spool (sender, to, message)
+        else:
+            self.db.transactions.append ((self.spool, (sender, to, message)))
+    # end def smtp_send
+
+# end class Spool_Mailer
+
+def get_mailer (db):
+    """ Mailer for sending mail from detectors: Spools in the current
+        transaction if spooling is configured.
+    """
+    return Spool_Mailer (db.config, db)
+# end def get_mailer
+
+def spooled_send_message (cl, *args, **kw):
+    """ Like the send_message method of the issue class cl but the nosy
+        mail is spooled in the current transaction of cl.db, installed
+        per class by detectors/nosyreaction.py. Roundup sends via
+        Mailer.smtp_send, the wrapper installed below spools messages
+        sent while this method runs in the current thread. Roundup
+        itself and other trackers in the same process are not affected.
+    """
+    method = type (cl).send_message
+    if not spool_directory (cl.db.config):
+        return method (cl, *args, **kw)
+    _sending.db = cl.db
+    try:
+        return method (cl, *args, **kw)
+    finally:
+        _sending.db = None
+# end def spooled_send_message
+
+_sending = threading.local ()
+
+def _install_smtp_send_wrapper ():
+    """ Wrap Mailer.smtp_send to spool messages sent inside
+        spooled_send_message, all other messages are sent unchanged.
+        Installed only once even if this module is imported by several
+        trackers.
+    """
+    if getattr (Mailer.smtp_send, 'mail_spool', False):
+        return
+    smtp_send = Mailer.smtp_send
+    def spooling_smtp_send (self, to, message, sender = None):
+        db = getattr (_sending, 'db', None)
+        if db is None or isinstance (self, Spool_Mailer):
+            return smtp_send (self, to, message, sender)
+        return Spool_Mailer (self.config, db).smtp_send (to, message, sender)
+    spooling_smtp_send.mail_spool = True
+    Mailer.smtp_send = spooling_smtp_send
+# end def _install_smtp_send_wrapper
+_install_smtp_send_wrapper ()
+
+class Spool_Sender (object):
+    """ Send spooled mail in batches over a single SMTP connection.
+        If MAIL_DEBUG is configured, messages are written to the debug
+        file instead.
+    """
+
+    def __init__ \
+        (self, config, batch = 100, max_tries = 10, backoff = 60, log = None):
+        self.config    = config
+        self.batch     = batch
+        self.max_tries = max_tries
+        self.backoff   = backoff
+        self.mailer    = Mailer (config)
+        self.spool     = Mail_Spool (spool_directory (config))
+        self.log       = log or logging.getLogger ('roundup.mail_spool')
+    # end def __init__
+
+    def send_batch (self):
+        """ Send up to batch pending messages, return number of messages
+            sent.
+        """
+        smtp  = None
+        sent  = tried = 0
+        for name, entry in self.spool.pending ():
+            if tried >= self.batch:
+                break
+            tried += 1
+            try:
+                if self.mailer.debug:
+                    self.mailer.smtp_send \
+                        (entry ['to'], entry ['message'], entry ['sender'])
+                else:
+                    if smtp is None:
+                        smtp = SMTPConnection (self.config)
+                    smtp.sendmail \
+                        (entry ['sender'], entry ['to'], entry ['message'])
+            except \
+                (socket.error, smtplib.SMTPException, MessageSendError) as err:
+                failed = self.spool.retry \
+                    (name, entry, err, self.max_tries, self.backoff)
+                self.log.error \
+                    ( "Sending %s failed (try %s%s): %s"
+                    % (name, entry ['tries'], ', giving up' * failed, err)
+                    )
+                # The connection may be unusable after an error
+                if smtp is not None:
+                    try:
+                        smtp.close ()
+                    except (socket.error, smtplib.SMTPException):
+                        pass
+                    smtp = None
+                continue
+            self.spool.done (name)
+            sent += 1
+        if smtp is not None:
+            try:
+                smtp.quit ()
+            except (socket.error, smtplib.SMTPException):
+                pass
+        return sent
+    # end def send_batch
+
+    def send_all (self):
+        """ Send batches until no more messages are due. A message that
+            failed is due again only after its backoff (or is moved to
+            'failed'), so this terminates even if a batch sends nothing.
+        """
+        sent = 0
+        while next (self.spool.pending (), None) is not None:
+            sent += self.send_batch ()
+        return sent
+    # end def send_all
+
+# end class Spool_Sender
@@ -31,6 +31,7 @@
 #
 
 import common
+import lookup_cache
 from   roundup.exceptions import Reject
 
 def pr_offer_item_sum (db, pr) :
@@ -80,35 +81,20 @@ def in_las (db, pr) :
     return True
 # end def in_las
 
-def _app_cfgs (db, pr, ids) :
-    acs = []
-    for id in ids :
-        ac = db.pr_approval_config.getnode (id)
-        if ac.if_not_in_las :
-            continue
-        if  (   ac.organisations and pr.organisation
-            and pr.organisation not in ac.organisations
-            ) :
-            continue
-        if  (   ac.departments and pr.department
-            and pr.department not in ac.departments
-            ) :
-            continue
-        acs.append (ac)
-    return acs
-# end def _app_cfgs
-
-def risk_type (db, offer_item_id, pr_supplier = None) :
+def risk_type (db, offer_item_id, pr_supplier = None, pr = None) :
     """ Note that an *empty* pr_supplier (one that isn't in LAS) is
         possible and will typically get a bad security rating.
         If pr_supplier is specified explicitly, it should be set to '-1'
         for explicitly searching for an empty supplier.
+        The purchase_request of the offer item is searched if not given.
     """
     oi  = db.pr_offer_item.getnode (offer_item_id)
     pg  = db.product_group.getnode (oi.product_group)
-    prs = db.purchase_request.filter (None, dict (offer_items = offer_item_id))
-    assert len (prs) == 1
-    pr  = db.purchase_request.getnode (prs [0])
+    if pr is None :
+        prs = db.purchase_request.filter \
+            (None, dict (offer_items = offer_item_id))
+        assert len (prs) == 1
+        pr  = db.purchase_request.getnode (prs [0])
 
     if not oi.infosec_level or not pr.organisation :
         return None
@@ -152,7 +138,7 @@ def max_risk_type (db, prid) :
     if pr.purchase_risk_type :
         rtmax = db.purchase_risk_type.getnode (pr.purchase_risk_type)
     for oi in pr.offer_items :
-        rtid = risk_type (db, oi)
+        rtid = risk_type (db, oi, pr = pr)
         if not rtid :
             continue
         rt = db.purchase_risk_type.getnode (rtid)
@@ -173,6 +159,214 @@ def need_payment_type_approval (db, pr, new = None) :
     return False
 # end def need_payment_type_approval
 
+class _Record (object) :
+    """ Plain copy of some properties of a node """
+
+    def __init__ (self, node, props) :
+        self.id = node.id
+        for p in props :
+            setattr (self, p, node [p])
+    # end def __init__
+
+# end class _Record
+
+class Approval_Rules (object) :
+    """ Compiled pr_approval_config and pr_approval_order. The configs
+        matching a PR are indexed by organisation, department, purchase
+        type and external resource, the amount thresholds are checked
+        per PR.
+    """
+
+    order_props  = \
+        ('role', 'order', 'users', 'is_finance', 'is_board', 'only_nosy')
+    config_props = \
+        ( 'role', 'amount', 'if_not_in_las', 'valid', 'organisations'
+        , 'pr_ext_resource', 'purchase_type', 'infosec_amount'
+        , 'payment_type_amount', 'oob_amount', 'departments'
+        )
+
+    def __init__ (self, db, version = None) :
+        self.version  = version
+        self.orders   = {}
+        self.configs  = []
+        self.matching = {}
+        for id in db.pr_approval_order.filter_iter (None, {}) :
+            node = db.pr_approval_order.getnode (id)
+            self.orders [id] = _Record (node, self.order_props)
+        for id in db.pr_approval_config.filter_iter \
+            (None, {}, sort = ('+', 'id')) :
+            node = db.pr_approval_config.getnode (id)
+            self.configs.append (_Record (node, self.config_props))
+        self.board   = frozenset \
+            (id for id, o in self.orders.items () if o.is_board)
+        self.finance = frozenset \
+            (id for id, o in self.orders.items () if o.is_finance)
+    # end def __init__
+
+    def org_dep_match (self, ac, pr) :
+        if  (   ac.organisations and pr.organisation
+            and pr.organisation not in ac.organisations
+            ) :
+            return False
+        if  (   ac.departments and pr.department
+            and pr.department not in ac.departments
+            ) :
+            return False
+        return True
+    # end def org_dep_match
+
+    def special_roles (self, pr, roles) :
+        """ Roles of configs (valid or not) for the given board or
+            finance roles matching organisation and department of the PR
+        """
+        return set \
+            ( ac.role for ac in self.configs
+              if  ac.role in roles
+              and not ac.if_not_in_las
+              and self.org_dep_match (ac, pr)
+            )
+    # end def special_roles
+
+    def applicable (self, pr) :
+        """ Valid configs matching the PR, the amounts are not checked
+        """
+        key = \
+            ( pr.organisation, pr.department
+            , pr.purchase_type, pr.pr_ext_resource
+            )
+        if key not in self.matching :
+            self.matching [key] = \
+                [ ac for ac in self.configs
+                  if  ac.valid
+                  and (  not ac.purchase_type
+                      or pr.purchase_type in ac.purchase_type
+                      )
+                  and (  not ac.pr_ext_resource
+                      or pr.pr_ext_resource == ac.pr_ext_resource
+                      )
+                  and self.org_dep_match (ac, pr)
+                ]
+        return self.matching [key]
+    # end def applicable
+
+# end class Approval_Rules
+
+_rules = {}
+
+def approval_rules (db) :
+    """ Return compiled rules for the tracker of db, recompiled if the
+        configuration changed.
+    """
+    version = lookup_cache.table_version \
+        (db, 'pr_approval_config', 'pr_approval_order')
+    key     = db.config.TRACKER_HOME
+    rules   = _rules.get (key)
+    if version is None or rules is None or rules.version != version :
+        rules = Approval_Rules (db, version)
+        if version is not None :
+            _rules [key] = rules
+    return rules
+# end def approval_rules
+
+class Offer_Item_Summary (object) :
+    """ Offer items of a PR with their sum and the derived values needed
+        for computing approvals. The derived values are computed on
+        first use. A summary is kept per PR until the end of the
+        transaction or until a PR, offer item or supplier rating
+        changes, see offer_item_summary.
+    """
+
+    def __init__ (self, db, pr) :
+        self.db    = db
+        self.pr    = pr
+        self.items = [db.pr_offer_item.getnode (id) for id in pr.offer_items]
+        self.total = 0.0
+        for item in self.items :
+            if item.price_per_unit is not None and item.units is not None :
+                self.total += item.price_per_unit * item.units
+        if pr.total_cost is not None :
+            assert abs (pr.total_cost - self.total) < 0.0001
+        self.cache = {}
+    # end def __init__
+
+    def _cached (self, name, method, *args) :
+        if name not in self.cache :
+            self.cache [name] = method (self.db, self.pr.id, *args)
+        return self.cache [name]
+    # end def _cached
+
+    @property
+    def in_las (self) :
+        return self._cached ('in_las', in_las)
+    # end def in_las
+
+    @property
+    def max_risk (self) :
+        return self._cached ('max_risk', max_risk_type)
+    # end def max_risk
+
+    @property
+    def need_payment_type_approval (self) :
+        if 'pt' not in self.cache :
+            self.cache ['pt'] = need_payment_type_approval (self.db, self.pr)
+        return self.cache ['pt']
+    # end def need_payment_type_approval
+
+    @property
+    def infosec_level_lowered (self) :
+        """ Check if the user specified a lower infosec_level than would
+            be computed automagically
+        """
+        if 'infosec_lowered' not in self.cache :
+            self.cache ['infosec_lowered'] = False
+            for oi in self.items :
+                pg = self.db.product_group.getnode (oi.product_group)
+                if not pg.infosec_level :
+                    continue
+                if oi.infosec_level is None :
+                    self.cache ['infosec_lowered'] = True
+                    break
+                pg_il = self.db.infosec_level.getnode (pg.infosec_level)
+                oi_il = self.db.infosec_level.getnode (oi.infosec_level)
+                if oi_il.order < pg_il.order :
+                    self.cache ['infosec_lowered'] = True
+                    break
+        return self.cache ['infosec_lowered']
+    # end def infosec_level_lowered
+
+# end class Offer_Item_Summary
+
+def _summary_cache (db) :
+    try :
+        return db.offer_item_summary
+    except AttributeError :
+        def offer_item_summary_clear (db) :
+            db.offer_item_summary = {}
+        db.registerClearCacheCallback (offer_item_summary_clear, db)
+        db.offer_item_summary = {}
+    return db.offer_item_summary
+# end def _summary_cache
+
+def offer_item_summary (db, pr) :
+    """ Per-transaction Offer_Item_Summary of pr """
+    cache = _summary_cache (db)
+    if pr.id not in cache :
+        cache [pr.id] = Offer_Item_Summary (db, pr)
+    return cache [pr.id]
+# end def offer_item_summary
+
+def invalidate_offer_item_summary (db, cl, nodeid, old_values) :
+    """ Reactor: Drop all summaries when something they depend on
+        changes.
+    """
+    _summary_cache (db).clear ()
+# end def invalidate_offer_item_summary
+
+summary_classes = \
+    ( 'purchase_request', 'pr_offer_item', 'pr_supplier_rating'
+    , 'pr_supplier_risk'
+    )
+
 class Approval_Logic :
 
     def __init__ (self, db, pr, do_create, email_only) :
@@ -182,6 +376,8 @@ class Approval_Logic :
         self.email_only  = email_only
         self.apr_by_r_d  = {}
         self.apr_by_role = {}
+        self.rules       = approval_rules (db)
+        self.summary     = offer_item_summary (db, pr)
         # These do not go together
         assert not (do_create and email_only)
     # end def __init__
@@ -206,7 +402,7 @@ class Approval_Logic :
     # end def _lookup_approval
 
     def add_approval_with_role (self, appr_order_id) :
-        ord   = self.db.pr_approval_order.getnode (appr_order_id)
+        ord   = self.rules.orders [appr_order_id]
         # MUST be set
         assert ord.only_nosy is not None
         if ord.only_nosy and not self.email_only :
@@ -236,19 +432,8 @@ class Approval_Logic :
         _  = db.i18n.gettext
         pr = self.pr
         # Compute board and finance approval configs for this pr
-        board_roles   = db.pr_approval_order.filter \
-            (None, dict (is_board = True))
-        finance_roles = db.pr_approval_order.filter \
-            (None, dict (is_finance = True))
-        # Check if there are any pr_approval_config entries with board or
-        # finance roles
-        ids = db.pr_approval_config.filter (None, dict (role = board_roles))
-        bac = _app_cfgs (db, pr, ids)
-        board_roles = set (ac.role for ac in bac)
-
-        ids = db.pr_approval_config.filter (None, dict (role = finance_roles))
-        fac = _app_cfgs (db, pr, ids)
-        finance_roles = set (ac.role for ac in fac)
+        board_roles   = self.rules.special_roles (pr, self.rules.board)
+        finance_roles = self.rules.special_roles (pr, self.rules.finance)
 
         if self.do_create and not board_roles :
             raise Reject \
@@ -299,48 +484,29 @@ class Approval_Logic :
                 )
             self._add_approval ((u, u), apr)
 
-        max_risk = max_risk_type (db, pr.id)
-        prc_ids  = db.pr_approval_config.filter (None, dict (valid = True))
+        summary = self.summary
         if cur :
             assert not self.do_create or pr.part_of_budget
             if pr.part_of_budget :
                 pob = db.part_of_budget.getnode (pr.part_of_budget)
             else :
                 pob = None
-            s  = pr_offer_item_sum (db, pr.id)
-            s  = s * 1.0 / cur.exchange_rate
-            for prcid in prc_ids :
-                prc = db.pr_approval_config.getnode (prcid)
-                if prc.if_not_in_las and in_las (db, pr.id) :
-                    continue
-                if  (   prc.purchase_type
-                    and pr.purchase_type not in prc.purchase_type
-                    ) :
-                    continue
-                if  (   prc.pr_ext_resource
-                    and pr.pr_ext_resource != prc.pr_ext_resource
-                    ) :
-                    continue
-                if  (   prc.organisations and pr.organisation
-                    and pr.organisation not in prc.organisations
-                    ) :
-                    continue
-                if  (   prc.departments and pr.department
-                    and pr.department not in prc.departments
-                    ) :
+            s  = summary.total * 1.0 / cur.exchange_rate
+            for prc in self.rules.applicable (pr) :
+                if prc.if_not_in_las and summary.in_las :
                     continue
                 if  (      prc.amount         is not None and s > prc.amount
                     or (   prc.infosec_amount is not None
                        and s > prc.infosec_amount
-                       and max_risk
-                       and (  'High' in max_risk.name
-                           or max_risk.order >= 30
+                       and summary.max_risk
+                       and (  'High' in summary.max_risk.name
+                           or summary.max_risk.order >= 30
                            or self.infosec_level_lowered ()
                            )
                        )
                     or (   prc.payment_type_amount is not None
                        and s > prc.payment_type_amount
-                       and need_payment_type_approval (db, pr)
+                       and summary.need_payment_type_approval
                        )
                     or (   prc.oob_amount is not None
                        and pob
@@ -349,8 +515,7 @@ class Approval_Logic :
                        )
                     ) :
                     self.add_approval_with_role (prc.role)
-                    r = db.pr_approval_order.getnode (prc.role)
-        oisum = pr_offer_item_sum (db, pr.id)
+        oisum = summary.total
         if cur :
             min_head = self.team_group_head_approval (cur, oisum, pcc)
             if min_head is not None and oisum > min_head :
@@ -378,8 +543,7 @@ class Approval_Logic :
             # Loop over order items and check if any is not on the approved
             # suppliers list
             supplier_approved = True
-            for id in pr.offer_items :
-                oi = db.pr_offer_item.getnode (id)
+            for oi in summary.items :
                 if not self.supplier_is_approved (oi.pr_supplier) :
                     supplier_approved = False
             if pr.safety_critical and not supplier_approved :
@@ -390,7 +554,7 @@ class Approval_Logic :
         if pr.purchase_type :
             pt    = db.purchase_type.getnode (pr.purchase_type)
             roles = []
-            if cur and pr_offer_item_sum (db, pr.id) > cur.min_sum :
+            if cur and oisum > cur.min_sum :
                 roles.extend (pt.pr_roles)
             roles.extend (pt.pr_forced_roles)
             # Make them unique
@@ -399,8 +563,7 @@ class Approval_Logic :
                 self.add_approval_with_role (role)
         # Loop over offer items and add additional approvals if
         # needed by specified sap_cc, time_project, or purchase_type
-        for id in pr.offer_items :
-            oi = db.pr_offer_item.getnode (id)
+        for oi in summary.items :
             pcc = None
             if oi.time_project :
                 pcc = db.time_project.getnode (oi.time_project)
@@ -429,7 +592,7 @@ class Approval_Logic :
             if oi.purchase_type :
                 pt    = db.purchase_type.getnode (oi.purchase_type)
                 roles = []
-                if cur and pr_offer_item_sum (db, pr.id) > cur.min_sum :
+                if cur and oisum > cur.min_sum :
                     roles.extend (pt.pr_roles)
                 roles.extend (pt.pr_forced_roles)
                 for role in roles :
@@ -449,7 +612,7 @@ class Approval_Logic :
     def compute_nosy_users (self) :
         users = set ()
         for aoid in self.apr_by_role :
-            ao  = self.db.pr_approval_order.getnode (aoid)
+            ao  = self.rules.orders [aoid]
             apr = self.apr_by_role [aoid]
             assert isinstance (apr, dict)
             assert ao.only_nosy
@@ -462,17 +625,7 @@ class Approval_Logic :
         """ Check if the user specified a lower infosec_level than would be
             computed automagically
         """
-        for oid in self.pr.offer_items :
-            oi = self.db.pr_offer_item.getnode (oid)
-            pg = self.db.product_group.getnode (oi.product_group)
-            if pg.infosec_level :
-                if oi.infosec_level is None :
-                    return True
-                pg_il = self.db.infosec_level.getnode (pg.infosec_level)
-                oi_il = self.db.infosec_level.getnode (oi.infosec_level)
-                if oi_il.order < pg_il.order :
-                    return True
-        return False
+        return self.summary.infosec_level_lowered
     # end def infosec_level_lowered
 
     def supplier_is_approved (self, sup_id) :
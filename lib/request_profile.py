@@ -0,0 +1,281 @@
+# Copyright (C) 2026 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# All rights reserved
+# ****************************************************************************
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+# ****************************************************************************
+#
+#++
+# Name
+#    request_profile
+#
+# Purpose
+#    Opt-in per-request profiling: Count and time hyperdb calls
+#    (filter, getnode, ...) and auditor/reactor runs per web request.
+#    Enabled with enable = yes in the [profile] section of
+#    extensions/config.ini. The detector detectors/d_profiler.py
+#    instruments each opened db, the extension
+#    extensions/profiler.py installs a Client that starts the
+#    profile of a request, sends a summary in the X-Roundup-Profile
+#    header and appends the full profile to a rotating JSON-lines log.
+#    Times are inclusive: The time of a reactor contains the time of
+#    the hyperdb calls it does. Only the outermost hyperdb call is
+#    counted, not the calls it does internally.
+#
+#--
+#
+
+import json
+import logging
+import os
+import threading
+import time
+from   logging.handlers import RotatingFileHandler
+from   rsclib.autosuper import autosuper
+try :
+    from urllib.parse import parse_qsl
+except ImportError :
+    from urlparse import parse_qsl
+
+db_methods = \
+    ( 'create', 'set', 'retire', 'restore', 'get', 'getnode', 'lookup'
+    , 'filter', 'filter_iter', 'find', 'stringFind', 'list', 'getnodeids'
+    , 'history'
+    )
+
+_current = threading.local ()
+_loggers = {}
+_lock    = threading.Lock ()
+
+def _cfg (config, name, default) :
+    return getattr (config.ext, 'PROFILE_' + name, None) or default
+# end def _cfg
+
+def enabled (config) :
+    """ Check if profiling is enabled in the ext config """
+    return _cfg (config, 'ENABLE', 'no').lower () in ('yes', 'true')
+# end def enabled
+
+class Request_Profile (object) :
+    """ Counts and times of the calls during one request, indexed by
+        kind (db, auditor, reactor) and name (method or detector)
+    """
+
+    def __init__ (self, request = '') :
+        self.request = request
+        self.user    = None
+        self.start   = time.time ()
+        self.calls   = {}
+        self.depth   = 0
+    # end def __init__
+
+    def add (self, kind, name, seconds) :
+        c = self.calls.setdefault (kind, {}).setdefault (name, [0, 0.0])
+        c [0] += 1
+        c [1] += seconds
+    # end def add
+
+    def elapsed (self) :
+        return time.time () - self.start
+    # end def elapsed
+
+    def totals (self) :
+        """ Dict kind -> (count, seconds)
+
+            >>> p = Request_Profile ()
+            >>> p.add ('db', 'issue.filter', 0.5)
+            >>> p.add ('db', 'user.getnode', 0.25)
+            >>> p.totals ()
+            {'db': (2, 0.75)}
+        """
+        return dict \
+            ( (k, ( sum (c [0] for c in v.values ())
+                  , sum (c [1] for c in v.values ())
+                  )
+              )
+              for k, v in self.calls.items ()
+            )
+    # end def totals
+
+    def header (self) :
+        """ Summary for the X-Roundup-Profile response header
+
+            >>> p = Request_Profile ()
+            >>> p.start -= 0.5
+            >>> p.add ('db', 'issue.filter', 0.125)
+            >>> p.header ().split (';') [1:]
+            [' db=1/125.0ms']
+        """
+        h = ['total=%.1fms' % (self.elapsed () * 1000)]
+        for k, (n, t) in sorted (self.totals ().items ()) :
+            h.append ('%s=%d/%.1fms' % (k, n, t * 1000))
+        return '; '.join (h)
+    # end def header
+
+    def as_dict (self) :
+        calls = {}
+        for k, v in self.calls.items () :
+            calls [k] = dict \
+                ((n, [c, round (t * 1000, 3)]) for n, (c, t) in v.items ())
+        return dict \
+            ( request     = self.request
+            , user        = self.user
+            , start       = round (self.start, 3)
+            , duration_ms = round (self.elapsed () * 1000, 3)
+            , calls       = calls
+            )
+    # end def as_dict
+
+# end class Request_Profile
+
+def current () :
+    """ Profile of the request running in this thread or None """
+    return getattr (_current, 'profile', None)
+# end def current
+
+def start (request = '') :
+    _current.profile = p = Request_Profile (request)
+    return p
+# end def start
+
+def stop () :
+    p = current ()
+    _current.profile = None
+    return p
+# end def stop
+
+def request_name (env) :
+    """ Method, path and the names of the query parameters of the
+        request in env. Parameter values are not logged, they may
+        contain passwords or the @csrf token.
+
+        >>> env = dict \\
+        ...     ( REQUEST_METHOD = 'POST', PATH_INFO = 'user3'
+        ...     , QUERY_STRING   = '@csrf=x&password=secret&@csrf=y&a'
+        ...     )
+        >>> request_name (env)
+        'POST user3?@csrf&password&a'
+        >>> request_name (dict (REQUEST_METHOD = 'GET', PATH_INFO = ''))
+        'GET '
+    """
+    names = []
+    qs    = env.get ('QUERY_STRING', '')
+    for k, v in parse_qsl (qs, keep_blank_values = True) :
+        if k not in names :
+            names.append (k)
+    r = '%s %s' % (env.get ('REQUEST_METHOD'), env.get ('PATH_INFO'))
+    if names :
+        r = '%s?%s' % (r, '&'.join (names))
+    return r
+# end def request_name
+
+def profiled (kind, name, method) :
+    """ Wrap method to record its calls in the current profile """
+    def wrapper (*args, **kw) :
+        p = current ()
+        if p is None or (kind == 'db' and p.depth) :
+            return method (*args, **kw)
+        t = time.time ()
+        p.depth += kind == 'db'
+        try :
+            return method (*args, **kw)
+        finally :
+            p.depth -= kind == 'db'
+            p.add (kind, name, time.time () - t)
+    wrapper.profiled = True
+    wrapper.__name__ = getattr (method, '__name__', name)
+    return wrapper
+# end def profiled
+
+def _wrap_detectors (cl, kind, detectors) :
+    """ Wrap not yet wrapped detectors of all events, detectors may be
+        registered after the db was instrumented.
+    """
+    for prio_list in detectors.values () :
+        l = prio_list.list
+        for n, (prio, name, fn) in enumerate (l) :
+            if not getattr (fn, 'profiled', False) :
+                dname = '%s.%s' % (cl.classname, name)
+                l [n] = (prio, name, profiled (kind, dname, fn))
+# end def _wrap_detectors
+
+def instrument_db (db) :
+    """ Wrap the hyperdb methods and detectors of all classes of db """
+    for cn in db.getclasses () :
+        cl = db.getclass (cn)
+        for m in db_methods :
+            setattr (cl, m, profiled ('db', '%s.%s' % (cn, m), getattr (cl, m)))
+        for kind, detectors in \
+            (('auditor', cl.auditors), ('reactor', cl.reactors)) :
+            fire = 'fireAuditors' if kind == 'auditor' else 'fireReactors'
+            def fire_profiled \
+                ( event, nodeid, values
+                , cl = cl, kind = kind, detectors = detectors
+                , fire = getattr (cl, fire)
+                ) :
+                _wrap_detectors (cl, kind, detectors)
+                return fire (event, nodeid, values)
+            setattr (cl, fire, fire_profiled)
+# end def instrument_db
+
+def log_profile (config, profile) :
+    """ Append profile as one JSON line to the profile log, the log is
+        rotated when it reaches max_bytes.
+    """
+    path = _cfg (config, 'LOG', 'db/request_profile.log')
+    path = os.path.join (config.TRACKER_HOME, path)
+    with _lock :
+        logger = _loggers.get (path)
+        if logger is None :
+            logger = logging.getLogger ('request_profile.%s' % path)
+            logger.propagate = False
+            logger.setLevel (logging.INFO)
+            handler = RotatingFileHandler \
+                ( path
+                , maxBytes    = int (_cfg (config, 'LOG_MAX_BYTES', 10000000))
+                , backupCount = int (_cfg (config, 'LOG_BACKUP_COUNT', 5))
+                )
+            logger.addHandler (handler)
+            _loggers [path] = logger
+    logger.info (json.dumps (profile.as_dict (), sort_keys = True))
+# end def log_profile
+
+class Profiling_Client (autosuper) :
+    """ Mixin for the roundup Client, see extensions/profiler.py
+    """
+
+    def main (self) :
+        p = start (request_name (self.env))
+        try :
+            return self.__super.main ()
+        finally :
+            stop ()
+            p.user = getattr (self, 'user', None)
+            try :
+                log_profile (self.instance.config, p)
+            except EnvironmentError as e :
+                logging.getLogger ('roundup').error \
+                    ('Cannot write request profile: %s' % e)
+    # end def main
+
+    def header (self, headers = None, response = None) :
+        p = current ()
+        if p is not None :
+            self.additional_headers ['X-Roundup-Profile'] = p.header ()
+        return self.__super.header (headers, response)
+    # end def header
+
+# end class Profiling_Client
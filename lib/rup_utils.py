@@ -82,30 +82,16 @@ USER_SINGLE = """
 <tal:block metal:define-macro="%(macro_name)s">
  <tal:block tal:condition="python:not context [name].is_edit_ok ()"
   tal:replace="python: context [name]"/>
- <select tal:attributes="name name"
+ <select class="user-picker"
+  tal:attributes="name name"
   tal:condition="python: context [name].is_edit_ok ()">
   <option value=""
           tal:content="dont_care"></option>
-  <!-- autogenerated -->
-%(option_list)s
-  <!-- autogenerated -->
+  <option selected="selected"
+          tal:repeat="u python: utils.picker_users (context [name])"
+          tal:attributes="value u/id"
+          tal:content="u/username"></option>
 </select>
-<script language="javascript"
-        tal:content="structure string:
-<!--
-select_box = document.${form}.${name};
-if (select_box)
-  {
-    for (i = 0; i < select_box.length; i++)
-      {
-        if (select_box.options [i].value == ${selected})
-          select_box.options [i].selected = true;
-        else
-          select_box.options [i].selected = false;
-      }
-  }
--->
-"></script>
 </tal:block>
 """
 
@@ -113,92 +99,45 @@ USER_MULTI = """
 <tal:block metal:define-macro="%(macro_name)s">
  <tal:block tal:condition="python:not %(condition)s"
   tal:replace="python: context [name]"/>
- <select multiple tal:condition="python: %(condition)s"
+ <select multiple class="user-picker"
+         tal:condition="python: %(condition)s"
          tal:attributes="size size;
                          name name">
   <option value=""
           tal:content="dont_care"></option>
-  <!-- autogenerated -->
-%(option_list)s
-  <!-- autogenerated -->
+  <option selected="selected"
+          tal:repeat="u python: utils.picker_users (context [name])"
+          tal:attributes="value u/id"
+          tal:content="u/username"></option>
 </select>
-<script language="javascript"
-        tal:content="structure string:
-<!--
-select_box = document.${form}.${name};
-selected   = new Array (${selected});
-if (select_box)
-  {
-    for (i = 0; i < select_box.length; i++)
-      {
-        for (j = 0; j < selected.length; j++)
-          {
-            if (select_box.options [i].value == selected [j])
-              select_box.options [i].selected = true;
-          }
-      }
-  }
--->
-"></script>
 </tal:block>
 """
 
-OPTION_FMT = """  <option value="%s">%s</option>"""
-
 def update_userlist_html (db, cl = None) :
     """newly create user_list.html macro page
+       The select boxes only contain the currently selected users, the
+       other users are searched via the rest/aux/user_search endpoint
+       by the user picker in lfiles/js/user_picker.js. So the page no
+       longer depends on the user table and needs to be created only
+       once. The cl parameter is kept for compatibility.
     """
-    if not cl :
-        cl = db.user
     root       = os.path.join (db.config.TRACKER_HOME, "html")
     userlist   = "userlist.html"
     f, tmpname = mkstemp (".html", "userlist", root)
     f = os.fdopen (f, 'w')
-    # all 'real' users
-    spec = {}
-    if 'status' in cl.properties :
-        stati = db.user_status.filter (None, dict (is_nosy = True))
-        spec  = { 'status' : stati }
-    users      = cl.filter ( None # full text search
-                           , filterspec = spec
-                           , sort       = ("+", "username")
-                           )
-    options  = [OPTION_FMT % (id, cl.get (id, "username")) for id in users]
-
-    f.write (USER_SINGLE % { "macro_name"  : "user"
-                           , "option_list" : "\n".join (options)
-                           }
-            )
+    f.write (USER_SINGLE % { "macro_name"  : "user" })
     f.write (USER_MULTI  % { "macro_name"  : "user_multi"
-                           , "option_list" : "\n".join (options)
                            , "condition"   : "context [name].is_edit_ok ()"
                            }
             )
     f.write (USER_MULTI  % { "macro_name"  : "user_multi_read"
-                           , "option_list" : "\n".join (options)
                            , "condition"   : "True"
                            }
             )
-
-    # all users (incl. mail alias users)
-    # RSC: now there are no mail alias users -- and we don't want
-    # invalid users here, so use the same filterspec.
-    spec = {}
-    if 'status' in cl.properties :
-        stati  = db.user_status.filter (None, dict (is_nosy = True))
-        spec   = {"status" : stati}
-    users    = cl.filter ( None # full text search
-                         , filterspec = spec
-                         , sort       = ("+", "username")
-                         )
-    options  = [OPTION_FMT % (id, cl.get (id, "username")) for id in users]
-
     f.write (USER_MULTI  % { "macro_name"  : "nosy_multi"
-                           , "option_list" : "\n".join (options)
                            , "condition"   : "True"
                            }
             )
-
     f.close ()
     shutil.move (tmpname, os.path.join (root, userlist))
 # end def update_userlist_html
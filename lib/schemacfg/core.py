@@ -36,7 +36,7 @@ from linking import linkclass_iter
 def init \
     ( db
     , Class
-    , FileClass
+    , File_Class
     , Msg_Class
     , String
     , Password
@@ -48,13 +48,8 @@ def init \
     # FileClass automatically gets these properties:
     #   content = String()    [saved to disk in <tracker home>/db/files/]
     #   (it also gets the Class properties creation, activity and creator)
-    FileClass \
-        ( db
-        , ''"file"
-        , name                  = String    (indexme = 'no')
-        , type                  = String    (indexme = 'no')
-        , content               = String    (indexme = 'no')
-        )
+    # File_Class adds name, type and content with indexme = 'no'
+    File_Class (db, ''"file")
 
     msg = Msg_Class  (db , ''"msg")
     msg.setorderprop ('date')
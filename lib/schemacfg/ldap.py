@@ -74,6 +74,21 @@ def init \
     # end class User_Class
     export.update (dict (User_Class = User_Class))
 
+    File_Ancestor = kw ['File_Class']
+    class File_Class (File_Ancestor) :
+        """ Add digests of the content and of the resized variant synced
+            to ldap: Pictures are compared by digest during sync.
+        """
+        def __init__ (self, db, classname, ** properties) :
+            self.update_properties \
+                ( content_digest         = String    (indexme = 'no')
+                , resized_digest         = String    (indexme = 'no')
+                )
+            File_Ancestor.__init__ (self, db, classname, ** properties)
+        # end def __init__
+    # end class File_Class
+    export.update (dict (File_Class = File_Class))
+
     # add_properties specifies properties that may be edited although
     # normally restricted.
     domain_permission = Class \
@@ -344,6 +344,21 @@ class Importer (object) :
             # end def __init__
         # end class Msg_Class
 
+        class File_Class (FileClass, Ext_Mixin) :
+            """ Create File_Class with default attributes, may be
+                extended by schema modules (e.g. ldap adds digests).
+            """
+            def __init__ (self, db, classname, ** properties) :
+                self.update_properties \
+                    ( name                 = String    (indexme = 'no')
+                    , type                 = String    (indexme = 'no')
+                    , content              = String    (indexme = 'no')
+                    )
+                Ext_Mixin.__init__ (self, db, properties)
+                FileClass.__init__ (self, db, classname, ** properties)
+            # end def __init__
+        # end class File_Class
+
         User_Status_Ancestor = Ext_Class
         class User_Status_Class (Ext_Class) :
             """ Create User_Status_Class with default attributes.
@@ -364,6 +379,7 @@ class Importer (object) :
 
         globals ['Ext_Class']                = Ext_Class
         globals ['Msg_Class']                = Msg_Class
+        globals ['File_Class']               = File_Class
         globals ['Ext_Mixin']                = Ext_Mixin
         globals ['Min_Issue_Class']          = Min_Issue_Class
         globals ['Nosy_Issue_Class']         = Nosy_Issue_Class
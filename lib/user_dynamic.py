@@ -37,6 +37,7 @@ from roundup.date import Date
 
 import freeze
 import common
+import lookup_cache
 ymd = common.ymd
 day = common.day
 
@@ -171,6 +172,30 @@ def act_or_latest_user_dynamic (db, user) :
     return ud
 # end def act_or_latest_user_dynamic
 
+def act_or_latest_user_dynamics (db, users) :
+    """ Bulk version of act_or_latest_user_dynamic: Return dict of user
+        -> user_dynamic record, all records of the given users are
+        retrieved with a single query.
+    """
+    now    = Date ('.')
+    today  = Date (now.pretty (ymd))
+    by_usr = {}
+    if not users :
+        return by_usr
+    for id in db.user_dynamic.filter_iter (None, dict (user = list (users))) :
+        dyn = db.user_dynamic.getnode (id)
+        by_usr.setdefault (dyn.user, []).append (dyn)
+    result = {}
+    for u, dyns in by_usr.items () :
+        dyns.sort (key = lambda d : d.valid_from)
+        act = [d for d in dyns if d.valid_from < today + day]
+        if act and (not act [-1].valid_to or act [-1].valid_to > now) :
+            result [u] = act [-1]
+        else :
+            result [u] = dyns [-1]
+    return result
+# end def act_or_latest_user_dynamics
+
 wdays = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
 
 def day_work_hours (dynuser, date) :
@@ -293,12 +318,13 @@ def update_tr_duration (db, dr)  :
                 wh += rq
     trs     = []
     trvl_tr = {}
+    trvl_ac = lookup_cache.flagged (db, 'time_activity', 'travel')
     for t in dr.time_record :
         tr     = db.time_record.getnode (t)
         trs.append (tr)
         hours += tr.duration
         act    = tr.time_activity
-        travel = not tr_full and act and db.time_activity.get (act, 'travel')
+        travel = not tr_full and act in trvl_ac
         if travel :
             hhours  += tr.duration / 2.
             trvl_tr [tr.id] = tr
@@ -951,6 +977,19 @@ def invalidate_tr_duration (db, uid, v_frm, v_to) :
         db.daily_record.set (dr, tr_duration_ok = None)
 # end def invalidate_tr_duration
 
+def time_records_in_range (db, user, date_range) :
+    """ Time records of user with a daily record date in date_range.
+        Returns the list of ids and the set of ids booked on a wp of a
+        public holiday project, each retrieved with one joined query.
+    """
+    flt = {'daily_record.user' : user, 'daily_record.date' : date_range}
+    trs = db.time_record.filter (None, flt)
+    if not trs :
+        return trs, set ()
+    flt ['wp.project.is_public_holiday'] = True
+    return trs, set (db.time_record.filter (None, flt))
+# end def time_records_in_range
+
 def user_dynamic_year_iter (db, user, date_in_year) :
     y   = common.start_of_year (date_in_year)
     eoy = common.end_of_year (y)
@@ -0,0 +1,141 @@
+# Copyright (C) 2026 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# All rights reserved
+# ****************************************************************************
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+# ****************************************************************************
+#
+#++
+# Name
+#    user_picker
+#
+# Purpose
+#    Prefix index over username, first-, last- and nickname of all
+#    users for the user search REST endpoint used by the lazy-loading
+#    user pickers. The index is kept per tracker and process and is
+#    rebuilt only when the user table changes.
+#
+#--
+#
+
+import hashlib
+import unicodedata
+from   bisect import bisect_left
+import lookup_cache
+
+name_props = ('username', 'firstname', 'lastname', 'nickname', 'realname')
+
+def normalize (s):
+    """ Lowercase and strip accents for matching.
+
+        >>> print (normalize (u'M\\xfcller'))
+        muller
+    """
+    s = unicodedata.normalize ('NFKD', s)
+    return ''.join (c for c in s if not unicodedata.combining (c)).lower ()
+# end def normalize
+
+class User_Index (object):
+    """ Sorted list of (word, username, id) for all words of the name
+        properties of non-retired users, searched by prefix with bisect.
+    """
+
+    def __init__ (self, db, version = None):
+        self.version = version
+        self.props   = [p for p in name_props if p in db.user.properties]
+        self.users   = {}
+        words        = []
+        for id in db.user.filter_iter (None, {}, sort = [('+', 'username')]):
+            node = db.user.getnode (id)
+            user = dict (id = id, status = None, roles = ())
+            for p in self.props:
+                user [p] = node [p] or ''
+            if 'status' in db.user.properties:
+                user ['status'] = node ['status']
+            if node ['roles']:
+                user ['roles'] = tuple \
+                    (r.strip ().lower () for r in node ['roles'].split (','))
+            user ['realname'] = self.realname (user)
+            self.users [id] = user
+            for p in self.props:
+                for w in normalize (user [p]).split ():
+                    words.append ((w, user ['username'], id))
+        words.sort ()
+        self.words = words
+    # end def __init__
+
+    def realname (self, user):
+        if user.get ('firstname') or user.get ('lastname'):
+            return ' '.join \
+                (x for x in (user ['firstname'], user ['lastname']) if x)
+        return user.get ('realname', '')
+    # end def realname
+
+    def prefix (self, p):
+        """ Ids of users with a name word starting with p """
+        result = set ()
+        idx    = bisect_left (self.words, (p,))
+        while idx < len (self.words) and self.words [idx][0].startswith (p):
+            result.add (self.words [idx][2])
+            idx += 1
+        return result
+    # end def prefix
+
+    def search (self, query = '', status = None, role = None):
+        """ Users matching all words of query by prefix, optionally
+            restricted to the given status ids and role, sorted by
+            username.
+        """
+        ids = None
+        for p in normalize (query).split ():
+            found = self.prefix (p)
+            ids   = found if ids is None else ids & found
+        if ids is None:
+            ids = self.users
+        users = (self.users [id] for id in ids)
+        if status:
+            users = (u for u in users if u ['status'] in status)
+        if role:
+            role  = role.lower ()
+            users = (u for u in users if role in u ['roles'])
+        return sorted (users, key = lambda u: u ['username'])
+    # end def search
+
+# end class User_Index
+
+_indices = {}
+
+def user_index (db):
+    """ Return index for the tracker of db, rebuilt if the user table
+        changed.
+    """
+    version = lookup_cache.table_version (db, 'user')
+    key     = db.config.TRACKER_HOME
+    index   = _indices.get (key)
+    if version is None or index is None or index.version != version:
+        index = User_Index (db, version)
+        if version is not None:
+            _indices [key] = index
+    return index
+# end def user_index
+
+def etag (index, *args):
+    """ ETag for a search result, None if the index is not cached """
+    if index.version is None:
+        return None
+    h = hashlib.sha1 (repr ((index.version, args)).encode ('utf-8'))
+    return '"%s"' % h.hexdigest ()
+# end def etag
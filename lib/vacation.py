@@ -30,27 +30,36 @@
 
 from math import ceil
 
-from roundup.date import Date, Interval
-from freeze       import freeze_date
+from roundup.date       import Date, Interval
+from roundup.exceptions import Reject
+from freeze             import freeze_date, frozen
 import common
+import lookup_cache
 import user_dynamic
 
-def public_holiday_wp (db, user, date):
-    """ Get first public holiday wp for this user on date.
-        Should typically be only one, we use the first in the list
-        without further checks.
+def public_holiday_wps (db, user):
+    """ Candidate public holiday wps for this user, see public_holiday_wp
     """
     opn = db.time_project_status.lookup ('Open')
     prj = db.time_project.filter \
         (None, dict (is_public_holiday = True, status = opn))
     if not prj:
-        return None
-    wps = \
+        return []
+    return \
         ( db.time_wp.filter \
             (None, dict (project = prj, is_public = True))
         + db.time_wp.filter \
             (None, dict (project = prj, bookers = user))
         )
+# end def public_holiday_wps
+
+def public_holiday_wp (db, user, date, wps = None):
+    """ Get first public holiday wp for this user on date.
+        Should typically be only one, we use the first in the list
+        without further checks.
+    """
+    if wps is None:
+        wps = public_holiday_wps (db, user)
     for wpid in wps:
         w = db.time_wp.getnode (wpid)
         if  (   w.time_start <= date
@@ -60,6 +69,9 @@ def public_holiday_wp (db, user, date):
 # end def public_holiday_wp
 
 def get_public_holiday (db, dyn, date):
+    batch = daily_record_batch (db, dyn.user, date)
+    if batch:
+        return batch.holiday (dyn, date)
     loc = db.org_location.get (dyn.org_location, 'location')
     dt  = common.pretty_range (date, date)
     hol = db.public_holiday.filter (None, dict (date = dt, locations = loc))
@@ -72,12 +84,19 @@ def get_public_holiday (db, dyn, date):
 
 def try_create_public_holiday (db, daily_record, date, user):
     # Change even if status is not open
-    wp      = public_holiday_wp (db, user, date)
+    batch = daily_record_batch (db, user, date)
+    if batch:
+        wp  = batch.holiday_wp (date)
+    else:
+        wp  = public_holiday_wp (db, user, date)
     # Only perform public holiday processing if user has a public
     # holiday wp to book on.
     if not wp:
         return
-    dyn = user_dynamic.get_user_dynamic (db, user, date)
+    if batch:
+        dyn = batch.dyn (date)
+    else:
+        dyn = user_dynamic.get_user_dynamic (db, user, date)
     wh  = user_dynamic.day_work_hours   (dyn, date)
     if wh:
         holiday = get_public_holiday (db, dyn, date)
@@ -87,8 +106,11 @@ def try_create_public_holiday (db, daily_record, date, user):
             wh = user_dynamic.round_daily_work_hours (wh)
             # Check if there already is a public-holiday time_record
             # Update duration (and wp) if wrong
-            trs = db.time_record.filter \
-                (None, dict (daily_record = daily_record))
+            # Records created in a batch have no time_records yet
+            trs = []
+            if not batch or daily_record not in batch.created:
+                trs = db.time_record.filter \
+                    (None, dict (daily_record = daily_record))
             for trid in trs:
                 tr = db.time_record.getnode (trid)
                 if tr.wp is None:
@@ -139,27 +161,311 @@ def update_public_holidays (db, dyn):
             try_create_public_holiday (db, dr [0], hol.date, dyn.user)
 # end def update_public_holidays
 
+class Daily_Record_Batch (object):
+    """ Prefetch everything needed for creating the daily records of
+        user from first_day to last_day: existing daily records, dynamic
+        user records, the freeze date, public holidays and public
+        holiday wps. While used as a context manager the daily_record
+        detectors and try_create_public_holiday validate against the
+        prefetched data instead of querying for each record.
+    """
+
+    def __init__ (self, db, user, first_day, last_day):
+        self.db        = db
+        self.user      = str (user)
+        self.first_day = Date (first_day.pretty (common.ymd))
+        self.last_day  = Date (last_day.pretty  (common.ymd))
+        self.created   = set ()
+        self.prev      = None
+        rng            = common.pretty_range (self.first_day, self.last_day)
+        self.existing  = {}
+        drs = db.daily_record.filter_iter \
+            (None, dict (user = self.user, date = rng))
+        for id in drs:
+            dr = db.daily_record.getnode (id)
+            self.existing [dr.date.pretty (common.ymd)] = id
+        self.dyns = []
+        dyns = db.user_dynamic.filter_iter \
+            ( None
+            , dict
+                ( user       = self.user
+                , valid_from = self.last_day.pretty (';%Y-%m-%d')
+                )
+            , sort = ('+', 'valid_from')
+            )
+        for id in dyns:
+            dyn = db.user_dynamic.getnode (id)
+            if not dyn.valid_to or dyn.valid_to > self.first_day:
+                self.dyns.append (dyn)
+        self.frozen_until = None
+        fr = frozen (db, self.user, self.first_day, order = '-')
+        if fr:
+            self.frozen_until = db.daily_record_freeze.get (fr [0], 'date')
+        self.holidays = {}
+        for id in db.public_holiday.filter_iter (None, dict (date = rng)):
+            hol = db.public_holiday.getnode (id)
+            self.holidays.setdefault \
+                (hol.date.pretty (common.ymd), []).append (hol)
+        self.wps = public_holiday_wps (db, self.user)
+    # end def __init__
+
+    def __enter__ (self):
+        self.prev = getattr (self.db, 'daily_record_batch', None)
+        self.db.daily_record_batch = self
+        return self
+    # end def __enter__
+
+    def __exit__ (self, tp, value, tb):
+        self.db.daily_record_batch = self.prev
+    # end def __exit__
+
+    def covers (self, user, date):
+        return \
+            (   str (user) == self.user
+            and self.first_day <= date < self.last_day + common.day
+            )
+    # end def covers
+
+    def dyn (self, date):
+        """ Like user_dynamic.get_user_dynamic """
+        for dyn in reversed (self.dyns):
+            if dyn.valid_from <= date:
+                if not dyn.valid_to or dyn.valid_to > date:
+                    return dyn
+                return None
+        return None
+    # end def dyn
+
+    def frozen (self, date):
+        return bool (self.frozen_until and self.frozen_until >= date)
+    # end def frozen
+
+    def daily_record (self, date):
+        return self.existing.get (date.pretty (common.ymd))
+    # end def daily_record
+
+    def holiday_wp (self, date):
+        return public_holiday_wp (self.db, self.user, date, self.wps)
+    # end def holiday_wp
+
+    def holiday (self, dyn, date):
+        """ Like get_public_holiday """
+        loc  = self.db.org_location.get (dyn.org_location, 'location')
+        hols = self.holidays.get (date.pretty (common.ymd), [])
+        hols = [h for h in hols if loc in h.locations]
+        if hols:
+            assert len (hols) == 1
+            return hols [0]
+        return None
+    # end def holiday
+
+    def create (self, date):
+        """ Create daily record, the detectors use the prefetched data """
+        id = self.db.daily_record.create \
+            ( user              = self.user
+            , date              = date
+            , weekend_allowed   = False
+            , required_overtime = False
+            )
+        self.existing [date.pretty (common.ymd)] = id
+        self.created.add (id)
+        return id
+    # end def create
+
+# end class Daily_Record_Batch
+
+def daily_record_batch (db, user, date):
+    """ Return the active Daily_Record_Batch if it covers user and date
+    """
+    batch = getattr (db, 'daily_record_batch', None)
+    if batch and batch.covers (user, date):
+        return batch
+    return None
+# end def daily_record_batch
+
+class Leave_Booking (Daily_Record_Batch):
+    """ Book the leave of an accepted leave submission vs or remove it
+        again on cancellation. The daily, time and attendance records of
+        the whole range and the projects of the booked work packages are
+        loaded up-front, the records are then created or retired in one
+        pass instead of querying day by day.
+    """
+
+    def __init__ (self, db, vs):
+        Daily_Record_Batch.__init__ \
+            (self, db, vs.user, vs.first_day, vs.last_day)
+        self.vs    = vs
+        self.wp    = db.time_wp.getnode (vs.time_wp)
+        self.tp    = db.time_project.getnode (self.wp.project)
+        self.dates = dict ((id, d) for d, id in self.existing.items ())
+        drs        = sorted (self.dates, key = int)
+        self.trs   = []
+        self.ars   = []
+        if drs:
+            self.trs = [db.time_record.getnode (id)
+                        for id in db.time_record.filter_iter
+                            (None, dict (daily_record = drs))
+                       ]
+            self.ars = [db.attendance_record.getnode (id)
+                        for id in db.attendance_record.filter_iter
+                            (None, dict (daily_record = drs))
+                       ]
+        self.project = {}
+        wps = sorted (set (tr.wp for tr in self.trs if tr.wp), key = int)
+        if wps:
+            for id in db.time_wp.filter_iter (wps, {}):
+                self.project [id] = db.time_wp.get (id, 'project')
+        self.holiday_projects = set ()
+        prj = sorted (set (self.project.values ()), key = int)
+        if prj:
+            self.holiday_projects = set \
+                (db.time_project.filter (prj, dict (is_public_holiday = True)))
+    # end def __init__
+
+    def is_holiday (self, tr):
+        return bool (tr.wp and self.project [tr.wp] in self.holiday_projects)
+    # end def is_holiday
+
+    def holiday_ars (self):
+        """ All public holiday time records have a linked attendance
+            record which is kept.
+        """
+        ars = set ()
+        for tr in self.trs:
+            if self.is_holiday (tr):
+                assert len (tr.attendance_record) == 1
+                ars.add (tr.attendance_record [0])
+        return ars
+    # end def holiday_ars
+
+    def leave_duration (self, date):
+        """ Like leave_duration above """
+        wh = user_dynamic.day_work_hours (self.dyn (date), date)
+        if not wh:
+            return 0.0
+        dr = self.daily_record (date)
+        assert dr
+        bk = sum \
+            ( tr.duration for tr in self.trs
+              if tr.daily_record == dr and self.is_holiday (tr)
+            )
+        assert bk <= wh
+        return wh - bk
+    # end def leave_duration
+
+    def accept (self):
+        """ Retire all time and attendance records of the range except
+            for public holidays and book the leave. Returns the retired
+            time records as (date, project, wp, duration) and the retired
+            attendance records as (date, work location, start, end) for
+            notifying the user, time records of the leave wp itself are
+            not reported.
+        """
+        db      = self.db
+        warn_tr = []
+        warn_ar = []
+        keep    = self.holiday_ars ()
+        for tr in self.trs:
+            if self.is_holiday (tr):
+                continue
+            if tr.wp != self.vs.time_wp:
+                wn = tn = ''
+                if tr.wp:
+                    wn = db.time_wp.get (tr.wp, 'name')
+                    tn = db.time_project.get (self.project [tr.wp], 'name')
+                dt = self.dates [tr.daily_record]
+                warn_tr.append ((dt, tn, wn, tr.duration))
+            db.time_record.retire (tr.id)
+        for ar in self.ars:
+            if ar.id in keep:
+                continue
+            wl = ar.work_location or ''
+            if wl:
+                wl = db.work_location.get (wl, 'code')
+            dt = self.dates [ar.daily_record]
+            warn_ar.append ((dt, wl, ar.start or '', ar.end or ''))
+            db.attendance_record.retire (ar.id)
+        off   = db.work_location.filter (None, dict (is_off = True)) [0]
+        leave = lookup_cache.lookup (db, 'daily_record_status', 'leave')
+        d     = self.first_day
+        while d <= self.last_day:
+            ld = du = self.leave_duration (d)
+            if self.tp.max_hours is not None:
+                du = min (ld, self.tp.max_hours)
+            dr = self.daily_record (d)
+            if ld:
+                trn = db.time_record.create \
+                    ( daily_record  = dr
+                    , duration      = du
+                    , wp            = self.vs.time_wp
+                    )
+                db.attendance_record.create \
+                    ( daily_record  = dr
+                    , time_record   = trn
+                    , work_location = off
+                    )
+            db.daily_record.set (dr, status = leave)
+            d += common.day
+        return warn_tr, warn_ar
+    # end def accept
+
+    def cancel (self):
+        """ Retire the booked leave, public holidays are kept, and re-open
+            the daily records.
+        """
+        db   = self.db
+        keep = self.holiday_ars ()
+        for tr in self.trs:
+            if self.is_holiday (tr):
+                continue
+            # A time record without wp is an inconsistency, retire it, too
+            if tr.wp:
+                assert db.time_project.get \
+                    (self.project [tr.wp], 'approval_required')
+            db.time_record.retire (tr.id)
+        for ar in self.ars:
+            if ar.id not in keep:
+                db.attendance_record.retire (ar.id)
+        st_open = lookup_cache.lookup (db, 'daily_record_status', 'open')
+        for dr in sorted (self.dates, key = int):
+            db.daily_record.set (dr, status = st_open)
+    # end def cancel
+
+# end class Leave_Booking
+
 def create_daily_recs (db, user, first_day, last_day):
-    d = first_day
+    """ Create missing daily records of user from first_day to
+        last_day. Everything is validated up-front against prefetched
+        data, so either all or none of the records are created.
+    """
+    _     = db.i18n.gettext
+    batch = Daily_Record_Batch (db, user, first_day, last_day)
+    uid   = db.getuid ()
+    uname = db.user.get (user, 'username')
+    todo  = []
+    d     = first_day
     while d <= last_day:
-        pr = common.pretty_range (d, d)
-        x = db.daily_record.filter (None, dict (user = user, date = pr))
+        x = batch.daily_record (d)
         if x:
-            assert len (x) == 1
-            x = x [0]
-        else:
-            dyn = user_dynamic.get_user_dynamic (db, user, d)
-            if not dyn:
-                d += common.day
-                continue
-            x = db.daily_record.create \
-                ( user              = user
-                , date              = d
-                , weekend_allowed   = False
-                , required_overtime = False
-                )
-        try_create_public_holiday (db, x, d, user)
+            todo.append ((d, x))
+        elif batch.dyn (d):
+            date = d
+            if uid != '1' and not batch.dyn (d).booking_allowed:
+                raise Reject \
+                    (_ ("Booking not allowed for %(uname)s, %(date)s")
+                    % locals ()
+                    )
+            if batch.frozen (d):
+                raise Reject (_ ("Frozen: %(uname)s, %(date)s") % locals ())
+            todo.append ((d, None))
         d += common.day
+    with batch:
+        for d, x in todo:
+            if x:
+                try_create_public_holiday (db, x, d, user)
+            else:
+                # public holiday is created by the daily_record reactor
+                batch.create (d)
 # end def create_daily_recs
 
 def leave_submissions_on_date (db, user, date, filter = None):
@@ -949,8 +1255,8 @@ def flexi_remain (db, user, date_in_year, ctype):
     y     = common.start_of_year (date_in_year)
     eoy   = common.end_of_year   (y)
     fa    = flexi_alliquot (db, user, date_in_year, ctype)
-    acpt  = db.leave_status.lookup ('accepted')
-    cnrq  = db.leave_status.lookup ('cancel requested')
+    acpt  = lookup_cache.lookup (db, 'leave_status', 'accepted')
+    cnrq  = lookup_cache.lookup (db, 'leave_status', 'cancel requested')
     if not fa:
         return 0
     sd = 0
@@ -994,7 +1300,7 @@ def fix_vacation (db, uid, date_from = None, date_to = None):
         if frozen:
             frozen = db.daily_record_freeze.getnode (frozen [0])
             date_from = frozen.date + common.day
-    leave = db.daily_record_status.lookup ('leave')
+    leave = lookup_cache.lookup (db, 'daily_record_status', 'leave')
     d = dict ()
     d ['daily_record.user']   = uid
     d ['daily_record.date']   = common.pretty_range (date_from, date_to)
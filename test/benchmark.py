@@ -0,0 +1,648 @@
+#!/usr/bin/python3
+# Copyright (C) 2026 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# All rights reserved
+# ****************************************************************************
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+# ****************************************************************************
+#++
+# Name
+#    benchmark
+#
+# Purpose
+#    Benchmark the hot paths of time tracking on a synthetic
+#    organisation. Run from the top-level directory of the tracker with
+#    python3 -m test.benchmark --help
+#    A tracker is installed like for the tests (with a real database
+#    backend, default postgresql), populated with users, supervisors,
+#    org_locations, dynamic user histories, daily-, time- and
+#    attendance records, leave submissions and freezes. Then each
+#    scenario is run and the wall time and number of SQL queries are
+#    reported.
+#--
+
+import json
+import os
+import random
+import sys
+import time
+import unittest
+from argparse              import ArgumentParser
+from roundup               import date
+from roundup.cgi           import templating
+
+from .test_base            import _Test_Base, summary, user_dynamic
+from .test_base            import common
+
+sys.path.insert (0, os.path.abspath ('extensions'))
+import vac
+
+class Query_Counter (object):
+    """ Count SQL queries issued via db.sql, this is the method all
+        hyperdb queries of the rdbms backends go through. The memorydb
+        backend has no queries to count.
+    """
+
+    def __init__ (self, db):
+        self.db    = db
+        self.count = 0
+        self.sql   = None
+        if hasattr (db, 'conn'):
+            self.sql = db.sql
+            db.sql   = self.counting_sql
+    # end def __init__
+
+    def counting_sql (self, *args, **kw):
+        self.count += 1
+        return self.sql (*args, **kw)
+    # end def counting_sql
+
+    def reset (self):
+        self.count = 0
+    # end def reset
+
+# end class Query_Counter
+
+class Synthetic_Org (object):
+    """ Generate a synthetic organisation: org_locations, supervisors
+        with their users, dynamic user records (with a change of
+        working hours each year), public holidays, one week of accepted
+        vacation per user and year, accepted daily records with time-
+        and attendance records for every workday and a freeze at the
+        end of each year but the last. The last weeks stay open so they
+        can be submitted and approved by the benchmark.
+    """
+
+    def __init__ \
+        ( self, db
+        , users         = 20
+        , supervisors   = 4
+        , org_locations = 2
+        , years         = 1
+        , open_weeks    = 2
+        , wps           = 20
+        , seed          = 42
+        , verbose       = False
+        ):
+        self.db            = db
+        self.n_users       = users
+        self.n_supervisors = supervisors
+        self.n_olo         = org_locations
+        self.years         = years
+        self.open_weeks    = open_weeks
+        self.n_wps         = wps
+        self.random        = random.Random (seed)
+        self.verbose       = verbose
+        now                = date.Date ('.')
+        # Start of the week a little in the past
+        sow                = common.start_of_period (now, common.period_week)
+        self.end           = sow - common.day
+        self.start         = date.Date ('%s-01-01' % (now.year - years))
+        self.open_from     = sow - date.Interval ('%sd' % (7 * open_weeks))
+    # end def __init__
+
+    def create (self):
+        db = self.db
+        self.create_org ()
+        self.create_projects ()
+        self.create_users ()
+        db.commit ()
+        self.create_holidays ()
+        for u in self.users:
+            self.create_leaves  (u)
+            self.create_records (u)
+            db.commit ()
+            if self.verbose:
+                print ("Created records for %s" % db.user.get (u, 'username'))
+        self.create_freezes ()
+        db.commit ()
+    # end def create
+
+    def create_org (self):
+        db = self.db
+        self.org = db.organisation.create \
+            ( name        = 'Synthetic Org'
+            , description = 'Synthetic organisation for benchmarks'
+            , mail_domain = 'example.com'
+            , valid_from  = self.start - date.Interval ('365d')
+            )
+        self.loc = db.location.create \
+            ( name    = 'Vienna'
+            , country = 'Austria'
+            , address = 'Vienna, Austria'
+            )
+        self.olos = []
+        for n in range (self.n_olo):
+            olo = db.org_location.create \
+                ( name                = 'Synthetic Org %s' % n
+                , location            = self.loc
+                , organisation        = self.org
+                , vacation_legal_year = False
+                , vacation_yearly     = 25.0
+                , do_leave_process    = True
+                , vac_aliq            = '1'
+                )
+            self.olos.append (olo)
+        self.week = db.overtime_period.lookup ('week')
+    # end def create_org
+
+    def create_projects (self):
+        db       = self.db
+        wl_off   = db.work_location.lookup ('off')
+        st_open  = db.time_project_status.lookup ('Open')
+        self.wl  = db.work_location.lookup ('office')
+        ccg      = db.cost_center_group.create (name = 'Synthetic CCG')
+        self.cc  = db.cost_center.create \
+            ( name               = 'Synthetic CC'
+            , cost_center_group  = ccg
+            , status             = db.cost_center_status.lookup ('Open')
+            )
+        common_tp = dict \
+            ( responsible        = '1'
+            , status             = st_open
+            , cost_center        = self.cc
+            , organisation       = self.org
+            , approval_hr        = False
+            )
+        holiday_tp = db.time_project.create \
+            ( name               = 'Synthetic Public Holiday'
+            , work_location      = wl_off
+            , op_project         = False
+            , no_overtime        = True
+            , no_overtime_day    = False
+            , overtime_reduction = True
+            , is_public_holiday  = True
+            , approval_required  = False
+            , is_vacation        = False
+            , ** common_tp
+            )
+        vacation_tp = db.time_project.create \
+            ( name               = 'Synthetic Vacation'
+            , work_location      = wl_off
+            , op_project         = False
+            , no_overtime        = True
+            , no_overtime_day    = False
+            , overtime_reduction = True
+            , approval_required  = True
+            , is_vacation        = True
+            , ** common_tp
+            )
+        normal_tp = db.time_project.create \
+            ( name               = 'Synthetic Project'
+            , op_project         = True
+            , approval_required  = False
+            , is_vacation        = False
+            , ** common_tp
+            )
+        common_wp = dict \
+            ( time_start         = self.start - date.Interval ('365d')
+            , responsible        = '1'
+            , cost_center        = self.cc
+            , is_public          = True
+            )
+        self.holiday_wp = db.time_wp.create \
+            ( name               = 'Holiday'
+            , project            = holiday_tp
+            , durations_allowed  = True
+            , ** common_wp
+            )
+        self.vacation_wp = db.time_wp.create \
+            ( name               = 'Vacation'
+            , project            = vacation_tp
+            , durations_allowed  = True
+            , ** common_wp
+            )
+        self.wps = []
+        for n in range (self.n_wps):
+            wp = db.time_wp.create \
+                ( name           = 'Work Package %s' % n
+                , project        = normal_tp
+                , ** common_wp
+                )
+            self.wps.append (wp)
+    # end def create_projects
+
+    def create_user (self, name, supervisor = None):
+        db  = self.db
+        olo = self.random.choice (self.olos)
+        d   = dict \
+            ( username  = name
+            , firstname = 'Synthetic'
+            , lastname  = name.capitalize ()
+            , roles     = 'User,Nosy'
+            )
+        if supervisor:
+            d ['supervisor'] = supervisor
+        uid   = db.user.create (** d)
+        user_dynamic.user_create_magic (db, uid, olo)
+        start = self.start - date.Interval ('365d')
+        for y in range (self.years + 2):
+            hours = self.random.choice ((7.75, 7.5, 8.0))
+            valid_from = date.Date ('%s-01-01' % (start.year + y))
+            db.user_dynamic.create \
+                ( user              = uid
+                , valid_from        = max (valid_from, start)
+                , org_location      = olo
+                , booking_allowed   = True
+                , vacation_yearly   = 25.0
+                , vacation_month    = 1
+                , vacation_day      = 1
+                , all_in            = False
+                , hours_mon         = hours
+                , hours_tue         = hours
+                , hours_wed         = hours
+                , hours_thu         = hours
+                , hours_fri         = 7.5
+                , supp_weekly_hours = hours * 4 + 7.5
+                , overtime_period   = self.week
+                )
+        return uid
+    # end def create_user
+
+    def create_users (self):
+        self.supervisors = []
+        self.users       = []
+        # Reports are run by HR
+        self.hr = self.db.user.create \
+            ( username  = 'hr'
+            , firstname = 'Synthetic'
+            , lastname  = 'HR'
+            , roles     = 'User,Nosy,HR,HR-Vacation,Controlling,Staff-Report'
+                          ',Vacation-Report,Summary_View'
+            )
+        for n in range (self.n_supervisors):
+            sv = self.create_user ('supervisor%s' % n)
+            self.supervisors.append (sv)
+            self.users.append (sv)
+        for n in range (self.n_users):
+            sv = self.supervisors [n % len (self.supervisors)]
+            self.users.append (self.create_user ('user%s' % n, sv))
+    # end def create_users
+
+    def create_holidays (self):
+        for y in range (self.start.year, self.end.year + 1):
+            for d, name in (('01-01', 'New Year'), ('12-25', 'Christmas')):
+                self.db.public_holiday.create \
+                    ( date        = date.Date ('%s-%s' % (y, d))
+                    , description = name
+                    , name        = name
+                    , locations   = [self.loc]
+                    )
+    # end def create_holidays
+
+    def workdays (self, first, last):
+        d = first
+        while d <= last:
+            if d.get_tuple () [6] < 5:
+                yield d
+            d = d + common.day
+    # end def workdays
+
+    def create_leaves (self, user):
+        """ One week of vacation in summer of each year, submitted by
+            the user and accepted by the supervisor.
+        """
+        db = self.db
+        sv = db.user.get (user, 'supervisor')
+        if not sv:
+            return
+        for y in range (self.start.year, self.end.year + 1):
+            week = self.random.randint (26, 34)
+            fd   = date.Date ('%s-01-01' % y) + date.Interval ('%sd' % (7 * week))
+            fd   = common.start_of_period (fd, common.period_week)
+            if fd + date.Interval ('4d') >= self.open_from:
+                continue
+            ls = db.leave_submission.create \
+                ( user      = user
+                , first_day = fd
+                , last_day  = fd + date.Interval ('4d')
+                , time_wp   = self.vacation_wp
+                , status    = db.leave_status.lookup ('submitted')
+                )
+            db.setCurrentUser (db.user.get (sv, 'username'))
+            db.leave_submission.set \
+                (ls, status = db.leave_status.lookup ('accepted'))
+            db.setCurrentUser ('admin')
+    # end def create_leaves
+
+    def create_records (self, user):
+        db     = self.db
+        accpt  = db.daily_record_status.lookup ('accepted')
+        dr_opn = db.daily_record_status.lookup ('open')
+        holidays = set \
+            ( db.public_holiday.get (h, 'date').pretty (common.ymd)
+              for h in db.public_holiday.getnodeids ()
+            )
+        for d in self.workdays (self.start, self.end):
+            dt = d.pretty (common.ymd)
+            if db.daily_record.filter (None, dict (user = user, date = dt)):
+                continue
+            status = accpt
+            if d >= self.open_from:
+                status = dr_opn
+            dr = db.daily_record.create (user = user, date = d, status = status)
+            if dt in holidays:
+                db.time_record.create \
+                    (daily_record = dr, duration = 7.5, wp = self.holiday_wp)
+                continue
+            # Start at 8:00, one hour break between records
+            start = 8 * 60
+            for k in range (self.random.randint (1, 3)):
+                du  = self.random.choice ((2.0, 2.5, 3.0))
+                end = start + int (du * 60)
+                tr  = db.time_record.create \
+                    ( daily_record  = dr
+                    , duration      = du
+                    , wp            = self.random.choice (self.wps)
+                    )
+                db.attendance_record.create \
+                    ( daily_record  = dr
+                    , time_record   = tr
+                    , work_location = self.wl
+                    , start         = '%02d:%02d' % divmod (start, 60)
+                    , end           = '%02d:%02d' % divmod (end, 60)
+                    )
+                start = end + 60
+    # end def create_records
+
+    def create_freezes (self):
+        for y in range (self.start.year, self.end.year):
+            for u in self.users:
+                self.db.daily_record_freeze.create \
+                    (user = u, date = date.Date ('%s-12-31' % y), frozen = True)
+    # end def create_freezes
+
+# end class Synthetic_Org
+
+class Benchmark (_Test_Base, unittest.TestCase):
+    """ Install the tracker, generate the synthetic organisation and
+        run the scenarios. Each scenario is run repeat times with a
+        cleared cache, modifications are rolled back after each run.
+    """
+    schemaname = 'time'
+    schemafile = 'time_ldap'
+
+    def __init__ (self, args):
+        unittest.TestCase.__init__ (self, 'run')
+        self.args    = args
+        self.backend = args.backend
+        self.results = []
+    # end def __init__
+
+    def setUp (self):
+        self.setup_tracker ()
+        self.db  = self.tracker.open ('admin')
+        t        = time.time ()
+        self.org = Synthetic_Org \
+            ( self.db
+            , users         = self.args.users
+            , supervisors   = self.args.supervisors
+            , org_locations = self.args.org_locations
+            , years         = self.args.years
+            , seed          = self.args.seed
+            , verbose       = self.args.verbose
+            )
+        self.org.create ()
+        print ("Data generation: %.2fs" % (time.time () - t))
+        summary.init (self.tracker)
+        self.counter = Query_Counter (self.db)
+    # end def setUp
+
+    def tearDown (self):
+        if not self.args.keep:
+            _Test_Base.tearDown (self)
+    # end def tearDown
+
+    def measure (self, name, method):
+        times = []
+        count = None
+        for n in range (self.args.repeat):
+            self.db.setCurrentUser ('hr')
+            self.db.clearCache ()
+            self.counter.reset ()
+            t = time.time ()
+            method ()
+            times.append (time.time () - t)
+            if count is None:
+                count = self.counter.count
+            self.db.rollback ()
+        times.sort ()
+        result = dict \
+            ( scenario = name
+            , backend  = self.backend
+            , users    = len (self.org.users)
+            , years    = self.args.years
+            , queries  = count if self.counter.sql else None
+            , min      = times [0]
+            , median   = times [len (times) // 2]
+            )
+        self.results.append (result)
+        print \
+            ( "%-22s %8s queries %9.3fs min %9.3fs median"
+            % (name, result ['queries'], result ['min'], result ['median'])
+            )
+    # end def measure
+
+    def report (self, cls, fs, columns = None, classname = None):
+        class r:
+            filterspec = fs
+            sort       = None
+            group      = None
+        if classname is not None:
+            r.classname = classname
+        if columns is not None:
+            r.columns = columns
+        sr = cls (self.db, r, templating.TemplatingUtils (None))
+        return sr.as_csv ()
+    # end def report
+
+    def bench_summary_report (self):
+        fs = dict \
+            ( user         = self.org.users
+            , date         = self.daterange
+            , summary_type = ['2', '4']
+            )
+        cols = ['time_wp', 'user', 'summary']
+        self.report (summary.Summary_Report, fs, cols, 'summary_report')
+    # end def bench_summary_report
+
+    def bench_staff_report (self):
+        fs = dict \
+            ( user         = self.org.users
+            , date         = self.daterange
+            , summary_type = ['4']
+            )
+        self.report (summary.Staff_Report, fs)
+    # end def bench_staff_report
+
+    def bench_vacation_report (self):
+        fs = dict (user = self.org.users, date = self.daterange)
+        self.report (summary.Vacation_Report, fs, set ())
+    # end def bench_vacation_report
+
+    def bench_compute_balance (self):
+        for u in self.org.users:
+            user_dynamic.compute_balance \
+                (self.db, u, self.org.end, sharp_end = True)
+    # end def bench_compute_balance
+
+    def bench_weekly_submit_approve (self):
+        """ Submit the open week(s) of all users and approve them by
+            the respective supervisor, like the Daily_Record_Submit and
+            Daily_Record_Approve actions do.
+        """
+        db    = self.db
+        dt    = common.pretty_range (self.org.open_from, self.org.end)
+        opn   = db.daily_record_status.lookup ('open')
+        subm  = db.daily_record_status.lookup ('submitted')
+        accpt = db.daily_record_status.lookup ('accepted')
+        for u in self.org.users:
+            sv = db.user.get (u, 'supervisor')
+            if not sv:
+                continue
+            db.setCurrentUser (db.user.get (u, 'username'))
+            for dr in db.daily_record.filter \
+                (None, dict (user = u, date = dt, status = opn)):
+                db.daily_record.set (dr, status = subm)
+            db.setCurrentUser (db.user.get (sv, 'username'))
+            for dr in db.daily_record.filter \
+                (None, dict (user = u, date = dt, status = subm)):
+                db.daily_record.set (dr, status = accpt)
+    # end def bench_weekly_submit_approve
+
+    def bench_freeze (self):
+        """ Freeze all users like Freeze_All_Action """
+        db = self.db
+        for u in self.org.users:
+            db.daily_record_freeze.create \
+                (user = u, date = self.org.open_from - common.day, frozen = 1)
+    # end def bench_freeze
+
+    def bench_leave_display (self):
+        class Client:
+            def setHeader (self, *args):
+                pass
+        class Rest:
+            client = Client ()
+        ld = vac.Leave_Display (self.db, None, None, self.monthrange)
+        ld.as_dict (Rest (), 'rest/data/')
+    # end def bench_leave_display
+
+    scenarios = \
+        ( 'summary_report'
+        , 'staff_report'
+        , 'vacation_report'
+        , 'compute_balance'
+        , 'weekly_submit_approve'
+        , 'freeze'
+        , 'leave_display'
+        )
+
+    def run (self, result = None):
+        self.setUp ()
+        try:
+            end = self.org.end
+            self.daterange  = common.pretty_range \
+                (date.Date ('%s-01-01' % end.year), end)
+            self.monthrange = common.pretty_range \
+                (common.start_of_month (end), common.end_of_month (end))
+            for s in self.args.scenario or self.scenarios:
+                self.measure (s, getattr (self, 'bench_' + s))
+        finally:
+            self.tearDown ()
+        if self.args.output:
+            with open (self.args.output, 'a') as f:
+                for r in self.results:
+                    f.write (json.dumps (r) + '\n')
+    # end def run
+
+# end class Benchmark
+
+def main ():
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( '-b', '--backend'
+        , help    = 'Database backend, default: %(default)s, the database'
+                    ' is configured via RDBMS_HOST, RDBMS_USER and'
+                    ' RDBMS_PASSWORD environment variables like for the'
+                    ' tests'
+        , default = 'postgresql'
+        )
+    cmd.add_argument \
+        ( '-k', '--keep'
+        , help    = 'Keep generated tracker directory'
+        , action  = 'store_true'
+        )
+    cmd.add_argument \
+        ( '-l', '--org-locations'
+        , help    = 'Number of org_locations, default: %(default)s'
+        , type    = int
+        , default = 2
+        )
+    cmd.add_argument \
+        ( '-o', '--output'
+        , help    = 'Append results as JSON lines to this file'
+        )
+    cmd.add_argument \
+        ( '-r', '--repeat'
+        , help    = 'Number of runs per scenario, default: %(default)s'
+        , type    = int
+        , default = 3
+        )
+    cmd.add_argument \
+        ( '-s', '--scenario'
+        , help    = 'Scenario to run, can be given several times, one of %s'
+                  % ', '.join (Benchmark.scenarios)
+        , action  = 'append'
+        , choices = Benchmark.scenarios
+        )
+    cmd.add_argument \
+        ( '--seed'
+        , help    = 'Random seed for data generation, default: %(default)s'
+        , type    = int
+        , default = 42
+        )
+    cmd.add_argument \
+        ( '-S', '--supervisors'
+        , help    = 'Number of supervisors, default: %(default)s'
+        , type    = int
+        , default = 4
+        )
+    cmd.add_argument \
+        ( '-u', '--users'
+        , help    = 'Number of users (without supervisors), '
+                    'default: %(default)s'
+        , type    = int
+        , default = 20
+        )
+    cmd.add_argument \
+        ( '-v', '--verbose'
+        , help    = 'Report progress of data generation'
+        , action  = 'store_true'
+        )
+    cmd.add_argument \
+        ( '-y', '--years'
+        , help    = 'Years of records before the current one, '
+                    'default: %(default)s'
+        , type    = int
+        , default = 1
+        )
+    args = cmd.parse_args ()
+    Benchmark (args).run ()
+# end def main
+
+if __name__ == '__main__':
+    main ()
@@ -251,7 +251,9 @@ properties = \
       )
     , ( 'file'
       , [ 'content'
+        , 'content_digest'
         , 'name'
+        , 'resized_digest'
         , 'type'
         ]
       )
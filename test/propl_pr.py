@@ -24,7 +24,9 @@ properties = \
       )
     , ( 'file'
       , [ 'content'
+        , 'content_digest'
         , 'name'
+        , 'resized_digest'
         , 'type'
         ]
       )
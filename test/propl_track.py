@@ -118,7 +118,9 @@ properties = \
       )
     , ( 'file'
       , [ 'content'
+        , 'content_digest'
         , 'name'
+        , 'resized_digest'
         , 'type'
         ]
       )
@@ -149,7 +149,9 @@ properties = \
       )
     , ( 'file'
       , [ 'content'
+        , 'content_digest'
         , 'name'
+        , 'resized_digest'
         , 'type'
         ]
       )
@@ -264,9 +264,15 @@ properties = \
       , [ ( 'content'
           , ['admin', 'dom-user-edit-facility', 'dom-user-edit-gtt', 'dom-user-edit-hr', 'dom-user-edit-office', 'external', 'issue_admin', 'it', 'ituser', 'itview', 'kpm-admin', 'msgedit', 'msgsync', 'pgp', 'readonly-user', 'sec-incident-nosy', 'sec-incident-responsible', 'supportadmin', 'user', 'user_view']
           )
+        , ( 'content_digest'
+          , ['admin', 'dom-user-edit-facility', 'dom-user-edit-gtt', 'dom-user-edit-hr', 'dom-user-edit-office', 'external', 'issue_admin', 'it', 'ituser', 'itview', 'kpm-admin', 'msgedit', 'msgsync', 'pgp', 'readonly-user', 'sec-incident-nosy', 'sec-incident-responsible', 'supportadmin', 'user', 'user_view']
+          )
         , ( 'name'
           , ['admin', 'dom-user-edit-facility', 'dom-user-edit-gtt', 'dom-user-edit-hr', 'dom-user-edit-office', 'external', 'issue_admin', 'it', 'ituser', 'itview', 'kpm-admin', 'msgedit', 'msgsync', 'pgp', 'readonly-user', 'sec-incident-nosy', 'sec-incident-responsible', 'supportadmin', 'user', 'user_view']
           )
+        , ( 'resized_digest'
+          , ['admin', 'dom-user-edit-facility', 'dom-user-edit-gtt', 'dom-user-edit-hr', 'dom-user-edit-office', 'external', 'issue_admin', 'it', 'ituser', 'itview', 'kpm-admin', 'msgedit', 'msgsync', 'pgp', 'readonly-user', 'sec-incident-nosy', 'sec-incident-responsible', 'supportadmin', 'user', 'user_view']
+          )
         , ( 'type'
           , ['admin', 'dom-user-edit-facility', 'dom-user-edit-gtt', 'dom-user-edit-hr', 'dom-user-edit-office', 'external', 'issue_admin', 'it', 'ituser', 'itview', 'kpm-admin', 'msgedit', 'msgsync', 'pgp', 'readonly-user', 'sec-incident-nosy', 'sec-incident-responsible', 'supportadmin', 'user', 'user_view']
           )
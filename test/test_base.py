@@ -23,8 +23,12 @@ import shutil
 import sys
 import unittest
 import logging
+import cgi
 import csv
+import imaplib
+import json
 import re
+import zipfile
 from io import BytesIO
 # For monkey-patching:
 import inspect
@@ -39,6 +43,8 @@ from operator     import mul
 from email.parser import Parser
 from mailbox      import mbox
 from base64       import b64decode
+from urllib.parse import urlencode
+from argparse     import Namespace
 
 from roundup.anypy.strings import StringIO
 from roundup.test          import memorydb
@@ -46,8 +52,10 @@ from roundup               import backends
 # Inject memorydb
 backends.memorydb = memorydb
 from roundup               import configuration
-from roundup.exceptions    import Reject
+from roundup.exceptions    import Reject, UsageError
+from roundup.cgi.exceptions import LoginError, Redirect
 from roundup.i18n          import get_translation
+from roundup.roundupdb     import DetectorError
 
 Option = configuration.Option
 
@@ -117,15 +125,30 @@ from .trans_tt      import transprop_perms as transprop_time
 from .trans_search  import classdict  as trans_classprops
 
 from roundup       import instance, configuration, init, password, date
+from roundup       import hyperdb
 from roundup.cgi   import templating
+from roundup.rest  import RestfulInstance
 sys.path.insert (0, os.path.abspath ('lib'))
 sys.path.insert (0, os.path.abspath ('extensions'))
 
 import common
+import domain_perm
+import effort_rollup
+import hamlib
+import imap_sync
+import lielas
+import lib_auto_wp
+import linking
+import lookup_cache
+import mail_spool
+import prlib
+import request_profile
 import summary
 import user_dynamic
+import user_picker
 import vacation
-from vac import eoy_vacation
+from vac import eoy_vacation, Time_Record_Export
+from interfaces import approval_for
 
 header_regex = re.compile (r'\s*\n')
 def header_decode (h) :
@@ -234,12 +257,14 @@ class _Test_Base :
         config.RDBMS_TEMPLATE = "template0"
         config.MAIL_DEBUG     = "maildebug"
         config.TRACKER_LANGUAGE = 'en'
+        # Fast password hashing, also outside of pytest (benchmark)
+        config.PASSWORD_PBKDF2_DEFAULT_ROUNDS = 1000
         config.init_logging ()
         self.tearDown ()
         srcdir = os.path.join (os.path.dirname (__file__), '..')
         os.mkdir (self.dirname)
         for f in ( 'detectors', 'extensions', 'html', 'initial_data.py'
-                 , 'lib', 'locale', 'schema'
+                 , 'interfaces.py', 'lib', 'locale', 'schema'
                  , 'schemas/%s.py' % self.schemafile
                  , 'TEMPLATE-INFO.txt', 'utils'
                  ) :
@@ -255,7 +280,8 @@ class _Test_Base :
         tracker = instance.open (self.dirname)
         if tracker.exists () :
             tracker.nuke ()
-        tracker.init (password.Password (self.config.RDBMS_PASSWORD))
+        tracker.init \
+            (password.Password (self.config.RDBMS_PASSWORD, config = config))
         self.tracker = tracker
         self.tracker.i18n = get_translation \
             (tracker_home = tracker.tracker_home)
@@ -925,6 +951,42 @@ class Test_Case_Timetracker (_Test_Case_Summary, unittest.TestCase) :
         self.check_user_perms (ad_domain)
     # end def test_domain_user_edit
 
+    def test_domain_permission_index (self) :
+        self.log.debug ('test_domain_permission_index')
+        self.setup_db ()
+        db = self.db
+        db.user.set (self.user2, roles = 'User,Nosy,Dom-User-Edit-GTT')
+        db.commit ()
+        ad_domain = 'some.test.domain'
+        check     = lambda u : domain_perm.check_domain_permission \
+            (db, u, ad_domain)
+        index     = lambda : domain_perm.domain_permission_index (db)
+        # The reactor runs before the index is first used
+        dpid = db.domain_permission.create \
+            (ad_domain = ad_domain, users = [self.user1])
+        self.assertEqual (check (self.user1).id, dpid)
+        self.assertEqual (check (self.user2), None)
+        # The clear-cache callback is registered nonetheless
+        idx = index ()
+        self.assertIs (index (), idx)
+        db.commit ()
+        self.assertIsNot (index (), idx)
+        # Changes in the same transaction are seen immediately
+        db.domain_permission.set \
+            (dpid, users = [], roles_enabled = 'Dom-User-Edit-GTT')
+        self.assertEqual (check (self.user1), None)
+        self.assertEqual (check (self.user2).id, dpid)
+        db.domain_permission.retire (dpid)
+        self.assertEqual (check (self.user2), None)
+        db.domain_permission.restore (dpid)
+        self.assertEqual (check (self.user2).id, dpid)
+        db.domain_permission.set (dpid, users = [self.user1])
+        self.assertEqual (check (self.user1).id, dpid)
+        db.domain_permission.set (dpid, ad_domain = 'other.test.domain')
+        self.assertEqual (check (self.user1), None)
+        self.assertEqual (check (self.user2), None)
+    # end def test_domain_permission_index
+
     def setup_user11 (self) :
         self.username11 = 'testuser11'
         self.user11 = self.db.user.create \
@@ -2215,6 +2277,470 @@ class Test_Case_Timetracker (_Test_Case_Summary, unittest.TestCase) :
         self.db.close ()
     # end def test_user14_vacation
 
+    def test_mail_spool (self) :
+        self.log.debug ('test_mail_spool')
+        maildebug = os.path.join (self.dirname, 'maildebug')
+        self.db = self.tracker.open ('admin')
+        ext = self.db.config.ext
+        ext.add_option (Option (ext, 'MAIL', 'SPOOL_DIR'))
+        ext.MAIL_SPOOL_DIR = 'spool'
+        spooldir = os.path.join (self.dirname, 'spool', 'new')
+        mailer = mail_spool.get_mailer (self.db)
+        mailer.standard_message (('a@example.com',), 'Rolled back', 'Text')
+        self.db.rollback ()
+        mailer = mail_spool.get_mailer (self.db)
+        mailer.standard_message (('b@example.com',), 'Spooled', 'Text')
+        self.assertFalse (os.path.exists (spooldir))
+        self.db.commit ()
+        self.assertEqual (len (os.listdir (spooldir)), 1)
+        self.assertFalse (os.path.exists (maildebug))
+        sender = mail_spool.Spool_Sender (self.db.config)
+        self.assertEqual (sender.send_all (), 1)
+        self.assertEqual (len (os.listdir (spooldir)), 0)
+        e = Parser ().parse (open (maildebug, 'r'))
+        self.assertEqual (e ['TO'], 'b@example.com')
+        self.assertEqual (header_decode (e ['Subject']), 'Spooled')
+        os.unlink (maildebug)
+        spool = mail_spool.Mail_Spool (os.path.join (self.dirname, 'spool'))
+        name  = spool.add ('x@example.com', ['c@example.com'], 'Msg')
+        entry = list (spool.pending ()) [0][1]
+        self.assertEqual (spool.retry (name, entry, 'err', 2, 60), False)
+        self.assertEqual (list (spool.pending ()), [])
+        entry = list (spool.pending (now = entry ['next_try'])) [0][1]
+        self.assertEqual (entry ['tries'], 1)
+        self.assertEqual (spool.retry (name, entry, 'err', 2, 60), True)
+        self.assertEqual (len (os.listdir (spooldir)), 0)
+        failed = os.path.join (self.dirname, 'spool', 'failed')
+        self.assertEqual (os.listdir (failed), [name])
+        self.db.close ()
+    # end def test_mail_spool
+
+    def test_lookup_cache (self) :
+        self.log.debug ('test_lookup_cache')
+        self.setup_db ()
+        db = self.db
+        for name in 'open', 'submitted', 'accepted', 'leave' :
+            self.assertEqual \
+                ( lookup_cache.lookup (db, 'daily_record_status', name)
+                , db.daily_record_status.lookup (name)
+                )
+        self.assertRaises \
+            (KeyError, lookup_cache.lookup, db, 'leave_status', 'xyzzy')
+        flagged = lambda : lookup_cache.flagged (db, 'time_activity', 'travel')
+        travel  = flagged ()
+        self.assertEqual \
+            ( travel
+            , frozenset (db.time_activity.filter (None, dict (travel = True)))
+            )
+        ta = db.time_activity.create (name = 'Cached travel', travel = True)
+        self.assertEqual (flagged (), travel | set ((ta,)))
+        db.time_activity.set (ta, travel = False)
+        self.assertEqual (flagged (), travel)
+        db.rollback ()
+        self.assertEqual (flagged (), travel)
+    # end def test_lookup_cache
+
+    def test_approval_for (self) :
+        self.log.debug ('test_approval_for')
+        self.setup_db ()
+        obsolete = self.db.user_status.lookup ('obsolete')
+        self.db.commit ()
+        self.db.close ()
+        for u, exp in (self.username0, []), (self.username1, [self.user2]) :
+            self.db = self.tracker.open (u)
+            self.assertEqual (sorted (approval_for (self.db)), exp)
+            self.assertEqual (sorted (approval_for (self.db, True)), exp)
+            self.db.close ()
+        self.db = self.tracker.open ('admin')
+        self.db.user.set (self.user2, status = obsolete)
+        self.db.user.set \
+            (self.user1, substitute = self.user0, subst_active = True)
+        self.db.commit ()
+        self.db.close ()
+        self.db = self.tracker.open (self.username0)
+        self.assertEqual (sorted (approval_for (self.db)), [self.user2])
+        # Still valid according to user_dynamic
+        self.assertEqual (sorted (approval_for (self.db, True)), [self.user2])
+        self.db.close ()
+        self.db = self.tracker.open ('admin')
+        self.db.user.set \
+            (self.user1, clearance_by = self.user0, subst_active = False)
+        self.db.commit ()
+        self.db.close ()
+        for u, exp in (self.username0, [self.user2]), (self.username1, []) :
+            self.db = self.tracker.open (u)
+            self.assertEqual (sorted (approval_for (self.db)), exp)
+            self.db.close ()
+        self.db = self.tracker.open ('admin')
+    # end def test_approval_for
+
+    def test_auto_wp_sync (self) :
+        self.log.debug ('test_auto_wp_sync')
+        self.setup_db ()
+        self.db.user_dynamic.set ('1', do_auto_wp = True)
+        aid = self.db.auto_wp.create \
+            ( is_valid     = True
+            , name         = 'TEST Sync'
+            , org_location = self.olo
+            , time_project = self.holiday_tp
+            )
+        users = lib_auto_wp.auto_wp_users (self.db, aid)
+        self.assertEqual (users, set ((self.user0,)))
+        self.assertEqual (lib_auto_wp.sync_auto_wp (self.db, aid, users), [])
+        wps = self.db.time_wp.filter (None, dict (auto_wp = aid))
+        self.assertEqual (len (wps), 1)
+        self.db.time_wp.retire (wps [0])
+        report = lib_auto_wp.sync_auto_wp \
+            (self.db, aid, users, dry_run = True)
+        self.assertEqual (len (report), 1)
+        self.assertTrue (report [0].startswith ('create'))
+        self.assertEqual \
+            (self.db.time_wp.filter (None, dict (auto_wp = aid)), [])
+        lib_auto_wp.sync_auto_wp (self.db, aid, users)
+        wps = self.db.time_wp.filter (None, dict (auto_wp = aid))
+        self.assertEqual (len (wps), 1)
+        wp = self.db.time_wp.getnode (wps [0])
+        self.assertEqual (wp.time_start, date.Date ('2013-02-02'))
+        self.assertEqual (wp.time_end, None)
+    # end def test_auto_wp_sync
+
+    def test_create_daily_recs (self) :
+        self.log.debug ('test_create_daily_recs')
+        self.setup_db ()
+        dr_count = lambda first, last : len \
+            ( self.db.daily_record.filter
+                ( None
+                , dict (user = self.user0, date = '%s;%s' % (first, last))
+                )
+            )
+        vacation.create_daily_recs \
+            ( self.db, self.user0
+            , date.Date ('2013-01-28'), date.Date ('2013-02-10')
+            )
+        # No dynamic user before 2013-02-02
+        self.assertEqual (dr_count ('2013-01-28', '2013-02-10'), 9)
+        self.assertEqual (dr_count ('2013-01-28', '2013-02-01'), 0)
+        # Existing records are skipped
+        vacation.create_daily_recs \
+            ( self.db, self.user0
+            , date.Date ('2013-02-09'), date.Date ('2013-02-12')
+            )
+        self.assertEqual (dr_count ('2013-02-09', '2013-02-12'), 4)
+        self.assertEqual (getattr (self.db, 'daily_record_batch'), None)
+    # end def test_create_daily_recs
+
+    def test_imap_login_cache (self) :
+        self.log.debug ('test_imap_login_cache')
+        self.setup_db ()
+        cache = imap_sync.IMAP_Login_Cache (self.db)
+        cache.iterations = 10
+        self.assertFalse (cache.verify ('testuser0', 'secret'))
+        cache.remember ('testuser0', 'secret')
+        self.assertTrue  (cache.verify ('testuser0', 'secret'))
+        self.assertFalse (cache.verify ('testuser0', 'wrong'))
+        self.assertFalse (cache.verify ('testuser1', 'secret'))
+        cache.ttl = 0
+        self.assertFalse (cache.verify ('testuser0', 'secret'))
+        for n in range (cache.max_failures - 1) :
+            cache.failed ('testuser0')
+        self.assertFalse (cache.blocked ('testuser0'))
+        cache.failed ('testuser0')
+        self.assertTrue  (cache.blocked ('testuser0'))
+        self.assertFalse (cache.blocked ('testuser1'))
+        cache.backoff = 0
+        self.assertFalse (cache.blocked ('testuser0'))
+        # No write if nothing changed
+        sync  = imap_sync.IMAP_Roundup_Sync (self.db, login_cache = cache)
+        valid = sync.status_valid
+        self.db.user.set \
+            ( self.user0
+            , status = valid
+            , roles  = self.db.config.NEW_WEB_USER_ROLES
+            )
+        self.db.commit ()
+        act = self.db.user.get (self.user0, 'activity')
+        sync.sync_user_from_imap ('testuser0', valid)
+        self.assertEqual (self.db.user.get (self.user0, 'activity'), act)
+        sync.update_roles = True
+        sync.sync_user_from_imap ('testuser0', sync.status_obsolete)
+        self.assertEqual \
+            (self.db.user.get (self.user0, 'status'), sync.status_obsolete)
+    # end def test_imap_login_cache
+
+    def test_imap_login_pool (self) :
+        class FakeRequest (object) :
+            rfile = None
+            def start_response (self, a, b) :
+                pass
+        # end class FakeRequest
+        class Stub_IMAP4 (object) :
+            """ Records the logins, instances stay in servers """
+            error   = imaplib.IMAP4.error
+            servers = []
+            logins  = []
+            def __init__ (self, host, port) :
+                self.dead = False
+                self.servers.append (self)
+            def noop (self) :
+                if self.dead :
+                    raise OSError ('connection closed')
+            def login (self, username, password) :
+                self.logins.append ((self, username))
+                if password != 'secret' :
+                    raise self.error ('Invalid credentials')
+            def logout (self) :
+                pass
+            def shutdown (self) :
+                pass
+        # end class Stub_IMAP4
+        self.log.debug ('test_imap_login_pool')
+        self.setup_db ()
+        cache = imap_sync.IMAP_Login_Cache (self.db)
+        cache.iterations = 10
+        cache.address    = ('localhost', 143)
+        sync  = imap_sync.IMAP_Roundup_Sync (self.db, login_cache = cache)
+        imap4 = imap_sync.IMAP4
+        imap_sync.IMAP4 = Stub_IMAP4
+        try :
+            servers = Stub_IMAP4.servers
+            logins  = Stub_IMAP4.logins
+            self.assertTrue (sync.bind_as_user ('testuser0', 'secret'))
+            self.assertEqual (len (logins), 1)
+            self.assertEqual (cache.pool, [])
+            # Second login within ttl doesn't contact the server
+            self.assertTrue (sync.bind_as_user ('testuser0', 'secret'))
+            self.assertEqual (len (servers), 1)
+            self.assertEqual (len (logins),  1)
+            # A failed login returns the connection to the pool
+            self.assertFalse (sync.bind_as_user ('testuser1', 'wrong'))
+            self.assertEqual (len (servers), 2)
+            self.assertEqual (cache.pool, [servers [1]])
+            # ... where the next login picks it up
+            self.assertTrue (sync.bind_as_user ('testuser1', 'secret'))
+            self.assertEqual (len (servers), 2)
+            self.assertEqual (logins [-1], (servers [1], 'testuser1'))
+            # A dead pooled connection is replaced
+            self.assertFalse (sync.bind_as_user ('testuser2', 'wrong'))
+            self.assertEqual (cache.pool, [servers [2]])
+            servers [2].dead = True
+            self.assertTrue (sync.bind_as_user ('testuser2', 'secret'))
+            self.assertEqual (len (servers), 4)
+            self.assertEqual (logins [-1], (servers [3], 'testuser2'))
+            self.assertEqual (cache.pool, [])
+            # The login action rejects a user in backoff without asking
+            # the server, even with the right password
+            for n in range (cache.max_failures) :
+                cache.failed ('testuser0')
+            self.assertTrue (cache.blocked ('testuser0'))
+            class Login_Action (imap_sync.ImapLoginAction) :
+                def try_imap (self) :
+                    self.imsync = sync
+                    return True
+                # end def try_imap
+            # end class Login_Action
+            env = dict (PATH_INFO = '', REQUEST_METHOD = 'GET')
+            cli = self.tracker.Client \
+                (self.tracker, FakeRequest (), env, None)
+            cli.db       = self.db
+            cli.language = 'en'
+            cli.userid   = self.db.getuid ()
+            nlogin = len (logins)
+            self.assertRaises \
+                ( LoginError
+                , Login_Action (cli).verifyLogin, 'testuser0', 'secret'
+                )
+            self.assertEqual (len (logins),  nlogin)
+            self.assertEqual (len (servers), 4)
+        finally :
+            imap_sync.IMAP4 = imap4
+    # end def test_imap_login_pool
+
+    def test_request_profile (self) :
+        self.log.debug ('test_request_profile')
+        self.setup_db ()
+        request_profile.instrument_db (self.db)
+        # Not recorded outside of a request
+        self.db.user.getnode (self.user0)
+        p = request_profile.start ('GET /test')
+        try :
+            self.db.daily_record.create \
+                (user = self.user2, date = date.Date ('2013-02-04'))
+            self.db.daily_record.filter (None, dict (user = self.user2))
+            self.db.user.getnode (self.user0)
+        finally :
+            self.assertEqual (request_profile.stop (), p)
+        self.assertEqual (request_profile.current (), None)
+        db = p.calls ['db']
+        self.assertEqual (db ['daily_record.create'][0], 1)
+        self.assertEqual (db ['daily_record.filter'][0], 1)
+        self.assertEqual (db ['user.getnode'][0], 1)
+        # Calls within the create are attributed to the auditors
+        self.assertTrue (p.calls ['auditor'])
+        self.assertTrue \
+            (all (k.startswith ('daily_record.') for k in p.calls ['auditor']))
+        self.assertEqual (p.as_dict () ['request'], 'GET /test')
+        self.assertTrue (p.header ().startswith ('total='))
+        # Only the names of query parameters are logged, not the values
+        env = dict \
+            ( REQUEST_METHOD = 'POST'
+            , PATH_INFO      = 'user3'
+            , QUERY_STRING   = '__login_password=secret&@csrf=0815'
+            )
+        self.assertEqual \
+            ( request_profile.request_name (env)
+            , 'POST user3?__login_password&@csrf'
+            )
+    # end def test_request_profile
+
+    def test_time_record_export (self) :
+        self.log.debug ('test_time_record_export')
+        self.setup_db ()
+        vacation.create_daily_recs \
+            ( self.db, self.user2
+            , date.Date ('2013-02-04'), date.Date ('2013-02-08')
+            )
+        drs = self.db.daily_record.filter \
+            ( None
+            , dict (user = self.user2, date = '2013-02-04;2013-02-08')
+            , [('+', 'date')]
+            )
+        trs = []
+        for dr in reversed (drs) :
+            for d in (1.0, 2.0) :
+                trs.append \
+                    ( self.db.time_record.create
+                        (daily_record = dr, wp = self.wps [0], duration = d)
+                    )
+        trs = [trs [i] for i in (8, 9, 6, 7, 4, 5, 2, 3, 0, 1)]
+        dt  = '2013-02-04;2013-02-08'
+        ids = []
+        cursor = None
+        while True :
+            tre = Time_Record_Export \
+                (self.db, [self.user2], dt, cursor = cursor, limit = 3)
+            page, cursor = tre.page ()
+            self.assertTrue (len (page) <= 3)
+            ids.extend (tr.id for tr in page)
+            if not cursor :
+                break
+        self.assertEqual (ids, trs)
+        tre = Time_Record_Export (self.db, [self.user0], dt)
+        self.assertEqual (tre.page (), ([], None))
+        tre = Time_Record_Export \
+            (self.db, None, '2013-02-05;2013-02-05', limit = 5)
+        page, cursor = tre.page ()
+        self.assertEqual ([tr.id for tr in page], trs [2:4])
+        self.assertEqual (cursor, None)
+        tre.data_path = 'rest/data/'
+        d = tre.as_dict_entry (page [0])
+        self.assertEqual (d ['date'], '2013-02-05')
+        self.assertEqual (d ['user']['id'], self.user2)
+        self.assertEqual (d ['wp']['id'], self.wps [0])
+        self.assertEqual \
+            (d ['project']['id'], self.db.time_wp.get (self.wps [0], 'project'))
+        self.assertRaises \
+            (UsageError, Time_Record_Export, self.db, None, dt, 'x:1')
+    # end def test_time_record_export
+
+    def test_user_picker (self) :
+        self.log.debug ('test_user_picker')
+        self.setup_db ()
+        index = user_picker.user_index (self.db)
+        names = lambda *args, **kw : \
+            [u ['username'] for u in index.search (*args, **kw)]
+        users = ['testuser0', 'testuser1', 'testuser2']
+        self.assertEqual (names ('test us'), users)
+        self.assertEqual (names ('Us TEST'), users)
+        self.assertEqual (names ('user1'),   ['testuser1'])
+        self.assertEqual (names ('xyzzy'),   [])
+        self.assertEqual \
+            (index.search ('user0') [0]['realname'], 'Test User0')
+        st = self.db.user.get (self.user0, 'status')
+        self.assertEqual (names ('test', status = set ((st,))), users)
+        self.assertEqual (names ('test', status = set (('999',))), [])
+        self.assertEqual (names ('test', role = 'Nonexisting'), [])
+    # end def test_user_picker
+
+    def test_user_search (self) :
+        self.log.debug ('test_user_search')
+        self.setup_db ()
+        self.db.user.set (self.user1, roles = 'User')
+        self.db.user.set (self.user2, roles = 'Nosy')
+        self.db.commit ()
+        self.db.close ()
+
+        class FakeRequest (object) :
+            rfile   = None
+            headers = {}
+            def start_response (self, a, b) :
+                pass
+        # end class FakeRequest
+
+        class Field (object) :
+            def __init__ (self, value) :
+                self.value = value
+        # end class Field
+
+        class Input (dict) :
+            value = None
+            list  = ()
+        # end class Input
+
+        def search (username, **kw) :
+            self.db = self.tracker.open (username)
+            env = dict (PATH_INFO = '', REQUEST_METHOD = 'GET')
+            cli = self.tracker.Client (self.tracker, FakeRequest (), env, None)
+            cli.db       = self.db
+            cli.language = 'en'
+            cli.userid   = self.db.getuid ()
+            rest  = RestfulInstance (cli, self.db)
+            input = Input ((k, Field (v)) for k, v in kw.items ())
+            r     = rest.dispatch ('GET', '/rest/aux/user_search', input)
+            self.db.close ()
+            return cli.response_code, json.loads (r)
+        # end def search
+
+        users = ['testuser0', 'testuser1', 'testuser2']
+        names = lambda r : \
+            [u ['username'] for u in r ['data']['collection']]
+        code, r = search ('admin', q = 'test us')
+        self.assertEqual (code, 200)
+        self.assertEqual (names (r), users)
+        self.assertEqual \
+            (r ['data']['collection'][0]['realname'], 'Test User0')
+        code, r = search ('admin', q = 'test', role = 'Nonexisting')
+        self.assertEqual (names (r), [])
+        code, r = search ('admin', q = 'test', limit = '2')
+        self.assertEqual (names (r), users [:2])
+        # Bad input is a usage error
+        code, r = search ('admin', limit = 'x')
+        self.assertEqual (code, 400)
+        self.assertEqual (r ['error']['msg'], 'Invalid limit: x')
+        code, r = search ('admin', status = 'nonexisting')
+        self.assertEqual (code, 400)
+        # The role filter is ignored if roles may not be viewed
+        code, r = search ('testuser1', q = 'test', role = 'Nonexisting')
+        self.assertEqual (code, 200)
+        self.assertEqual (names (r), users)
+        # No users for a user who may not view their names
+        code, r = search ('testuser2', q = 'test us')
+        self.assertEqual (code, 200)
+        self.assertEqual (names (r), [])
+        self.db = self.tracker.open ('admin')
+    # end def test_user_search
+
+    def test_link_index (self) :
+        self.log.debug ('test_link_index')
+        self.setup_db ()
+        links = lambda cn : list (linking.linkclass_iter (self.db, cn))
+        self.assertIn (('time_record', 'daily_record'), links ('daily_record'))
+        self.assertNotIn (('time_record', 'xlink'), links ('user'))
+        self.db.time_record.properties ['xlink'] = hyperdb.Link ('user')
+        self.assertIn (('time_record', 'xlink'), links ('user'))
+        del self.db.time_record.properties ['xlink']
+        self.assertNotIn (('time_record', 'xlink'), links ('user'))
+    # end def test_link_index
+
     def test_vacation (self) :
         self.log.debug ('test_vacation')
         maildebug = os.path.join (self.dirname, 'maildebug')
@@ -2724,6 +3250,20 @@ class Test_Case_Timetracker (_Test_Case_Summary, unittest.TestCase) :
         # Stephanitag is on Saturday, two extra records for deletion
         self.assertEqual (len (trs), 5 + 2)
         self.assertEqual (len (ars), 5 + 2)
+        booking = vacation.Leave_Booking (self.db, vsn)
+        self.assertEqual (sorted (tr.id for tr in booking.trs), sorted (trs))
+        self.assertEqual (sorted (ar.id for ar in booking.ars), sorted (ars))
+        self.assertEqual (len ([t for t in booking.trs
+                                if booking.is_holiday (t)]), 5)
+        self.assertEqual (len (booking.holiday_ars ()), 5)
+        self.assertTrue (ar1 not in booking.holiday_ars ())
+        d = vsn.first_day
+        while d <= vsn.last_day :
+            self.assertEqual \
+                ( booking.leave_duration (d)
+                , vacation.leave_duration (self.db, self.user2, d)
+                )
+            d += common.day
 
         e = Parser ().parse (open (maildebug, 'r'))
         for h, t in \
@@ -3366,6 +3906,97 @@ class Test_Case_Timetracker (_Test_Case_Summary, unittest.TestCase) :
         self.db.close ()
     # end def test_vacation
 
+    def test_accept_selected_leave (self) :
+        class FakeRequest (object) :
+            rfile = None
+            def start_response (self, a, b) :
+                pass
+        # end class FakeRequest
+        self.log.debug ('test_accept_selected_leave')
+        self.setup_db ()
+        self.db.user.set (self.user1, roles = 'User,Nosy')
+        self.db.commit ()
+        self.db.close ()
+        self.db = self.tracker.open (self.username2)
+        st_open = self.db.leave_status.lookup ('open')
+        st_subm = self.db.leave_status.lookup ('submitted')
+        st_accp = self.db.leave_status.lookup ('accepted')
+        days = \
+            ( '2009-12-01', '2009-12-02', '2009-12-03', '2009-12-04'
+            , '2009-12-09', '2009-12-10'
+            )
+        vs = []
+        for d in days :
+            vs.append \
+                ( self.db.leave_submission.create
+                    ( first_day = date.Date (d)
+                    , last_day  = date.Date (d)
+                    )
+                )
+        # The supervisor may not accept an open submission
+        self.db.leave_submission.set (vs [2], status = st_open)
+        self.db.commit ()
+        self.db.close ()
+        self.db = self.tracker.open (self.username1)
+        # Reject the second submission after the leave is booked, the
+        # last two fail in a detector
+        def reject (db, cl, nodeid, old_values) :
+            if nodeid == vs [1] :
+                raise Reject ('Rejected for testing')
+            if nodeid == vs [4] :
+                raise DetectorError ('Mail failed for testing')
+            if nodeid == vs [5] :
+                raise ValueError ('Invalid value for testing')
+        # end def reject
+        self.db.leave_submission.react ('set', reject, priority = 200)
+        q   = ['@selected=%s' % id for id in vs + ['x']]
+        env = dict \
+            ( PATH_INFO      = ''
+            , REQUEST_METHOD = 'GET'
+            , QUERY_STRING   = '&'.join (q)
+            )
+        cli = self.tracker.Client (self.tracker, FakeRequest (), env, None)
+        cli.db        = self.db
+        cli.language  = 'en'
+        cli.userid    = self.db.getuid ()
+        cli.classname = 'leave_submission'
+        cls = self.tracker.cgi_actions ['leave_accept_selected']
+        cls (cli).handle ()
+        desc = lambda i : 'leave_submission%s (testuser2: %s - %s)' \
+            % (vs [i], days [i], days [i])
+        self.assertEqual \
+            ( cli._ok_message
+            , [desc (0) + ' accepted', desc (3) + ' accepted']
+            )
+        self.assertEqual \
+            ( cli._error_message
+            , [ desc (1) + ': Rejected for testing'
+              , desc (2) + ': Permission denied'
+              , desc (4) + ': Mail failed for testing'
+              , desc (5) + ': Invalid value for testing'
+              , 'Invalid leave submission: x'
+              ]
+            )
+        self.db.close ()
+        # The rejected submission and its booking are rolled back, the
+        # others are committed
+        self.db = self.tracker.open ('admin')
+        self.assertEqual \
+            ( [self.db.leave_submission.get (id, 'status') for id in vs]
+            , [st_accp, st_subm, st_open, st_accp, st_subm, st_subm]
+            )
+        dr_open  = self.db.daily_record_status.lookup ('open')
+        dr_leave = self.db.daily_record_status.lookup ('leave')
+        for d, st in zip \
+            (days, (dr_leave, dr_open, dr_open, dr_leave, dr_open, dr_open)) :
+            dr  = self.db.daily_record.filter \
+                (None, dict (user = self.user2, date = d))
+            self.assertEqual (len (dr), 1)
+            trs = self.db.time_record.filter (None, dict (daily_record = dr))
+            self.assertEqual (self.db.daily_record.get (dr [0], 'status'), st)
+            self.assertEqual (len (trs), int (st == dr_leave))
+    # end def test_accept_selected_leave
+
     def setup_user16 (self) :
         self.username16 = 'testuser16'
         self.user16 = self.db.user.create \
@@ -3558,6 +4189,65 @@ class Test_Case_Timetracker (_Test_Case_Summary, unittest.TestCase) :
         self.db.user_dynamic.set (id, valid_to = date.Date ('2018-12-13'))
     # end def test_edit_dynuser_leave
 
+    def test_dynuser_range_time_records (self) :
+        """ Changing the range of a dynamic user record retires time
+            records on public holidays outside the new range, other
+            time records there are rejected.
+        """
+        self.log.debug ('test_dynuser_range_time_records')
+        self.setup_db ()
+        db = self.db
+        def book (d, wp, duration) :
+            dr = db.daily_record.filter \
+                (None, dict (user = self.user2, date = d))
+            if dr :
+                dr = dr [0]
+            else :
+                dr = db.daily_record.create \
+                    (user = self.user2, date = date.Date (d))
+            return db.time_record.create \
+                (daily_record = dr, wp = wp, duration = duration)
+        # end def book
+        h1 = book ('2008-11-03', self.holiday_wp, 7.75)
+        n1 = book ('2008-11-04', self.wps [0],    8)
+        h2 = book ('2008-12-08', self.holiday_wp, 7.75)
+        n2 = book ('2008-12-09', self.wps [0],    8)
+        h3 = book ('2008-12-10', self.holiday_wp, 7.75)
+        db.commit ()
+        dyn = db.user_dynamic.filter (None, dict (user = self.user2))
+        self.assertEqual (len (dyn), 1)
+        dyn = dyn [0]
+        self.assertEqual \
+            (db.user_dynamic.get (dyn, 'valid_from'), date.Date ('2008-11-03'))
+        self.assertEqual (db.user_dynamic.get (dyn, 'valid_to'), None)
+        retired = lambda : \
+            [db.time_record.is_retired (t) for t in (h1, n1, h2, n2, h3)]
+        # Shorten over a public holiday
+        db.user_dynamic.set (dyn, valid_to = date.Date ('2008-12-10'))
+        self.assertEqual (retired (), [0, 0, 0, 0, 1])
+        # Shorten over a normal booking (and a public holiday)
+        self.assertRaisesRegex \
+            ( Reject
+            , 'non public holiday.* at or after 2008-12-08'
+            , db.user_dynamic.set, dyn, valid_to = date.Date ('2008-12-08')
+            )
+        self.assertEqual (retired (), [0, 0, 0, 0, 1])
+        # Extending is always possible
+        db.user_dynamic.set (dyn, valid_to = date.Date ('2008-12-31'))
+        self.assertEqual (retired (), [0, 0, 0, 0, 1])
+        # Same for the start of the range
+        db.user_dynamic.set (dyn, valid_from = date.Date ('2008-11-04'))
+        self.assertEqual (retired (), [1, 0, 0, 0, 1])
+        self.assertRaisesRegex \
+            ( Reject
+            , 'non public holiday.* before 2008-11-05'
+            , db.user_dynamic.set, dyn, valid_from = date.Date ('2008-11-05')
+            )
+        db.user_dynamic.set (dyn, valid_from = date.Date ('2008-11-01'))
+        self.assertEqual (retired (), [1, 0, 0, 0, 1])
+        db.commit ()
+    # end def test_dynuser_range_time_records
+
     def test_dynuser_create_modify (self) :
         self.log.debug ('test_dynuser_create_modify')
         self.setup_db ()
@@ -5446,6 +6136,98 @@ class Test_Case_Fulltracker (_Test_Case_Summary, unittest.TestCase) :
         self.assertEqual (self.db2.issue.get (mc, 'maturity_index'), 20.0)
     # end def test_maturity_index
 
+    def test_effective_prio (self) :
+        self.log.debug ('test_effective_prio')
+        self.db = self.tracker.open ('admin')
+        d = dict \
+            ( username = 'user'
+            , status = self.db.user_status.lookup ('system')
+            , roles = 'User,Nosy'
+            )
+        if 'firstname' in self.db.user.properties :
+            d ['firstname'] = d ['lastname'] = 'e.p.user'
+        user = self.db.user.create (** d)
+        pending = self.db.category.lookup ('pending')
+        self.db.category.set (pending, responsible = user)
+        self.db.commit ()
+        self.db.close ()
+        self.db = self.tracker.open ('user')
+        opn = self.db.status.lookup ('open')
+        m1  = self.db.msg.create (content="new issue", subject="new issue")
+        d   = dict \
+            ( messages     = [m1]
+            , release      = 'None'
+            , status       = opn
+            , category     = pending
+            , effort_hours = 8
+            )
+        mc = self.db.issue.create (title = "Master", priority = 10, **d)
+        c1 = self.db.issue.create \
+            (title = "Container", priority = 20, part_of = mc, **d)
+        i1 = self.db.issue.create \
+            (title = "Issue 1", priority = 5, part_of = c1, **d)
+        i2 = self.db.issue.create \
+            (title = "Issue 2", priority = 50, part_of = c1, **d)
+        self.db.commit ()
+        prios = lambda : \
+            [self.db.issue.get (i, 'effective_prio') for i in (mc, c1, i1, i2)]
+        self.assertEqual (prios (), [10, 20, 20, 50])
+        self.db.issue.set (mc, priority = 30)
+        self.assertEqual (prios (), [30, 30, 30, 50])
+        self.db.issue.set (mc, priority = 1)
+        self.assertEqual (prios (), [1, 20, 20, 50])
+        self.db.commit ()
+    # end def test_effective_prio
+
+    def test_nosy_mail_spool (self) :
+        self.log.debug ('test_nosy_mail_spool')
+        maildebug = os.path.join (self.dirname, 'maildebug')
+        spooldir  = os.path.join (self.dirname, 'spool', 'new')
+        self.db   = self.tracker.open ('admin')
+        d = dict \
+            ( username = 'nosy'
+            , address  = 'nosy@example.com'
+            , status   = self.db.user_status.lookup ('system')
+            , roles    = 'User,Nosy'
+            )
+        if 'firstname' in self.db.user.properties :
+            d ['firstname'] = d ['lastname'] = 'nosy'
+        user = self.db.user.create (** d)
+        d.update (username = 'author', address = 'author@example.com')
+        self.db.user.create (** d)
+        pending = self.db.category.lookup ('pending')
+        self.db.category.set (pending, responsible = user)
+        self.db.commit ()
+        self.db.close ()
+        self.db = self.tracker.open ('author')
+        ext = self.db.config.ext
+        ext.add_option (Option (ext, 'MAIL', 'SPOOL_DIR'))
+        ext.MAIL_SPOOL_DIR = 'spool'
+        d = dict \
+            ( release      = 'None'
+            , status       = self.db.status.lookup ('open')
+            , category     = pending
+            , effort_hours = 8
+            , nosy         = [user]
+            )
+        m1 = self.db.msg.create (content = "rolled back", subject = "x")
+        self.db.issue.create (title = "Rolled back", messages = [m1], **d)
+        self.db.rollback ()
+        self.assertFalse (os.path.exists (spooldir))
+        m1 = self.db.msg.create (content = "new issue", subject = "new issue")
+        self.db.issue.create (title = "Spooled", messages = [m1], **d)
+        self.assertFalse (os.path.exists (spooldir))
+        self.db.commit ()
+        self.assertFalse (os.path.exists (maildebug))
+        self.assertEqual (len (os.listdir (spooldir)), 1)
+        sender = mail_spool.Spool_Sender (self.db.config)
+        self.assertEqual (sender.send_all (), 1)
+        e = Parser ().parse (open (maildebug, 'r'))
+        self.assertEqual (e ['TO'], 'nosy@example.com')
+        os.unlink (maildebug)
+        self.db.close ()
+    # end def test_nosy_mail_spool
+
     def test_tr_duration (self) :
         self.log.debug ('test_tr_duration')
         trid = '4'
@@ -5482,9 +6264,231 @@ class Test_Case_Fulltracker (_Test_Case_Summary, unittest.TestCase) :
         # has already been computed when setting time_record
         self.assertEqual (l1, l2)
     # end def test_tr_duration
+
+    def test_support_contact_match (self) :
+        """ Contacts and maildomains are matched exactly by the support
+            mail gateway, not by substring.
+        """
+        self.log.debug ('test_support_contact_match')
+        self.setup_db ()
+        self.db.user.create \
+            ( username  = 'support'
+            , firstname = 'Sup'
+            , lastname  = 'Port'
+            , address   = 'support@example.com'
+            , status    = self.db.user_status.lookup ('system')
+            , roles     = 'User,Nosy'
+            )
+        email = self.db.contact_type.lookup ('Email')
+        cust  = {}
+        for name, md, mail in \
+            ( ('Example', 'example.com', 'xjoe@ample.com')
+            , ('Ample',   'ample.com',   None)
+            ) :
+            cust [name] = self.db.customer.create \
+                (name = name, maildomain = md)
+            if mail :
+                self.db.contact.create \
+                    ( contact      = mail
+                    , contact_type = email
+                    , customer     = cust [name]
+                    )
+        self.db.commit ()
+        self.db.close ()
+        self.db = None
+
+        def mail (frm, subject) :
+            msg = \
+                ( 'From: %s\n'
+                  'Resent-From: support@example.com\n'
+                  'To: support@example.com\n'
+                  'Subject: [support] %s\n'
+                  'Message-Id: <%s@example.com>\n'
+                  'Content-Type: text/plain\n'
+                  '\n'
+                  'Please help\n'
+                % (frm, subject, subject.replace (' ', '.'))
+                )
+            args    = Namespace (default_class = 'support', set_value = [])
+            handler = self.tracker.MailGW (self.tracker, args)
+            handler.trapExceptions = False
+            handler.main (BytesIO (msg.encode ('ascii')))
+            self.db = self.tracker.open ('admin')
+            sup  = self.db.support.filter (None, dict (title = subject))
+            self.assertEqual (len (sup), 1)
+            sup  = self.db.support.getnode (sup [0])
+            cont = [self.db.contact.get (c, 'contact') for c in sup.emails]
+            cust = sup.customer
+            self.db.close ()
+            self.db = None
+            return cust, cont
+        # end def mail
+
+        # The contact xjoe@ample.com contains joe@ample.com but isn't
+        # used, the maildomain example.com ends in ample.com but only
+        # the exact maildomain matches.
+        c, cont = mail ('Joe <joe@ample.com>', 'first request')
+        self.assertEqual (c, cust ['Ample'])
+        self.assertEqual (cont, ['joe@ample.com'])
+        # The contact created above is now found
+        c, cont = mail ('Joe <JOE@ample.com>', 'second request')
+        self.assertEqual (c, cust ['Ample'])
+        self.assertEqual (cont, ['joe@ample.com'])
+        # Existing contact and subdomain of example.com
+        c, cont = mail ('<xjoe@ample.com>', 'third request')
+        self.assertEqual (c, cust ['Example'])
+        self.assertEqual (cont, ['xjoe@ample.com'])
+        c, cont = mail ('<jane@sub.example.com>', 'fourth request')
+        self.assertEqual (c, cust ['Example'])
+        self.assertEqual (cont, ['jane@sub.example.com'])
+        self.db = self.tracker.open ('admin')
+        mails = self.db.contact.filter \
+            (None, dict (contact = 'joe@ample.com'))
+        self.assertEqual \
+            ( sorted (self.db.contact.get (c, 'contact') for c in mails)
+            , ['joe@ample.com', 'xjoe@ample.com']
+            )
+    # end def test_support_contact_match
 # end class Test_Case_Fulltracker
 
-class Test_Case_Concurrency (_Test_Base, _Test_Base_Summary, unittest.TestCase) :
+class _Test_Effort_Rollup :
+    """ Tests of lib/effort_rollup.py, needs an SQL backend """
+
+    def test_effort_rollup (self) :
+        self.log.debug ('test_effort_rollup')
+        self.setup_db ()
+        effort_rollup.rebuild (self.db)
+        self.db.commit ()
+        self.db.close ()
+        self.db = self.tracker.open (self.username1)
+        user1_time.import_data_1 (self.db, self.user1)
+        self.db.commit ()
+        self.db.close ()
+        self.db = db = self.tracker.open ('admin')
+
+        def recompute () :
+            hours = {}
+            for id in db.time_record.getnodeids (retired = False) :
+                tr = db.time_record.getnode (id)
+                if tr.wp and tr.duration :
+                    dt  = db.daily_record.get (tr.daily_record, 'date')
+                    key = (tr.wp, effort_rollup.month (dt))
+                    hours [key] = hours.get (key, 0) \
+                        + effort_rollup.hours (tr.tr_duration, tr.duration)
+            return hours
+        # end def recompute
+
+        def check () :
+            by_wp = {}
+            for (wp, m), h in recompute ().items () :
+                d = date.Date (m + '-01')
+                self.assertEqual \
+                    (effort_rollup.rollup (db, 'wp', d, d).get (wp, 0), h)
+                by_wp [wp] = by_wp.get (wp, 0) + h
+            by_wp = dict ((k, v) for k, v in by_wp.items () if v)
+            self.assertEqual (effort_rollup.rollup (db), by_wp)
+        # end def check
+
+        check ()
+        # The imported records are all public holidays, book some work
+        dr  = db.daily_record.filter \
+            (None, dict (user = self.user1, date = '2006-01-23')) [0]
+        prj = db.time_project.filter (None, dict (name = 'A Project')) [0]
+        wps = db.time_wp.filter \
+            (None, dict (project = prj), sort = ('+', 'id'))
+        self.assertTrue (len (wps) > 1)
+        trs = \
+            [ db.time_record.create
+                (daily_record = dr, wp = wps [0], duration = d)
+              for d in (2, 3)
+            ]
+        check ()
+        tr  = db.time_record.getnode (trs [0])
+        wps = set (wps [1:])
+        # Irrelevant change (also tr_duration is set by a reactor)
+        db.time_record.set (tr.id, comment = 'rollup')
+        check ()
+        db.time_record.set (tr.id, duration = tr.duration + 1)
+        check ()
+        db.time_record.set (tr.id, wp = sorted (wps) [0])
+        check ()
+        db.time_record.retire (trs [1])
+        check ()
+        db.time_record.restore (trs [1])
+        check ()
+        db.time_record.create \
+            (daily_record = tr.daily_record, wp = tr.wp, duration = 2)
+        check ()
+        db.commit ()
+        db.sql ('select count (*) from %s' % effort_rollup.table)
+        n = db.cursor.fetchone () [0]
+        effort_rollup.compact (db)
+        db.commit ()
+        check ()
+        db.sql ('select count (*) from %s' % effort_rollup.table)
+        self.assertTrue (db.cursor.fetchone () [0] < n)
+        effort_rollup.rebuild (db)
+        db.commit ()
+        check ()
+    # end def test_effort_rollup
+
+    def test_effort_rollup_summary (self) :
+        self.log.debug ('test_effort_rollup_summary')
+        self.setup_db ()
+        effort_rollup.rebuild (self.db)
+        self.db.commit ()
+        self.db.close ()
+        self.db = self.tracker.open (self.username1)
+        user1_time.import_data_1 (self.db, self.user1)
+        self.db.commit ()
+        self.db.close ()
+        self.db = db = self.tracker.open ('admin')
+        dr  = db.daily_record.filter \
+            (None, dict (user = self.user1, date = '2006-01-23')) [0]
+        prj = db.time_project.filter (None, dict (name = 'A Project')) [0]
+        wps = db.time_wp.filter \
+            (None, dict (project = prj), sort = ('+', 'id'))
+        for wp, d in zip (wps, (2, 3.5)) :
+            db.time_record.create (daily_record = dr, wp = wp, duration = d)
+        db.commit ()
+        db.close ()
+        self.db = db = self.tracker.open (self.username0)
+
+        class r :
+            filterspec = \
+                { 'cost_center'  : [self.cc]
+                , 'date'         : '2005-12-01;2006-01-31'
+                , 'summary_type' :
+                    [ db.summary_type.lookup ('month')
+                    , db.summary_type.lookup ('range')
+                    ]
+                }
+            columns   = ['time_wp', 'time_project', 'cost_center', 'summary']
+            sort      = None
+            group     = None
+            classname = 'summary_report'
+
+        utils = templating.TemplatingUtils (None)
+        sr    = summary.Summary_Report (db, r, utils)
+        status = db.daily_record_status.getnodeids ()
+        start, end = common.date_range (db, r.filterspec)
+        self.assertTrue (sr.use_rollup (r.filterspec, status, start, end, 0))
+        with_rollup = sr.as_csv ()
+        self.assertTrue ('5.50' in with_rollup)
+        db.effort_rollup_exists = False
+        sr    = summary.Summary_Report (db, r, utils)
+        self.assertEqual (sr.as_csv (), with_rollup)
+        # Not a whole month: No rollup
+        db.effort_rollup_exists = True
+        r.filterspec ['date'] = '2005-12-01;2006-01-30'
+        start, end = common.date_range (db, r.filterspec)
+        self.assertFalse (sr.use_rollup (r.filterspec, status, start, end, 0))
+    # end def test_effort_rollup_summary
+
+# end class _Test_Effort_Rollup
+
+class Test_Case_Concurrency \
+    (_Test_Effort_Rollup, _Test_Base, _Test_Base_Summary, unittest.TestCase) :
     schemaname = 'full'
     backend = 'postgresql'
 
@@ -5939,6 +6943,12 @@ class Test_Case_Concurrency (_Test_Base, _Test_Base_Summary, unittest.TestCase)
 
 # end class Test_Case_Concurrency
 
+class Test_Case_Effort_Rollup_SQLite \
+    (_Test_Effort_Rollup, _Test_Base, _Test_Base_Summary, unittest.TestCase) :
+    schemaname = 'full'
+    backend    = 'sqlite'
+# end class Test_Case_Effort_Rollup_SQLite
+
 class Test_Case_Abo (_Test_Case, unittest.TestCase) :
     schemaname = 'abo'
     roles = \
@@ -5948,6 +6958,251 @@ class Test_Case_Abo (_Test_Case, unittest.TestCase) :
     transprop_perms = transprop_abo
 # end class Test_Case_Abo
 
+class Test_Case_Abo_Invoice (_Test_Base, unittest.TestCase) :
+    """ Invoice actions of the abo tracker. Invoice chunks are rendered
+        by worker processes each opening the tracker, this needs a
+        database that is shared between processes.
+    """
+    schemaname = 'abo'
+    backend    = 'postgresql'
+    ns = \
+        ( 'xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0"'
+          ' xmlns:style="urn:oasis:names:tc:opendocument:xmlns:style:1.0"'
+          ' xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"'
+          ' xmlns:meta="urn:oasis:names:tc:opendocument:xmlns:meta:1.0"'
+          ' office:version="1.0"'
+        )
+
+    def setUp (self) :
+        self.log = logging.getLogger ('roundup.test')
+        self.setup_tracker ()
+        self.db  = self.tracker.open ('admin')
+        self.setup_invoices ()
+    # end def setUp
+
+    def template_odt (self) :
+        """ Minimal invoice template: One page with the invoice number """
+        ns  = self.ns
+        xml = '<?xml version="1.0" encoding="UTF-8"?>'
+        odt = BytesIO ()
+        with zipfile.ZipFile (odt, 'w') as z :
+            z.writestr ('mimetype', 'application/vnd.oasis.opendocument.text')
+            z.writestr \
+                ( 'content.xml'
+                , xml + '<office:document-content %s>'
+                  '<office:automatic-styles/><office:body><office:text>'
+                  '<text:p>Invoice <text:variable-get'
+                  ' text:name="invoice.invoice_no"/></text:p>'
+                  '</office:text></office:body></office:document-content>'
+                % ns
+                )
+            z.writestr \
+                ( 'styles.xml'
+                , xml + '<office:document-styles %s><office:styles>'
+                  '<style:default-style style:family="paragraph">'
+                  '<style:paragraph-properties/></style:default-style>'
+                  '</office:styles><office:automatic-styles>'
+                  '<style:page-layout style:name="pm1"/>'
+                  '</office:automatic-styles><office:master-styles>'
+                  '<style:master-page style:name="Standard"'
+                  ' style:page-layout-name="pm1"/></office:master-styles>'
+                  '</office:document-styles>'
+                % ns
+                )
+            z.writestr \
+                ( 'meta.xml'
+                , xml + '<office:document-meta %s><office:meta>'
+                  '<meta:document-statistic meta:page-count="1"'
+                  ' meta:table-count="0" meta:image-count="0"'
+                  ' meta:object-count="0" meta:paragraph-count="1"'
+                  ' meta:word-count="2" meta:character-count="10"/>'
+                  '</office:meta></office:document-meta>'
+                % ns
+                )
+            z.writestr \
+                ('settings.xml', xml + '<office:document-settings %s/>' % ns)
+            z.writestr \
+                ( 'META-INF/manifest.xml'
+                , xml + '<manifest:manifest xmlns:manifest='
+                  '"urn:oasis:names:tc:opendocument:xmlns:manifest:1.0"/>'
+                )
+        return odt.getvalue ()
+    # end def template_odt
+
+    def setup_invoices (self) :
+        """ Subscriptions with a price in invoice_group G1 and with a
+            price without invoice_group, each gets an invoice on
+            creation.
+        """
+        db  = self.db
+        at  = db.adr_type.create (code = 'ABO', description = 'Subscriber')
+        abt = db.abo_type.create \
+            (name = 'Year', description = 'Yearly', period = 12, adr_type = at)
+        self.group = db.invoice_group.create (name = 'G1')
+        f   = db.file.create \
+            ( name    = 'invoice.odt'
+            , type    = 'application/vnd.oasis.opendocument.text'
+            , content = self.template_odt ()
+            )
+        tp  = db.tmplate.create (name = 'Invoice', files = [f])
+        self.iv_first = db.invoice_template.create \
+            (name = 'first', tmplate = tp, invoice_level = 0, interval = 0)
+        self.iv_reminder = db.invoice_template.create \
+            (name = 'reminder', tmplate = tp, invoice_level = 1, interval = 2)
+        self.price_group = db.abo_price.create \
+            ( name             = 'Grouped'
+            , abotype          = abt
+            , currency         = '1'
+            , amount           = 10
+            , invoice_template = [self.iv_first, self.iv_reminder]
+            , invoice_group    = self.group
+            , valid            = True
+            )
+        self.price_nogroup = db.abo_price.create \
+            ( name             = 'Ungrouped'
+            , abotype          = abt
+            , currency         = '1'
+            , amount           = 20
+            , invoice_template = [self.iv_first]
+            , valid            = True
+            )
+        self.abos = []
+        for k in range (7) :
+            adr   = db.address.create (title = 'S%s' % k, country = 'A')
+            price = self.price_group
+            if k >= 5 :
+                price = self.price_nogroup
+            self.abos.append \
+                ( db.abo.create
+                    ( aboprice   = price
+                    , subscriber = adr
+                    , begin      = date.Date ('2020-01-01')
+                    )
+                )
+        db.commit ()
+    # end def setup_invoices
+
+    def invoice_action (self, name, group = None) :
+        class FakeRequest (object) :
+            rfile = None
+            def start_response (self, a, b) :
+                pass
+        # end class FakeRequest
+        env = dict (PATH_INFO = '', REQUEST_METHOD = 'GET')
+        if group :
+            env ['QUERY_STRING'] = urlencode \
+                ({'@filter' : 'invoice_group', 'invoice_group' : group})
+        cli = self.tracker.Client (self.tracker, FakeRequest (), env, None)
+        cli.db        = self.db
+        cli.language  = 'en'
+        cli.userid    = self.db.getuid ()
+        cli.classname = 'invoice'
+        return self.tracker.cgi_actions [name] (cli)
+    # end def invoice_action
+
+    def test_generate_invoice (self) :
+        self.log.debug ('test_generate_invoice')
+        db  = self.db
+        ivs = [db.abo.get (a, 'invoices') [0] for a in self.abos [:5]]
+        for iv in ivs :
+            db.invoice.set (iv, send_it = True, invoice_group = self.group)
+        db.commit ()
+        nfiles = len (db.file.getnodeids ())
+        action = self.invoice_action ('generate_invoice', self.group)
+        action.chunk_size = 2
+        action.processes  = 2
+        with self.assertRaises (Redirect) as cm :
+            action.handle ()
+        m = re.match (r'file([0-9]+)/inv-.*\.odt$', str (cm.exception))
+        self.assertTrue (m)
+        self.assertEqual (len (db.file.getnodeids ()), nfiles + 1)
+        f = db.file.getnode (m.group (1))
+        self.assertEqual (f.type, 'application/vnd.oasis.opendocument.text')
+        odt = zipfile.ZipFile (BytesIO (f.binary_content))
+        content = odt.read ('content.xml').decode ('utf-8')
+        ivnos = [db.invoice.get (iv, 'invoice_no') for iv in ivs]
+        self.assertEqual (re.findall (r'R[0-9]+', content), ivnos)
+        meta = odt.read ('meta.xml').decode ('utf-8')
+        self.assertIn ('meta:page-count="5"', meta)
+    # end def test_generate_invoice
+
+    def former_iv_filter (self, group, now) :
+        """ Invoice selection of Mark_Invoice before it was done in one
+            query: Candidates by open and period_start, then abo end,
+            invoice_group and interval checked per invoice.
+        """
+        db  = self.db
+        ids = db.invoice.filter \
+            (None, dict (open = True, period_start = ';1m'))
+        result = []
+        for id in ids :
+            iv  = db.invoice.getnode (id)
+            abo = db.abo.getnode (iv.abo)
+            if abo.end :
+                continue
+            if db.abo_price.get (abo.aboprice, 'invoice_group') != group :
+                continue
+            tids = db.abo_price.get (abo.aboprice, 'invoice_template')
+            ivts = [db.invoice_template.getnode (i) for i in tids]
+            ivts = [i for i in ivts if i.invoice_level <= iv.n_sent]
+            ivt  = max (ivts, key = lambda i : i.invoice_level)
+            if iv.last_sent > now - date.Interval ('%dm' % ivt.interval) :
+                continue
+            result.append (id)
+        return result
+    # end def former_iv_filter
+
+    def test_mark_invoice (self) :
+        self.log.debug ('test_mark_invoice')
+        db  = self.db
+        now = date.Date ('.')
+        ivs = [db.abo.get (a, 'invoices') [0] for a in self.abos]
+        # Reminder too early (interval of reminder is 2 months)
+        db.invoice.set \
+            (ivs [1], n_sent = 1, last_sent = now - date.Interval ('1m'))
+        # Reminder due
+        db.invoice.set \
+            (ivs [2], n_sent = 1, last_sent = now - date.Interval ('3m'))
+        # Ended subscriptions with and without invoice_group
+        db.abo.set (self.abos [3], end = date.Date ('2020-06-01'))
+        db.abo.set (self.abos [6], end = date.Date ('2020-06-01'))
+        # Invoice period starting in the future
+        adr = db.address.create (title = 'Future', country = 'A')
+        abo = db.abo.create \
+            ( aboprice   = self.price_group
+            , subscriber = adr
+            , begin      = now + date.Interval ('3m')
+            )
+        ivs.append (db.abo.get (abo, 'invoices') [0])
+        db.commit ()
+        expected = \
+            { self.group : [ivs [0], ivs [2], ivs [4]]
+            , None       : [ivs [5]]
+            }
+        for group in self.group, None :
+            old = self.former_iv_filter (group, now)
+            self.assertEqual (old, expected [group])
+            action = self.invoice_action ('mark_invoice', group)
+            action.invoice_group     = group
+            action.iv_template_cache = {}
+            action.now               = now
+            new = [iv.id for iv in action.iv_filter ()]
+            self.assertEqual (new, old)
+            # One cache entry per template used
+            tids = (self.iv_first, self.iv_reminder)
+            used = set (tids [int (db.invoice.get (i, 'n_sent'))] for i in new)
+            ivts = action.iv_template_cache.values ()
+            self.assertEqual (sorted (t.id for t in ivts), sorted (used))
+        action = self.invoice_action ('mark_invoice', self.group)
+        self.assertRaises (Redirect, action.handle)
+        self.assertEqual \
+            ( db.invoice.filter
+                (None, dict (send_it = True, invoice_group = self.group))
+            , expected [self.group]
+            )
+    # end def test_mark_invoice
+# end class Test_Case_Abo_Invoice
+
 class Test_Case_Adr (_Test_Case, unittest.TestCase) :
     schemaname = 'adr'
     roles = \
@@ -5966,6 +7221,102 @@ class Test_Case_ERP (_Test_Case, unittest.TestCase) :
     transprop_perms = transprop_erp
 # end class Test_Case_ERP
 
+class Test_Case_Hamlog (_Test_Base, unittest.TestCase) :
+    schemaname = 'hamlog'
+
+    def setUp (self) :
+        self.log = logging.getLogger ('roundup.test')
+        self.setup_tracker ()
+        self.db  = self.tracker.open ('admin')
+    # end def setUp
+
+    def test_adif_records (self) :
+        self.log.debug ('test_adif_records')
+        adif = \
+            ( b'Exported <ADIF_VER:5>3.1.0 <EOH>\n'
+              b'<CALL:4>OE3X <NAME:7>J\xc3\xbcrgen <QSO_DATE:8>20240102'
+              b' <TIME_ON:4>1234 <band:3>20m <EOR>\n'
+              b'<call:5>DL1AB<NAME:4:S>Hans<eor>\n'
+              b'<CALL:2>K1'
+            )
+        for bs in 1, 3, 7, 65536 :
+            recs = list (hamlib.adif_records (BytesIO (adif), bs))
+            self.assertEqual (len (recs), 3)
+            self.assertEqual \
+                ( recs [0]
+                , dict
+                    ( call = 'OE3X', name = u'J\xfcrgen'
+                    , qso_date = '20240102', time_on = '1234', band = '20m'
+                    )
+                )
+            self.assertEqual (recs [1], dict (call = 'DL1AB', name = 'Hans'))
+            self.assertEqual (recs [2], dict (call = 'K1'))
+        recs = hamlib.adif_records (BytesIO (adif), encoding = 'latin-1')
+        self.assertEqual (next (recs) ['name'], u'J\xc3\xbcrgen')
+        self.assertEqual \
+            ( hamlib.adif_date ('20240102', '1234')
+            , date.Date ('2024-01-02.12:34')
+            )
+    # end def test_adif_records
+
+    def test_qsl_stati (self) :
+        self.log.debug ('test_qsl_stati')
+        db     = self.db
+        st     = lambda name : db.qsl_status.lookup (name)
+        qt     = lambda name : db.qsl_type.lookup (name)
+        now    = date.Date ('2024-01-02')
+        call   = db.ham_call.create (name = 'OE3X', call = 'OE3X')
+        qsos   = []
+        for n in range (4) :
+            qso = db.qso.create \
+                (owner = call, call = 'K%d' % n, qso_start = now)
+            qsos.append (qso)
+        db.commit ()
+        for q in qsos :
+            self.assertEqual (db.qso.get (q, 'qsl_r_status'), st ('none'))
+        # Detectors fix stati of the QSO when a qsl is created or moved
+        q1 = db.qsl.create (qso = qsos [0], qsl_type = qt ('eQSL'))
+        self.assertEqual (db.qso.get (qsos [0], 'qsl_r_status'), st ('none'))
+        db.qsl.set (q1, date_recv = now)
+        self.assertEqual (db.qso.get (qsos [0], 'qsl_r_status'), st ('eQSL'))
+        q2 = db.qsl.create \
+            (qso = qsos [0], qsl_type = qt ('LOTW'), date_sent = now)
+        self.assertEqual (db.qso.get (qsos [0], 'qsl_s_status'), st ('LOTW'))
+        db.qsl.set (q2, qso = qsos [1])
+        self.assertEqual (db.qso.get (qsos [0], 'qsl_s_status'), st ('none'))
+        self.assertEqual (db.qso.get (qsos [1], 'qsl_s_status'), st ('LOTW'))
+        db.qso.set (qsos [1], wont_qsl_via = [qt ('Bureau')])
+        self.assertEqual (db.qso.get (qsos [1], 'no_qsl_status'), st ('paper'))
+        db.commit ()
+        # Deferred: stati are fixed in bulk on flush
+        with hamlib.Deferred_QSL_Status (db) as deferred :
+            for n, t in enumerate (('eQSL', 'LOTW', 'Direct')) :
+                db.qsl.create \
+                    ( qso       = qsos [2]
+                    , qsl_type  = qt (t)
+                    , date_recv = now
+                    , date_sent = now if n else None
+                    )
+            db.qsl.create (qso = qsos [3], qsl_type = qt ('eQSL'))
+            self.assertEqual \
+                (db.qso.get (qsos [2], 'qsl_r_status'), st ('none'))
+            self.assertEqual (db.qsl_status_deferred, set (qsos [2:]))
+            deferred.flush ()
+            self.assertEqual \
+                (db.qso.get (qsos [2], 'qsl_r_status'), st ('eQSL+LOTW+paper'))
+            self.assertEqual \
+                (db.qso.get (qsos [2], 'qsl_s_status'), st ('LOTW+paper'))
+            self.assertEqual (db.qsl_status_deferred, set ())
+            db.qsl.set (q1, date_sent = now)
+            self.assertEqual \
+                (db.qso.get (qsos [0], 'qsl_s_status'), st ('none'))
+        self.assertEqual (db.qsl_status_deferred, None)
+        self.assertEqual (db.qso.get (qsos [0], 'qsl_s_status'), st ('eQSL'))
+        self.assertEqual (db.qso.get (qsos [3], 'qsl_r_status'), st ('none'))
+        db.commit ()
+    # end def test_qsl_stati
+# end class Test_Case_Hamlog
+
 class Test_Case_IT (_Test_Case, unittest.TestCase) :
     schemaname = 'it'
     roles = \
@@ -6002,6 +7353,177 @@ class Test_Case_Lielas (_Test_Case, unittest.TestCase) :
     transprop_perms = transprop_lielas
 # end class Test_Case_Lielas
 
+class Test_Case_Lielas_SQL (_Test_Base, unittest.TestCase) :
+    """ The lielas measurement queries are hand-written SQL, run them
+        against the postgresql backend like the concurrency tests.
+    """
+    schemaname = 'lielas'
+    backend    = 'postgresql'
+
+    def setUp (self) :
+        self.log = logging.getLogger ('roundup.test')
+        self.setup_tracker ()
+        self.db  = self.tracker.open ('admin')
+    # end def setUp
+
+    def setup_measurements (self) :
+        """ Two devices, each with two app sensors, a status sensor and
+            a sensor with unknown type. Some measurements have no date.
+        """
+        db = self.db
+        self.devices = []
+        self.sensors = []
+        t  = date.Date ('2024-03-01.12:00')
+        for dadr in '1', '2' :
+            dev = db.device.create \
+                (adr = dadr, name = 'dev', surrogate = 'dev-' + dadr)
+            self.devices.append (dev)
+            for sadr, app in ('1', True), ('2', True), ('bat', False) :
+                s = db.sensor.create \
+                    ( device    = dev
+                    , adr       = sadr
+                    , name      = 's' + sadr
+                    , surrogate = '-'.join (('s', dadr, sadr))
+                    )
+                db.sensor.set (s, is_app_sensor = app)
+                self.sensors.append (s)
+                for k in range (10) :
+                    d = t + date.Interval ('%d:00' % k)
+                    if k in (3, 7) :
+                        d = None
+                    db.measurement.create (sensor = s, val = k, date = d)
+            s = db.sensor.create \
+                (device = dev, adr = 'x', name = 'x', surrogate = 'x-' + dadr)
+            db.sensor.set (s, is_app_sensor = None)
+            self.sensors.append (s)
+            db.measurement.create (sensor = s, val = 1)
+        # A sensor with only undated measurements
+        s = db.sensor.create \
+            ( device        = dev
+            , adr           = '3'
+            , name          = 's3'
+            , surrogate     = 's-2-3'
+            , is_app_sensor = True
+            )
+        self.sensors.append (s)
+        for k in range (2) :
+            db.measurement.create (sensor = s, val = k)
+        # A sensor without measurements
+        s = db.sensor.create \
+            ( device        = dev
+            , adr           = '4'
+            , name          = 's4'
+            , surrogate     = 's-2-4'
+            , is_app_sensor = True
+            )
+        self.sensors.append (s)
+        db.commit ()
+    # end def setup_measurements
+
+    def filter_sql_measurements (self, sensor, maxlen) :
+        """ The measurements found by the former per-sensor query via
+            _filter_sql sorted by descending date with a limit
+        """
+        db = self.db
+        if not db.sensor.get (sensor, 'is_app_sensor') :
+            maxlen = 1
+        proptree, sql, args = db.measurement._filter_sql \
+            (None, dict (sensor = sensor), ('-', 'date'))
+        db.sql (sql + ' limit %s' % maxlen, args)
+        ids = [str (m [0]) for m in db.cursor.fetchall ()]
+        return \
+            [ (db.measurement.get (m, 'date'), db.measurement.get (m, 'val'))
+              for m in ids
+            ]
+    # end def filter_sql_measurements
+
+    def test_measurements_by_sensor (self) :
+        self.log.debug ('test_measurements_by_sensor')
+        self.setup_measurements ()
+        for maxlen in 1, 2, 7, 9, 20 :
+            by_sensor = lielas.measurements_by_sensor (self.db, None, maxlen)
+            for s in self.sensors :
+                old = self.filter_sql_measurements (s, maxlen)
+                self.assertEqual (by_sensor.get (s, []), old)
+                n = 1
+                if self.db.sensor.get (s, 'is_app_sensor') :
+                    n = maxlen
+                self.assertTrue (len (old) <= n)
+            s1, s2, bat, x = self.sensors [:4]
+            self.assertEqual (len (by_sensor [s1]), min (maxlen, 10))
+            self.assertEqual (len (by_sensor [bat]), 1)
+            self.assertEqual (len (by_sensor [x]), 1)
+            self.assertEqual \
+                ( [v for d, v in by_sensor [s1]]
+                , [9, 8, 6, 5, 4, 2, 1, 0, 3, 7] [:maxlen]
+                )
+            self.assertEqual ([v for d, v in by_sensor [bat]], [9])
+            self.assertEqual \
+                ( by_sensor [self.sensors [-2]]
+                , [(None, 0), (None, 1)] [:maxlen]
+                )
+            self.assertNotIn (self.sensors [-1], by_sensor)
+            part = lielas.measurements_by_sensor (self.db, [s2, bat], maxlen)
+            self.assertEqual (sorted (part), sorted ([s2, bat]))
+            self.assertEqual (part [s2], by_sensor [s2])
+        self.assertEqual (lielas.measurements_by_sensor (self.db, []), {})
+        self.db.sensor.retire (s1)
+        self.db.commit ()
+        self.assertNotIn (s1, lielas.measurements_by_sensor (self.db))
+    # end def test_measurements_by_sensor
+
+    def test_delete_measurements (self) :
+        self.log.debug ('test_delete_measurements')
+        self.setup_measurements ()
+        db = self.db
+        d1, d2 = self.devices
+        def count (device = None) :
+            sql = 'select count (*) from _measurement'
+            if device :
+                sql += ' where _sensor in (select id from _sensor' \
+                       ' where _device = %s)' % device
+            db.sql (sql)
+            n = db.cursor.fetchone () [0]
+            sql = 'select count (distinct nodeid) from measurement__journal'
+            if device :
+                sql += ' where nodeid in (select id from _measurement' \
+                       ' where _sensor in (select id from _sensor' \
+                       ' where _device = %s))' % device
+            db.sql (sql)
+            return n, db.cursor.fetchone () [0]
+        # end def count
+        self.assertEqual (count (d1), (31, 31))
+        self.assertEqual (count (d2), (33, 33))
+        db.sql ('select count (*) from measurement__journal')
+        nj = db.cursor.fetchone () [0]
+        class FakeRequest (object) :
+            rfile = None
+            def start_response (self, a, b) :
+                pass
+        # end class FakeRequest
+        env = dict (PATH_INFO = '', REQUEST_METHOD = 'GET')
+        cli = self.tracker.Client (self.tracker, FakeRequest (), env, None)
+        cli.db        = db
+        cli.language  = 'en'
+        cli.userid    = db.getuid ()
+        cli.classname = 'device'
+        action = self.tracker.cgi_actions ['delete_device'] (cli)
+        self.assertRaises (Redirect, action.handle)
+        # Only the device with the largest address is affected
+        self.assertEqual (count (d1), (31, 31))
+        self.assertEqual (count (), (31, 31))
+        db.sql ('select count (*) from measurement__journal')
+        self.assertEqual (db.cursor.fetchone () [0], nj - 33)
+        self.assertEqual (db.sensor.filter (None, dict (device = d2)), [])
+        self.assertTrue (db.device.is_retired (d2))
+        action = self.tracker.cgi_actions ['delete_data'] (cli)
+        self.assertRaises (Redirect, action.handle)
+        self.assertEqual (count (), (0, 0))
+        db.sql ('select count (*) from measurement__journal')
+        self.assertEqual (db.cursor.fetchone () [0], 0)
+    # end def test_delete_measurements
+# end class Test_Case_Lielas_SQL
+
 class Test_Case_PR (_Test_Case, unittest.TestCase) :
     schemaname = 'pr'
     roles = \
@@ -6017,16 +7539,340 @@ class Test_Case_PR (_Test_Case, unittest.TestCase) :
     transprop_perms = transprop_pr
 # end class Test_Case_PR
 
+class Test_Case_PR_Sync (_Test_Base, unittest.TestCase) :
+    """ Sync a local PR tracker from a time tracker acting as the
+        remote: REST requests of the sync are dispatched directly to
+        the remote tracker.
+    """
+    schemaname = 'pr'
+
+    def setUp (self) :
+        self.log = logging.getLogger ('roundup.test')
+        # Each memorydb database keeps the storage that was current
+        # when it was opened, the nuke of the local tracker in
+        # setup_tracker starts a new storage.
+        self.schemafile = 'time'
+        self.setup_tracker ()
+        remote, remote_dir = self.tracker, self.dirname
+        rdb             = remote.open ('admin')
+        self.schemafile = self.schemaname
+        self.setup_tracker ()
+        self.remote     = remote
+        self.remote_dir = remote_dir
+        self.rdb        = rdb
+    # end def setUp
+
+    def tearDown (self) :
+        if getattr (self, 'rdb', None) :
+            self.rdb.close ()
+            self.rdb = None
+        if getattr (self, 'remote_dir', None) :
+            if os.path.exists (self.remote_dir) :
+                shutil.rmtree (self.remote_dir)
+        _Test_Base.tearDown (self)
+    # end def tearDown
+
+    def rest_get (self, path) :
+        """ Emulate a GET of the remote REST API on the remote tracker
+        """
+        class FakeRequest (object) :
+            rfile   = None
+            headers = {}
+            def start_response (self, a, b) :
+                pass
+        # end class FakeRequest
+
+        self.requests.append (path)
+        classname, query = path.split ('?', 1)
+        env   = dict \
+            ( PATH_INFO      = ''
+            , REQUEST_METHOD = 'GET'
+            , QUERY_STRING   = query
+            )
+        cli   = self.remote.Client (self.remote, FakeRequest (), env, None)
+        cli.db       = self.rdb
+        cli.language = 'en'
+        cli.userid   = self.rdb.getuid ()
+        input = cgi.FieldStorage (environ = env)
+        rest  = RestfulInstance (cli, self.rdb)
+        r     = rest.dispatch ('GET', '/rest/data/' + classname, input)
+        self.assertEqual (cli.response_code, 200, r)
+        return json.loads (r)
+    # end def rest_get
+
+    def pr_sync (self, full = False) :
+        from importlib.machinery import SourceFileLoader
+        utils = os.path.abspath ('utils')
+        if utils not in sys.path :
+            sys.path.append (utils)
+        pr_sync = SourceFileLoader \
+            ('pr_sync', os.path.join (utils, 'pr_sync')).load_module ()
+        rest_get = self.rest_get
+
+        class Test_Sync (pr_sync.PR_Sync) :
+            def get (self, s) :
+                return rest_get (s)
+            # end def get
+        # end class Test_Sync
+
+        args = Namespace \
+            ( database_directory         = self.dirname
+            , disable_cert_check_warning = False
+            , full                       = full
+            , full_interval              = 7
+            , password                   = 'secret'
+            , purchasing_agent           = None
+            , state_file                 = os.path.join
+                (self.dirname, 'pr_sync.json')
+            , sync_user                  = False
+            , update                     = True
+            , url                        = 'http://localhost:4711/ttt/'
+            , user                       = 'admin'
+            , username                   = 'prtracker-sync'
+            , verbose                    = 0
+            )
+        self.requests = []
+        sync = Test_Sync (args)
+        sync.sync ()
+        sync.db.close ()
+        with open (args.state_file) as f :
+            state = json.load (f)
+        return sync, state
+    # end def pr_sync
+
+    def test_pr_sync (self) :
+        self.log.debug ('test_pr_sync')
+        rdb    = self.rdb
+        valid  = rdb.user_status.create (name = 'valid-ad')
+        ruser  = rdb.user.create \
+            ( username  = 'responsible'
+            , firstname = 'Re'
+            , lastname  = 'Sponsible'
+            , status    = valid
+            )
+        org    = rdb.organisation.create (name = 'Org', may_purchase = True)
+        ccg    = rdb.cost_center_group.create (name = 'CCG')
+        costc  = rdb.cost_center.create \
+            ( name               = 'CC'
+            , cost_center_group  = ccg
+            , status             = rdb.cost_center_status.lookup ('Open')
+            )
+        st_open   = rdb.time_project_status.lookup ('Open')
+        st_closed = rdb.time_project_status.lookup ('Closed')
+        rdb.sap_cc.create \
+            ( name         = 'CC1'
+            , description  = 'Cost center 1'
+            , responsible  = ruser
+            , organisation = org
+            , valid        = True
+            )
+        tps = []
+        for n in range (3) :
+            tps.append \
+                ( rdb.time_project.create
+                    ( name         = 'P%s' % n
+                    , responsible  = ruser
+                    , organisation = org
+                    , status       = st_open
+                    , cost_center  = costc
+                    , op_project   = True
+                    )
+                )
+        rdb.commit ()
+        self.db = self.tracker.open ('admin')
+        self.db.user.create (username = 'responsible')
+        self.db.commit ()
+        self.db.close ()
+        tp_activity = lambda : max \
+            (str (rdb.time_project.get (i, 'activity')) for i in tps)
+
+        # First run: No state yet, full sync
+        sync, state = self.pr_sync ()
+        self.assertTrue (sync.full)
+        self.assertTrue (state ['last_full'])
+        tpstate = state ['classes']['time_project']
+        hwm     = tpstate ['activity']
+        self.assertEqual (hwm, tp_activity ())
+        self.db = self.tracker.open ('admin')
+        tp = self.db.time_project
+        lids = [tpstate ['idmap'][i] for i in tps]
+        self.assertEqual \
+            ([tp.get (i, 'name') for i in lids], ['P0', 'P1', 'P2'])
+        self.assertEqual ([tp.get (i, 'sync_id') for i in lids], tps)
+        self.assertEqual \
+            ( tp.get (lids [0], 'description')
+            , '-'.join ((org, tps [0]))
+            )
+        self.assertEqual \
+            ( tp.get (lids [0], 'responsible')
+            , self.db.user.lookup ('responsible')
+            )
+        cc = self.db.sap_cc.lookup ('CC1')
+        self.assertEqual \
+            (self.db.sap_cc.get (cc, 'description'), 'Cost center 1')
+        lorg = tp.get (lids [0], 'organisation')
+        self.assertEqual (self.db.organisation.get (lorg, 'name'), 'Org')
+        self.db.close ()
+
+        # Incremental run: Only changed items are seen, a remote retire
+        # goes unnoticed.
+        rdb.time_project.set (tps [0], name = 'P0 renamed')
+        rdb.time_project.set (tps [1], status = st_closed)
+        rdb.time_project.retire (tps [2])
+        rdb.commit ()
+        sync, state = self.pr_sync ()
+        self.assertFalse (sync.full)
+        tpstate = state ['classes']['time_project']
+        self.assertEqual (tpstate ['activity'], tp_activity ())
+        # Only items changed since the high-water mark are requested
+        tpreq = [r for r in self.requests if r.startswith ('time_project?')]
+        self.assertEqual (len (tpreq), 1)
+        self.assertIn (urlencode (dict (activity = hwm + ';')), tpreq [0])
+        self.assertEqual \
+            (tpstate ['idmap'], {tps [0] : lids [0], tps [2] : lids [2]})
+        self.db = self.tracker.open ('admin')
+        tp = self.db.time_project
+        self.assertEqual (tp.get (lids [0], 'name'), 'P0 renamed')
+        self.assertTrue (tp.is_retired (lids [1]))
+        self.assertFalse (tp.is_retired (lids [2]))
+        self.db.close ()
+
+        # Full run retires the item retired remotely
+        sync, state = self.pr_sync (full = True)
+        self.assertTrue (sync.full)
+        tpstate = state ['classes']['time_project']
+        self.assertEqual (tpstate ['idmap'], {tps [0] : lids [0]})
+        tpreq = [r for r in self.requests if r.startswith ('time_project?')]
+        self.assertNotIn ('activity=', tpreq [0])
+        self.db = self.tracker.open ('admin')
+        tp = self.db.time_project
+        self.assertFalse (tp.is_retired (lids [0]))
+        self.assertTrue (tp.is_retired (lids [2]))
+    # end def test_pr_sync
+# end class Test_Case_PR_Sync
+
+class Test_Case_PR_Approval (_Test_Base, unittest.TestCase) :
+    """ Caching of approval rules and offer item summaries in
+        lib/prlib.py, the rules cache needs an SQL backend.
+    """
+    schemaname = 'pr'
+    backend    = 'sqlite'
+
+    def setup_pr (self) :
+        self.db = db = self.tracker.open ('admin')
+        resp    = db.user.create (username = 'responsible')
+        org     = db.organisation.create (name = 'Org', may_purchase = True)
+        cc      = db.sap_cc.create \
+            ( name         = 'CC1'
+            , description  = 'Cost center 1'
+            , responsible  = resp
+            , organisation = org
+            , valid        = True
+            )
+        pgc     = db.pg_category.create (name = 'PGC', sap_ref = '47')
+        pg      = db.product_group.create \
+            (name = 'PG', sap_ref = '4711', pg_category = pgc)
+        self.oi = db.pr_offer_item.create \
+            ( description    = 'Item'
+            , price_per_unit = 100
+            , units          = 2
+            , product_group  = pg
+            , supplier       = 'Supplier'
+            )
+        self.pr = db.purchase_request.create \
+            ( title         = 'PR'
+            , organisation  = org
+            , sap_cc        = cc
+            , pr_currency   = db.pr_currency.lookup ('€')
+            , purchase_type = db.purchase_type.lookup ('Service')
+            , offer_items   = [self.oi]
+            )
+        self.board = db.pr_approval_order.lookup ('board')
+        self.prc   = db.pr_approval_config.create \
+            (role = self.board, amount = 500, valid = True)
+        db.commit ()
+    # end def setup_pr
+
+    def roles (self) :
+        pr = self.db.purchase_request.getnode (self.pr)
+        return set \
+            (a ['role'] for a in prlib.compute_approvals (self.db, pr)
+             if 'role' in a
+            )
+    # end def roles
+
+    def test_config_change (self) :
+        self.log.debug ('test_config_change')
+        self.setup_pr ()
+        db = self.db
+        self.assertEqual (self.roles (), set ())
+        rules = prlib.approval_rules (db)
+        self.assertIs (prlib.approval_rules (db), rules)
+        db.pr_approval_config.set (self.prc, amount = 100)
+        self.assertEqual (self.roles (), set (['board']))
+        db.commit ()
+        self.assertEqual (self.roles (), set (['board']))
+        db.pr_approval_config.set (self.prc, amount = 1000)
+        db.commit ()
+        self.assertEqual (self.roles (), set ())
+        db.pr_approval_config.retire (self.prc)
+        db.pr_approval_config.create \
+            (role = self.board, amount = 100, valid = True)
+        self.assertEqual (self.roles (), set (['board']))
+    # end def test_config_change
+
+    def test_config_rollback (self) :
+        self.log.debug ('test_config_rollback')
+        self.setup_pr ()
+        db = self.db
+        self.assertEqual (self.roles (), set ())
+        db.pr_approval_config.set (self.prc, amount = 100)
+        self.assertEqual (self.roles (), set (['board']))
+        db.rollback ()
+        self.assertEqual (db.pr_approval_config.get (self.prc, 'amount'), 500)
+        self.assertEqual (self.roles (), set ())
+        db.pr_approval_config.create \
+            (role = self.board, amount = 100, valid = True)
+        self.assertEqual (self.roles (), set (['board']))
+        db.rollback ()
+        self.assertEqual (self.roles (), set ())
+    # end def test_config_rollback
+
+    def test_offer_item_change (self) :
+        self.log.debug ('test_offer_item_change')
+        self.setup_pr ()
+        db = self.db
+        pr = db.purchase_request.getnode (self.pr)
+        self.assertEqual (self.roles (), set ())
+        self.assertEqual (prlib.offer_item_summary (db, pr).total, 200)
+        # Within the same transaction
+        db.pr_offer_item.set (self.oi, price_per_unit = 300)
+        self.assertEqual (prlib.offer_item_summary (db, pr).total, 600)
+        self.assertEqual (self.roles (), set (['board']))
+        db.pr_offer_item.set (self.oi, units = 1)
+        self.assertEqual (self.roles (), set ())
+        db.rollback ()
+        pr = db.purchase_request.getnode (self.pr)
+        self.assertEqual (prlib.offer_item_summary (db, pr).total, 200)
+        self.assertEqual (self.roles (), set ())
+    # end def test_offer_item_change
+# end class Test_Case_PR_Approval
+
 def test_suite () :
     suite = unittest.TestSuite ()
     suite.addTest (unittest.makeSuite (Test_Case_Abo))
+    suite.addTest (unittest.makeSuite (Test_Case_Abo_Invoice))
     suite.addTest (unittest.makeSuite (Test_Case_Adr))
     suite.addTest (unittest.makeSuite (Test_Case_ERP))
+    suite.addTest (unittest.makeSuite (Test_Case_Hamlog))
     suite.addTest (unittest.makeSuite (Test_Case_IT))
     suite.addTest (unittest.makeSuite (Test_Case_ITAdr))
     suite.addTest (unittest.makeSuite (Test_Case_Kvats))
     suite.addTest (unittest.makeSuite (Test_Case_Lielas))
+    suite.addTest (unittest.makeSuite (Test_Case_Lielas_SQL))
     suite.addTest (unittest.makeSuite (Test_Case_PR))
+    suite.addTest (unittest.makeSuite (Test_Case_PR_Sync))
+    suite.addTest (unittest.makeSuite (Test_Case_PR_Approval))
     suite.addTest (unittest.makeSuite (Test_Case_Tracker))
     suite.addTest (unittest.makeSuite (Test_Case_Timetracker))
     suite.addTest (unittest.makeSuite (Test_Case_Support_Timetracker))
@@ -53,7 +53,8 @@ from roundup.cgi   import templating
 sys.path.insert (0, os.path.abspath ('lib'))
 sys.path.insert (0, os.path.abspath ('extensions'))
 
-from ldap_sync import LDAP_Roundup_Sync
+from ldap_sync import LDAP_Roundup_Sync, get_ldap_sync, release_ldap_sync
+import ldap_sync
 import common
 import summary
 
@@ -620,6 +621,54 @@ class Test_Case_LDAP_Sync (_Test_Base, unittest.TestCase) :
         self.assertEqual (user.ad_domain, 'ds1.internal')
     # end def test_sync_new_user_to_roundup
 
+    def test_sync_reopen_login_ttl (self) :
+        """ A cached sync object is re-used with a new db and does not
+            sync a user again within the login sync ttl.
+        """
+        self.setup_ldap ()
+        ldap_sync.ldap_last_synced.clear ()
+        self.ldap_sync.last_synced.clear ()
+        self.assertTrue (self.ldap_sync.needs_sync ('jdoe@ds1.internal'))
+        self.ldap_sync.mark_synced ('jdoe@ds1.internal')
+        self.assertFalse (self.ldap_sync.needs_sync ('jdoe@ds1.internal'))
+        self.ldap_sync.login_sync_ttl = 0
+        self.assertTrue (self.ldap_sync.needs_sync ('jdoe@ds1.internal'))
+        self.db.commit ()
+        self.db.close ()
+        self.db = self.tracker.open ('admin')
+        self.ldap_sync.reopen (self.db)
+        self.ldap_sync.sync_user_from_ldap ('testuser1@ds1.internal')
+        user = self.db.user.getnode (self.testuser1)
+        cts = [self.db.user_contact.get (x, 'contact') for x in user.contacts]
+        cts.sort ()
+        self.assertEqual (cts, ['0815', 'testuser1@example.com'])
+    # end def test_sync_reopen_login_ttl
+
+    def test_sync_pool (self) :
+        """ Pooled sync objects are used by one thread at a time and
+            share the login sync times of their tracker.
+        """
+        self.setup_ldap ()
+        ldap_sync.ldap_sync_cache.clear ()
+        kw = dict (ldap = self.ldap, log = self.log, **self.aux_ldap_parameters)
+        l1 = get_ldap_sync (self.db, **kw)
+        l2 = get_ldap_sync (self.db, **kw)
+        self.assertFalse (l1 is l2)
+        release_ldap_sync (self.db, l1)
+        l3 = get_ldap_sync (self.db, **kw)
+        self.assertTrue (l3 is l1)
+        self.assertTrue (l3.db is self.db)
+        self.assertTrue (l2.last_synced is l3.last_synced)
+        l2.last_synced.clear ()
+        l2.mark_synced ('jdoe@ds1.internal')
+        self.assertFalse (l3.needs_sync ('jdoe@ds1.internal'))
+        release_ldap_sync (self.db, l2)
+        release_ldap_sync (self.db, l3)
+        key = ldap_sync.ldap_sync_key (self.db)
+        self.assertEqual (len (ldap_sync.ldap_sync_cache [key]), 2)
+        ldap_sync.ldap_sync_cache.clear ()
+    # end def test_sync_pool
+
     def test_sync_to_roundup_all (self) :
         # Change behavior so that names are updated in roundup
         self.aux_ldap_parameters ['update_ldap'] = False
@@ -1112,6 +1161,36 @@ class Test_Case_LDAP_Sync (_Test_Base, unittest.TestCase) :
         self.assertNotEqual (m, None)
     # end def test_pic_convert_with_resize
 
+    def test_pic_digest_unchanged (self) :
+        """ The digest of the resized picture is stored with the file,
+            an unchanged picture in LDAP does not produce a change.
+        """
+        self.setup_ldap ()
+        self.set_testuser1_testpic ()
+        self.db.commit ()
+        pid = self.db.user.get (self.testuser1, 'pictures') [0]
+        with open ('test/240px-Bald_Man.svg.png', 'rb') as f :
+            digest = common.content_digest (f.read ())
+        self.assertEqual (self.db.file.get (pid, 'content_digest'), digest)
+        self.ldap_sync.sync_user_to_ldap ('testuser1@ds1.internal')
+        newdn = 'CN=Test User,OU=internal'
+        pic = self.ldap_modify_result [newdn]['thumbnailPhoto'][0][1][0]
+        rdigest = self.db.file.get (pid, 'resized_digest')
+        self.assertEqual \
+            (rdigest, '9216:80:%s' % common.content_digest (pic))
+        # copy from class to not modify globally
+        self.mock_users_by_username = copy.deepcopy \
+            (self.mock_users_by_username)
+        lu = self.mock_users_by_username ['testuser1@ds1.internal'][1]
+        lu ['thumbnailPhoto'] = Mock_Guid (pic)
+        self.ldap_modify_result = {}
+        self.ldap_sync.sync_user_to_ldap ('testuser1@ds1.internal')
+        self.assertNotIn ('thumbnailPhoto', self.ldap_modify_result [newdn])
+        # The sync does not commit, the digest is saved by the caller
+        self.db.rollback ()
+        self.assertEqual (self.db.file.get (pid, 'resized_digest'), None)
+    # end def test_pic_digest_unchanged
+
 # end class Test_Case_LDAP_Sync
 
 def test_suite () :
@@ -0,0 +1,127 @@
+#!/usr/bin/python3
+
+import os
+import sys
+from argparse import ArgumentParser
+from roundup  import instance
+
+""" Import QSOs from an ADIF file into the ham log. The file is parsed
+    incrementally and QSOs are created in batches, each batch is
+    committed after the QSL stati of its QSOs were computed in bulk.
+    QSOs already in the log (same owner, call and start time) are
+    skipped.
+"""
+
+qso_fields = \
+    ( ('call',       'call')
+    , ('freq',       'freq')
+    , ('tx_pwr',     'tx_pwr')
+    , ('name',       'name')
+    , ('rst_rcvd',   'rst_rcvd')
+    , ('rst_sent',   'rst_sent')
+    , ('qth',        'qth')
+    , ('gridsquare', 'gridsquare')
+    , ('country',    'country')
+    , ('state',      'state')
+    , ('qsl_via',    'qsl_via')
+    , ('iota',       'iota')
+    , ('darc_dok',   'german_dok')
+    )
+
+def main () :
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( 'adif'
+        , help    = 'ADIF file to import'
+        )
+    cmd.add_argument \
+        ( '-b', '--batch'
+        , help    = 'Number of QSOs per commit, default: %(default)s'
+        , type    = int
+        , default = 500
+        )
+    cmd.add_argument \
+        ( '-d', '--directory'
+        , help    = 'Tracker directory'
+        , default = os.getcwd ()
+        )
+    cmd.add_argument \
+        ( '-e', '--encoding'
+        , help    = 'Encoding of field values, default: %(default)s'
+        , default = 'utf-8'
+        )
+    cmd.add_argument \
+        ( '-o', '--owner'
+        , help     = 'Name of ham_call owning the QSOs'
+        , required = True
+        )
+    cmd.add_argument \
+        ( '-u', '--user'
+        , help    = 'Roundup user for the import, default: %(default)s'
+        , default = 'admin'
+        )
+    cmd.add_argument \
+        ( '-v', '--verbose'
+        , help    = 'Report progress'
+        , action  = 'store_true'
+        )
+    args = cmd.parse_args ()
+    sys.path.insert (1, os.path.join (args.directory, 'lib'))
+    import hamlib
+    tracker  = instance.open (args.directory)
+    db       = tracker.open (args.user)
+    owner    = db.ham_call.lookup (args.owner)
+    resolver = hamlib.ADIF_Resolver (db)
+    existing = set ()
+    for id in db.qso.filter_iter (None, dict (owner = owner)) :
+        qso = db.qso.getnode (id)
+        existing.add ((qso.call, str (qso.qso_start)))
+    created = skipped = 0
+    with open (args.adif, 'rb') as f :
+        with hamlib.Deferred_QSL_Status (db) as deferred :
+            for rec in hamlib.adif_records (f, encoding = args.encoding) :
+                if 'call' not in rec or 'qso_date' not in rec :
+                    skipped += 1
+                    continue
+                start = hamlib.adif_date \
+                    (rec ['qso_date'], rec.get ('time_on'))
+                key   = (rec ['call'], str (start))
+                if key in existing :
+                    skipped += 1
+                    continue
+                existing.add (key)
+                d = dict (owner = owner, qso_start = start)
+                for k, p in qso_fields :
+                    if rec.get (k) :
+                        d [p] = rec [k]
+                if rec.get ('time_off') :
+                    d ['qso_end'] = hamlib.adif_date \
+                        ( rec.get ('qso_date_off', rec ['qso_date'])
+                        , rec ['time_off']
+                        )
+                if rec.get ('band') :
+                    d ['band'] = resolver.band (rec ['band'])
+                if rec.get ('mode') :
+                    d ['mode'] = resolver.mode \
+                        (rec ['mode'], rec.get ('submode'))
+                if rec.get ('dxcc') :
+                    d ['dxcc_entity'] = resolver.dxcc_entity (rec ['dxcc'])
+                for k, p in ('cqz', 'cq_zone'), ('ituz', 'itu_zone') :
+                    try :
+                        d [p] = int (rec [k])
+                    except (KeyError, ValueError) :
+                        pass
+                db.qso.create (**dict ((k, v) for k, v in d.items () if v))
+                created += 1
+                if created % args.batch == 0 :
+                    deferred.flush ()
+                    db.commit ()
+                    if args.verbose :
+                        print ("Created %d QSOs" % created)
+    db.commit ()
+    if args.verbose :
+        print ("Created %d QSOs, skipped %d" % (created, skipped))
+# end def main
+
+if __name__ == '__main__' :
+    main ()
@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+
+import os
+import sys
+from argparse     import ArgumentParser
+from roundup      import instance
+
+""" Reconcile the automatically created wps of all auto_wps of an
+    org_location (or of the given auto_wps) with the dynamic user
+    records, see Auto_WP_Sync in lib/lib_auto_wp.py. Prints the list
+    of changes, with --dry-run nothing is changed.
+"""
+
+def main () :
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( 'auto_wp'
+        , help    = 'Restrict to these auto_wp ids'
+        , nargs   = '*'
+        )
+    cmd.add_argument \
+        ( '-d', '--directory'
+        , help    = 'Tracker directory'
+        , default = os.getcwd ()
+        )
+    cmd.add_argument \
+        ( '-n', '--dry-run'
+        , help    = 'Only report changes, do not commit'
+        , action  = 'store_true'
+        )
+    cmd.add_argument \
+        ( '-o', '--org-location'
+        , help    = 'Name of org_location, all its auto_wps are checked'
+        )
+    cmd.add_argument \
+        ( '-u', '--user'
+        , help    = 'Restrict to this username, may be repeated'
+        , action  = 'append'
+        , default = []
+        )
+    args = cmd.parse_args ()
+    sys.path.insert (1, os.path.join (args.directory, 'lib'))
+    import lib_auto_wp
+    tracker = instance.open (args.directory)
+    db      = tracker.open ('admin')
+    if not args.auto_wp and not args.org_location :
+        print ("Need auto_wp ids or an org_location")
+        sys.exit (1)
+    auto_wps = args.auto_wp
+    if args.org_location :
+        olo      = db.org_location.lookup (args.org_location)
+        auto_wps = db.auto_wp.filter \
+            (auto_wps or None, dict (org_location = olo))
+    only = set (db.user.lookup (u) for u in args.user)
+    for aid in auto_wps :
+        users = lib_auto_wp.auto_wp_users (db, aid)
+        if only :
+            users = users & only
+        for line in lib_auto_wp.sync_auto_wp \
+            (db, aid, users, dry_run = args.dry_run) :
+            print (line)
+    if not args.dry_run :
+        db.commit ()
+# end def main
+
+if __name__ == '__main__' :
+    main ()
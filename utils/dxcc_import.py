@@ -4,6 +4,8 @@ import sys
 from roundup           import instance
 from afu               import dxcc
 dir     = os.getcwd ()
+sys.path.insert (1, os.path.join (dir, 'lib'))
+import lookup_cache
 tracker = instance.open (dir)
 db      = tracker.open ('admin')
 
@@ -26,14 +28,13 @@ db.commit ()
 
 dx = dxcc.DXCC_File ()
 dx.parse ()
+entities = lookup_cache.mapping (db, 'dxcc_entity', 'code')
 for l in dx.dxcc_list :
     if l.entity_type == 'CURRENT' :
         for e in l.entries :
-            try :
-                d = db.dxcc_entity.lookup (e.code)
-            except KeyError :
+            if e.code not in entities :
                 cont = e.continent.split (',')
-                cont = [db.continent.lookup (x) for x in cont]
+                cont = [lookup_cache.lookup (db, 'continent', x) for x in cont]
                 d = dict \
                     ( code      = e.code
                     , name      = e.name
@@ -49,6 +50,6 @@ for l in dx.dxcc_list :
                     d ['itu_zone'] = ituz
                 except ValueError :
                     pass
-                db.dxcc_entity.create (**d)
+                entities [e.code] = db.dxcc_entity.create (**d)
 
 db.commit ()
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+
+import os
+import sys
+from argparse     import ArgumentParser
+from roundup      import instance
+from roundup.date import Date
+
+""" Rebuild, compact or query the effort_rollup table with booked hours
+    per work package and month (see lib/effort_rollup.py). Queries print
+    the hours per work package, project, cost center or cost center
+    group for the given month range.
+"""
+
+def main () :
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( 'ids'
+        , help    = 'Restrict query to these ids of the given level'
+        , nargs   = '*'
+        )
+    cmd.add_argument \
+        ( '-c', '--compact'
+        , help    = 'Merge the rows of each work package and month'
+        , action  = 'store_true'
+        )
+    cmd.add_argument \
+        ( '-d', '--directory'
+        , help    = 'Tracker directory'
+        , default = os.getcwd ()
+        )
+    cmd.add_argument \
+        ( '-e', '--end'
+        , help    = 'Last month of query, e.g. 2026-12'
+        )
+    cmd.add_argument \
+        ( '-l', '--level'
+        , help    = 'Query level, one of wp, project, cost_center,'
+                    ' cost_center_group, default: %(default)s'
+        , default = 'cost_center_group'
+        )
+    cmd.add_argument \
+        ( '-r', '--rebuild'
+        , help    = 'Create (if necessary) and recompute the table'
+        , action  = 'store_true'
+        )
+    cmd.add_argument \
+        ( '-s', '--start'
+        , help    = 'First month of query, e.g. 2026-01'
+        )
+    args = cmd.parse_args ()
+    sys.path.insert (1, os.path.join (args.directory, 'lib'))
+    import effort_rollup
+    tracker = instance.open (args.directory)
+    db      = tracker.open ('admin')
+    if args.rebuild :
+        effort_rollup.rebuild (db)
+        db.commit ()
+        return
+    if not effort_rollup.exists (db) :
+        print ("No effort_rollup table, create it with --rebuild")
+        sys.exit (1)
+    if args.compact :
+        effort_rollup.compact (db)
+        db.commit ()
+        return
+    start = end = None
+    if args.start :
+        start = Date (args.start + '-01')
+    if args.end :
+        end   = Date (args.end + '-01')
+    hours = effort_rollup.rollup (db, args.level, start, end, args.ids)
+    cls   = db.getclass (args.level if args.level != 'wp' else 'time_wp')
+    for id in sorted (hours, key = int) :
+        print ("%8.2f %s" % (hours [id], cls.get (id, 'name')))
+# end def main
+
+if __name__ == '__main__' :
+    main ()
@@ -0,0 +1,77 @@
+#!/usr/bin/python
+
+import os
+import sys
+import time
+import logging
+from argparse import ArgumentParser
+from roundup  import instance
+
+""" Send mail spooled by detectors (see lib/mail_spool.py) in batches
+    over a single SMTP connection. Messages that fail are retried with
+    exponential backoff and moved to the 'failed' directory of the
+    spool after max-tries attempts. With --interval the spool is
+    checked periodically, otherwise all due messages are sent once.
+"""
+
+def main () :
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( '-b', '--batch'
+        , help    = 'Maximum number of messages per SMTP connection'
+        , type    = int
+        , default = 100
+        )
+    cmd.add_argument \
+        ( '--backoff'
+        , help    = 'Seconds to wait before first retry, doubled each try'
+        , type    = int
+        , default = 60
+        )
+    cmd.add_argument \
+        ( '-d', '--directory'
+        , help    = 'Tracker directory'
+        , default = os.getcwd ()
+        )
+    cmd.add_argument \
+        ( '-i', '--interval'
+        , help    = 'Check spool every interval seconds, default: run once'
+        , type    = int
+        , default = 0
+        )
+    cmd.add_argument \
+        ( '-m', '--max-tries'
+        , help    = 'Give up sending after this many tries'
+        , type    = int
+        , default = 10
+        )
+    cmd.add_argument \
+        ( '-v', '--verbose'
+        , help    = 'Report number of sent messages'
+        , action  = 'store_true'
+        )
+    args = cmd.parse_args ()
+    sys.path.insert (1, os.path.join (args.directory, 'lib'))
+    from mail_spool import Spool_Sender, spool_directory
+    logging.basicConfig (level = logging.INFO)
+    tracker = instance.open (args.directory)
+    if not spool_directory (tracker.config) :
+        print ("No mail spool configured")
+        sys.exit (1)
+    sender  = Spool_Sender \
+        ( tracker.config
+        , batch     = args.batch
+        , max_tries = args.max_tries
+        , backoff   = args.backoff
+        )
+    while True :
+        n = sender.send_all ()
+        if args.verbose and n :
+            print ("Sent %d messages" % n)
+        if not args.interval :
+            break
+        time.sleep (args.interval)
+# end def main
+
+if __name__ == '__main__' :
+    main ()